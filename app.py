@@ -2,10 +2,14 @@
 
 from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
 import os
+import hashlib
+import json
 import requests
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
 from datetime import datetime
-from functools import wraps
+from functools import lru_cache, partial, wraps
 from firebase_config import (
     get_firestore_db, verify_firebase_token, Collections,
     add_user_activity, get_user_by_email, get_user_by_username, test_firebase_connection
@@ -20,6 +24,31 @@ import base64
 from PIL import Image as PILImage, ImageDraw, ImageFont
 import tempfile
 
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+from geoserver_federation import GeoServerFederation
+from geoserver_catalog import (
+    CatalogCache, workspaces_key, layers_key, bounds_key, capabilities_key, style_key, layer_style_key, legend_key,
+    legend_prefix, feature_type_key
+)
+from geoserver_capabilities import fetch_workspace_capabilities, layer_names_by_type
+from spatial_index import LayerExtentIndex
+from sld_parser import parse_sld, rule_label, rule_color
+from catalog_sync import CatalogSyncJob, ConditionalGetter, layer_fingerprint
+from tile_cache import (
+    MetatileRenderer, TileEncoder, TileRequestError, TileUpstreamError, canonical_getmap_params,
+    content_etag, format_content_type, grid_tile, mercator_to_lonlat, sniff_image_type, tile_bbox,
+    tile_cache_key, tile_request_params
+)
+from tile_store import make_tile_cache, parse_layer_quotas, parse_size
+from vector_tiles import DEFAULT_EXTENT as MVT_EXTENT, MVT_CONTENT_TYPE, encode_vector_tile
+from wfs_stream import STREAM_FORMATS, WFSPager, WFSStreamError, feature_type_schema, stream_features
+from simplify import FeatureGeneralizer
+from legend_sprite import LegendSpriteCache, pack_sprite
+from thumbnails import ThumbnailRenderer, ThumbnailStore
+from feature_info import FeatureInfoCache, cell_query_params, snap_click, split_by_layer
+
 # Import analytics data blueprint
 from api.analytics_data import analytics_data_bp
 
@@ -51,10 +80,169 @@ app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HT
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
-GEOSERVER_BASE_URL = "http://localhost:9090/geoserver"
+GEOSERVER_BASE_URL = os.environ.get('GEOSERVER_BASE_URL', "http://localhost:9090/geoserver")
 GEOSERVER_USERNAME = os.environ.get('GEOSERVER_USERNAME', 'admin')
 GEOSERVER_PASSWORD = os.environ.get('GEOSERVER_PASSWORD', 'geoserver')
 
+# Comma-separated base URLs of every GeoServer instance (replicas and/or instances serving
+# different workspaces); defaults to GEOSERVER_BASE_URL alone
+GEOSERVER_INSTANCES = [
+    url.strip() for url in os.environ.get('GEOSERVER_INSTANCES', GEOSERVER_BASE_URL).split(',') if url.strip()
+] or [GEOSERVER_BASE_URL]
+
+# All GeoServer traffic goes through one router that sends each request to the healthiest
+# instance serving its workspace, via a pooled client per instance (keep-alive, retries,
+# circuit breaker)
+geoserver = GeoServerFederation(
+    GEOSERVER_INSTANCES, GEOSERVER_USERNAME, GEOSERVER_PASSWORD,
+    health_check_interval=float(os.environ.get('GEOSERVER_HEALTH_CHECK_INTERVAL', 15)),
+    health_check_timeout=float(os.environ.get('GEOSERVER_HEALTH_CHECK_TIMEOUT', 5)),
+    ewma_alpha=float(os.environ.get('GEOSERVER_LATENCY_EWMA_ALPHA', 0.3)),
+    unhealthy_threshold=int(os.environ.get('GEOSERVER_UNHEALTHY_THRESHOLD', 2)),
+    healthy_threshold=int(os.environ.get('GEOSERVER_HEALTHY_THRESHOLD', 2)),
+    # Concurrent identical GET requests share one upstream call
+    coalesce_requests=os.environ.get('GEOSERVER_COALESCE_REQUESTS', 'True').lower() == 'true',
+    connect_timeout=float(os.environ.get('GEOSERVER_CONNECT_TIMEOUT', 5)),
+    read_timeout=float(os.environ.get('GEOSERVER_TIMEOUT', 30)),
+    max_retries=int(os.environ.get('GEOSERVER_MAX_RETRIES', 3)),
+    backoff_factor=float(os.environ.get('GEOSERVER_RETRY_BACKOFF', 0.5)),
+    max_connections_per_host=int(os.environ.get('GEOSERVER_MAX_CONNECTIONS_PER_HOST', 16)),
+    failure_threshold=int(os.environ.get('GEOSERVER_CIRCUIT_FAILURE_THRESHOLD', 5)),
+    reset_timeout=float(os.environ.get('GEOSERVER_CIRCUIT_RESET_TIMEOUT', 30))
+)
+
+# Layer detail lookups (one REST call per layer) run on a bounded worker pool
+GEOSERVER_LAYER_LOOKUP_WORKERS = int(os.environ.get('GEOSERVER_LAYER_LOOKUP_WORKERS', 8))
+GEOSERVER_LAYER_LOOKUP_TIMEOUT = float(os.environ.get('GEOSERVER_LAYER_LOOKUP_TIMEOUT', 5))  # seconds per layer
+GEOSERVER_LAYER_LOOKUP_DEADLINE = float(os.environ.get('GEOSERVER_LAYER_LOOKUP_DEADLINE', 20))  # seconds per workspace
+
+# Catalog cache: entries are fresh for CATALOG_CACHE_TTL, then served stale for up to
+# CATALOG_STALE_TTL while a background thread refreshes them
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 300))
+CATALOG_PARTIAL_TTL = float(os.environ.get('CATALOG_PARTIAL_TTL', 30))
+CATALOG_STALE_TTL = float(os.environ.get('CATALOG_STALE_TTL', 86400))
+CATALOG_WARM_ON_START = os.environ.get('CATALOG_WARM_ON_START', 'True').lower() == 'true'
+
+# Discover layers, types, bounds and styles from per-workspace WMS/WFS GetCapabilities
+# (two requests per workspace) before falling back to per-layer REST calls
+CATALOG_USE_CAPABILITIES = os.environ.get('CATALOG_USE_CAPABILITIES', 'True').lower() == 'true'
+GEOSERVER_CAPABILITIES_TIMEOUT = float(os.environ.get('GEOSERVER_CAPABILITIES_TIMEOUT', 30))
+
+# Poll GeoServer for catalog changes every CATALOG_SYNC_INTERVAL seconds (0 disables)
+# and apply only the added/removed/changed layers to the cache and layer index
+CATALOG_SYNC_INTERVAL = float(os.environ.get('CATALOG_SYNC_INTERVAL', 300))
+
+catalog_cache = CatalogCache(fresh_ttl=CATALOG_CACHE_TTL, stale_ttl=CATALOG_STALE_TTL)
+MISSING = object()  # sentinel for catalog_cache.peek, since None is a valid cached value
+
+# Upper bound on layer names accepted by the batch bounds endpoint
+GEOSERVER_BATCH_BOUNDS_LIMIT = int(os.environ.get('GEOSERVER_BATCH_BOUNDS_LIMIT', 200))
+
+# In-memory R-tree over layer lat/lon extents, kept in step with the catalog cache
+layer_index = LayerExtentIndex(
+    node_capacity=int(os.environ.get('LAYER_INDEX_NODE_CAPACITY', 16)),
+    repack_threshold=int(os.environ.get('LAYER_INDEX_REPACK_THRESHOLD', 64))
+)
+LAYERS_IN_VIEW_LIMIT = int(os.environ.get('LAYERS_IN_VIEW_LIMIT', 100))
+
+# WMS tile proxy: tiles rendered by GeoServer are kept on disk for TILE_CACHE_TTL seconds
+# and shared between users; browsers may reuse them for TILE_BROWSER_MAX_AGE seconds
+TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR', os.path.join(app.root_path, 'tile_cache'))
+TILE_CACHE_TTL = float(os.environ.get('TILE_CACHE_TTL', 86400))
+TILE_PROXY_TIMEOUT = float(os.environ.get('TILE_PROXY_TIMEOUT', 30))
+TILE_PROXY_MAX_SIZE = int(os.environ.get('TILE_PROXY_MAX_SIZE', 2048))  # pixels per side
+TILE_BROWSER_MAX_AGE = int(os.environ.get('TILE_BROWSER_MAX_AGE', 300))
+# 'packed' keeps each layer group's tiles in one SQLite bundle, 'files' writes one file per tile
+TILE_CACHE_BACKEND = os.environ.get('TILE_CACHE_BACKEND', 'packed')
+# Byte budget for all cached tiles (0 = unlimited) and per-layer quotas ("ws:layer=20G,..."),
+# enforced by evicting the least recently (lru) or least frequently (lfu) read tiles
+TILE_CACHE_MAX_BYTES = parse_size(os.environ.get('TILE_CACHE_MAX_BYTES', '0'))
+TILE_CACHE_LAYER_QUOTAS = parse_layer_quotas(os.environ.get('TILE_CACHE_LAYER_QUOTAS', ''))
+TILE_CACHE_EVICTION_POLICY = os.environ.get('TILE_CACHE_EVICTION_POLICY', 'lru').strip().lower()
+TILE_CACHE_EVICTION_INTERVAL = float(os.environ.get('TILE_CACHE_EVICTION_INTERVAL', 30))
+tile_cache = make_tile_cache(TILE_CACHE_BACKEND, TILE_CACHE_DIR, ttl=TILE_CACHE_TTL,
+                             max_bytes=TILE_CACHE_MAX_BYTES, layer_quotas=TILE_CACHE_LAYER_QUOTAS,
+                             eviction_policy=TILE_CACHE_EVICTION_POLICY,
+                             eviction_interval=TILE_CACHE_EVICTION_INTERVAL)
+# Grid tiles are rendered METATILE_SIZE x METATILE_SIZE at a time (1 disables) with a
+# METATILE_GUTTER pixel margin, then sliced; the sibling tiles go straight into tile_cache
+METATILE_SIZE = int(os.environ.get('METATILE_SIZE', 4))
+METATILE_GUTTER = int(os.environ.get('METATILE_GUTTER', 16))
+# PNG tiles are re-encoded per the browser's Accept header: raster layers as lossy WebP
+# (or JPEG when opaque and WebP is not accepted), vector overlays as PNG8
+TILE_ENCODING = os.environ.get('TILE_ENCODING', 'True').lower() == 'true'
+TILE_WEBP_QUALITY = int(os.environ.get('TILE_WEBP_QUALITY', 80))
+TILE_JPEG_QUALITY = int(os.environ.get('TILE_JPEG_QUALITY', 85))
+# Vector tiles are built from at most MVT_MAX_FEATURES WFS features per tile, clipped
+# MVT_BUFFER tile units (of 4096) outside the tile
+MVT_MAX_FEATURES = int(os.environ.get('MVT_MAX_FEATURES', 10000))
+MVT_BUFFER = int(os.environ.get('MVT_BUFFER', 64))
+# Feature streaming: GetFeature pages of WFS_STREAM_PAGE_SIZE features, at most
+# WFS_STREAM_PREFETCH_PAGES fetched ahead of a slow client, WFS_STREAM_MAX_FEATURES per request
+WFS_STREAM_PAGE_SIZE = int(os.environ.get('WFS_STREAM_PAGE_SIZE', 5000))
+WFS_STREAM_PREFETCH_PAGES = int(os.environ.get('WFS_STREAM_PREFETCH_PAGES', 1))
+WFS_STREAM_MAX_FEATURES = int(os.environ.get('WFS_STREAM_MAX_FEATURES', 200000))
+WFS_STREAM_TIMEOUT = float(os.environ.get('WFS_STREAM_TIMEOUT', 120))
+# Generalised vector data: features simplified per zoom band ('dp' Douglas-Peucker or
+# 'visvalingam') to SIMPLIFY_TOLERANCE_PX pixels, at most SIMPLIFY_MAX_FEATURES per XYZ tile
+SIMPLIFY_METHOD = os.environ.get('SIMPLIFY_METHOD', 'dp').strip().lower()
+SIMPLIFY_TOLERANCE_PX = float(os.environ.get('SIMPLIFY_TOLERANCE_PX', 0.5))
+SIMPLIFY_MAX_FEATURES = int(os.environ.get('SIMPLIFY_MAX_FEATURES', 20000))
+generalizer = FeatureGeneralizer(method=SIMPLIFY_METHOD, tolerance_px=SIMPLIFY_TOLERANCE_PX)
+# Layer panel previews: THUMBNAIL_SIZE pixels on the longer side, rendered by THUMBNAIL_WORKERS
+# background workers; a request waits up to THUMBNAIL_RENDER_WAIT seconds for a missing one
+THUMBNAIL_CACHE_PATH = os.environ.get('THUMBNAIL_CACHE_PATH', os.path.join(app.root_path, 'thumbnail_cache', 'thumbnails.sqlite'))
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', 128))
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+THUMBNAIL_WEBP_QUALITY = int(os.environ.get('THUMBNAIL_WEBP_QUALITY', 75))
+THUMBNAIL_RENDER_WAIT = float(os.environ.get('THUMBNAIL_RENDER_WAIT', 10))
+# Created here rather than next to the tile proxy because the catalog sync, which starts
+# before the tile proxy is defined, refreshes thumbnails of changed layers
+thumbnail_renderer = ThumbnailRenderer(
+    lambda workspace_name, params: fetch_getmap_image(workspace_name, params),
+    ThumbnailStore(THUMBNAIL_CACHE_PATH), size=THUMBNAIL_SIZE, workers=THUMBNAIL_WORKERS,
+    webp_quality=THUMBNAIL_WEBP_QUALITY
+)
+# GetFeatureInfo clicks are snapped to cells FEATURE_INFO_SNAP_PX screen pixels wide at their
+# zoom level, and each layer's answer for a cell is kept for FEATURE_INFO_CACHE_TTL seconds
+FEATURE_INFO_SNAP_PX = float(os.environ.get('FEATURE_INFO_SNAP_PX', 3))
+FEATURE_INFO_CACHE_TTL = float(os.environ.get('FEATURE_INFO_CACHE_TTL', 300))
+FEATURE_INFO_CACHE_SIZE = int(os.environ.get('FEATURE_INFO_CACHE_SIZE', 10000))
+feature_info_cache = FeatureInfoCache(max_entries=FEATURE_INFO_CACHE_SIZE, ttl=FEATURE_INFO_CACHE_TTL)
+# Multi-layer feature info: features returned per layer unless the request asks for another
+# count (up to FEATURE_INFO_MAX_FEATURE_COUNT), and layers per request
+FEATURE_INFO_FEATURE_COUNT = int(os.environ.get('FEATURE_INFO_FEATURE_COUNT', 5))
+FEATURE_INFO_MAX_FEATURE_COUNT = int(os.environ.get('FEATURE_INFO_MAX_FEATURE_COUNT', 50))
+FEATURE_INFO_MAX_LAYERS = int(os.environ.get('FEATURE_INFO_MAX_LAYERS', 50))
+tile_encoder = TileEncoder(enabled=TILE_ENCODING, webp_quality=TILE_WEBP_QUALITY, jpeg_quality=TILE_JPEG_QUALITY)
+
+# Browser caching of proxied map responses. Each carries a strong ETag (a hash of its content)
+# and a conditional request that still matches gets an empty 304. Cache-Control says how long
+# a browser may reuse a response without asking; catalog documents are always revalidated.
+LEGEND_BROWSER_MAX_AGE = int(os.environ.get('LEGEND_BROWSER_MAX_AGE', 3600))
+# Most layers one legend sprite may hold, and the sprite's width in pixels
+LEGEND_SPRITE_MAX_LAYERS = int(os.environ.get('LEGEND_SPRITE_MAX_LAYERS', 50))
+LEGEND_SPRITE_MAX_WIDTH = int(os.environ.get('LEGEND_SPRITE_MAX_WIDTH', 1024))
+# Packed sprites kept in memory, one per list of layers
+LEGEND_SPRITE_CACHE_SIZE = int(os.environ.get('LEGEND_SPRITE_CACHE_SIZE', 256))
+legend_sprite_cache = LegendSpriteCache(max_entries=LEGEND_SPRITE_CACHE_SIZE)
+FEATURE_INFO_BROWSER_MAX_AGE = int(os.environ.get('FEATURE_INFO_BROWSER_MAX_AGE', 60))
+# Thumbnails only change with their layer's catalog entry, so browsers keep them for a day
+THUMBNAIL_BROWSER_MAX_AGE = int(os.environ.get('THUMBNAIL_BROWSER_MAX_AGE', 86400))
+BROWSER_CACHE_CONTROL = {
+    'catalog': 'private, no-cache',
+    'tile': f'private, max-age={TILE_BROWSER_MAX_AGE}',
+    'legend': f'private, max-age={LEGEND_BROWSER_MAX_AGE}',
+    'feature_info': f'private, max-age={FEATURE_INFO_BROWSER_MAX_AGE}',
+    'thumbnail': f'private, max-age={THUMBNAIL_BROWSER_MAX_AGE}'
+}
+
+# Bumped whenever the shape of the /api/geoserver/catalog document changes
+CATALOG_SNAPSHOT_FORMAT_VERSION = 1
+
+# Parsed SLD palettes kept per (style, last-modified) revision
+STYLE_PALETTE_CACHE_SIZE = int(os.environ.get('STYLE_PALETTE_CACHE_SIZE', 512))
+
 # Initialize Firebase
 db = get_firestore_db()
 
@@ -1250,96 +1438,233 @@ def search_location():
         app.logger.error(f"Error fetching location from Nominatim: {e}")
         return jsonify({'error': 'Failed to connect to geocoding service'}), 500
 
+def fetch_workspace_names():
+    """Fetch the list of workspace names from the REST catalogs of all GeoServer instances"""
+    return geoserver.list_workspaces()
+
+def make_cacheable(response, kind, etag=None, last_modified=None):
+    """
+    Give a response the validators and Cache-Control of its kind (see BROWSER_CACHE_CONTROL)
+    and turn it into an empty 304 when the request's If-None-Match / If-Modified-Since match.
+    The ETag is a hash of the body unless the caller already knows it.
+    """
+    response.set_etag(etag or content_etag(response.get_data()))
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = BROWSER_CACHE_CONTROL[kind]
+    return response.make_conditional(request)
+
 @app.route('/api/geoserver/workspaces')
 @login_required
 def get_geoserver_workspaces():
-    url = f"{GEOSERVER_BASE_URL}/rest/workspaces.json"
     try:
-        response = requests.get(url, auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD))
-        response.raise_for_status()
-        workspaces_data = response.json()
-        workspace_names = [ws['name'] for ws in workspaces_data.get('workspaces', {}).get('workspace', [])]
-        return jsonify({'workspaces': workspace_names})
+        workspace_names = catalog_cache.get(workspaces_key(), fetch_workspace_names)
+        return make_cacheable(jsonify({'workspaces': workspace_names}), 'catalog',
+                              last_modified=catalog_cache.fetched_at([workspaces_key()]))
     except requests.exceptions.RequestException as e:
         app.logger.error(f"Error fetching workspaces from GeoServer: {e}")
         return jsonify({'error': f'Failed to fetch workspaces from GeoServer: {e}'}), 500
 
-@app.route('/api/geoserver/workspaces/<workspace_name>/layers')
-def get_geoserver_layers(workspace_name):
+def load_capabilities_catalog(workspace_name):
     """
-    Fetches layers (raster and vector) for a given workspace.
-    Robustly determines layer type by making a secondary call to each layer's
-    detailed definition URL to find the resource class.
+    Load a workspace catalog (layer types, bounds, default styles) from GetCapabilities.
+    Returns None if the documents cannot be fetched or parsed, so callers fall back to REST.
     """
-    # URL for the workspace's layers summary
-    layers_summary_url = f"{GEOSERVER_BASE_URL}/rest/workspaces/{workspace_name}/layers.json"
-    
     try:
-        response = requests.get(layers_summary_url, auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD))
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-        layers_summary_data = response.json()
-        
-        raster_layers = []
-        vector_layers = []
+        workspace_catalog = fetch_workspace_capabilities(
+            geoserver, workspace_name, timeout=GEOSERVER_CAPABILITIES_TIMEOUT
+        )
+        app.logger.info(f"Loaded {len(workspace_catalog['layers'])} layers for workspace {workspace_name} from GetCapabilities")
+        return workspace_catalog
+    except (requests.exceptions.RequestException, ET.ParseError) as e:
+        app.logger.warning(f"GetCapabilities discovery failed for workspace '{workspace_name}', falling back to REST: {e}")
+        return None
 
-        # GeoServer can return a single layer as a dict, or multiple as a list
-        layers_list = layers_summary_data.get('layers', {}).get('layer', [])
-        if isinstance(layers_list, dict):
-            layers_list = [layers_list] # Convert single dict to a list for consistent iteration
+def get_capabilities_catalog(workspace_name):
+    """Cached GetCapabilities catalog for a workspace, or None if unavailable"""
+    if not CATALOG_USE_CAPABILITIES:
+        return None
+    return catalog_cache.get(
+        capabilities_key(workspace_name),
+        partial(load_capabilities_catalog, workspace_name),
+        ttl=lambda workspace_catalog: CATALOG_CACHE_TTL if workspace_catalog else CATALOG_PARTIAL_TTL
+    )
+
+def get_catalog_layer_info(workspace_name, layer_name):
+    """Capabilities metadata (type, bounds, default_style, ...) for one layer, or None"""
+    workspace_catalog = get_capabilities_catalog(workspace_name)
+    if not workspace_catalog:
+        return None
+    return workspace_catalog['layers'].get(layer_name)
 
-        app.logger.info(f"Processing {len(layers_list)} layers for workspace {workspace_name}")
+def resolve_layer_type(layer_name, layer_detail_href):
+    """
+    Determine whether a layer is 'raster' or 'vector' from its detailed definition.
+    Returns a (detected_type, lookup_status) tuple where lookup_status is one of
+    'ok', 'timeout' or 'failed'.
+    """
+    try:
+        detailed_layer_response = geoserver.get(layer_detail_href, timeout=GEOSERVER_LAYER_LOOKUP_TIMEOUT)
+        detailed_layer_response.raise_for_status()
+        detailed_layer_data = detailed_layer_response.json()
+    except requests.exceptions.Timeout as e:
+        app.logger.warning(f"Timed out fetching detailed layer info for '{layer_name}' at '{layer_detail_href}': {e}")
+        return None, 'timeout'
+    except requests.exceptions.RequestException as e:
+        app.logger.warning(f"Failed to fetch detailed layer info for '{layer_name}' at '{layer_detail_href}': {e}")
+        return None, 'failed'
+    except ValueError as e: # Catch JSON decoding errors for the detailed response
+        app.logger.warning(f"Failed to parse JSON for detailed layer '{layer_name}' at '{layer_detail_href}': {e}")
+        return None, 'failed'
+
+    if not detailed_layer_data.get('layer', {}).get('resource', {}).get('@class'):
+        app.logger.warning(f"Could not find '@class' for layer '{layer_name}' at '{layer_detail_href}'.")
+    return layer_type_from_detail(detailed_layer_data), 'ok'
+
+def layer_type_from_detail(detailed_layer_data):
+    """'raster', 'vector' or None from a REST layer definition"""
+    # From the detailed layer data, we can find the resource class
+    resource_class = detailed_layer_data.get('layer', {}).get('resource', {}).get('@class') # Note the '@class' key
+    if not resource_class:
+        return None
+    if "coverage" in resource_class.lower(): # 'coverage' for rasters
+        return 'raster'
+    if "feature" in resource_class.lower(): # 'featureType' for vectors
+        return 'vector'
+    return None
 
-        for layer_info in layers_list:
-            layer_name = layer_info.get('name')
-            layer_detail_href = layer_info.get('href') # This is the key: get the URL to the full layer definition
-            
-            if not layer_name or not layer_detail_href:
-                app.logger.warning(f"Layer info missing 'name' or 'href' in workspace {workspace_name}: {layer_info}")
-                continue # Skip to next layer if essential info is missing
+def fetch_workspace_layers(workspace_name):
+    """
+    Fetches layers (raster and vector) for a given workspace, from the workspace's
+    GetCapabilities documents when available and from the REST catalog otherwise.
+    """
+    workspace_catalog = get_capabilities_catalog(workspace_name)
+    if workspace_catalog:
+        return layers_payload_from_capabilities(workspace_name, workspace_catalog)
+    return fetch_workspace_layers_rest(workspace_name)
+
+def layers_payload_from_capabilities(workspace_name, workspace_catalog):
+    """The layers endpoint payload for a workspace discovered from GetCapabilities"""
+    layer_count = len(workspace_catalog['layers'])
+    return {
+        'workspace': workspace_name,
+        'raster_layers': layer_names_by_type(workspace_catalog, 'raster'),
+        'vector_layers': layer_names_by_type(workspace_catalog, 'vector'),
+        'partial': False,
+        'lookup_summary': {'total': layer_count, 'resolved': layer_count, 'unknown_type': 0,
+                           'skipped': 0, 'failed': 0, 'timed_out': 0},
+        'source': 'capabilities'
+    }
 
-            detected_type = None
+def fetch_workspace_layers_rest(workspace_name):
+    """
+    Fetches layers (raster and vector) for a given workspace from the REST catalog.
+    Robustly determines layer type by making a secondary call to each layer's
+    detailed definition URL to find the resource class. The secondary calls run
+    concurrently on a bounded worker pool; layers whose lookup fails or does not
+    finish in time are left out and counted in 'lookup_summary'.
+    Raises requests.exceptions.RequestException if the layers summary cannot be fetched.
+    """
+    # The workspace's layers summary
+    response = geoserver.get(f"rest/workspaces/{workspace_name}/layers.json")
+    response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+    layers_summary_data = response.json()
 
-            # Make a secondary API call to get the detailed layer information
-            try:
-                detailed_layer_response = requests.get(layer_detail_href, auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD))
-                detailed_layer_response.raise_for_status()
-                detailed_layer_data = detailed_layer_response.json()
+    raster_layers = []
+    vector_layers = []
 
-                # Now, from the detailed_layer_data, we can find the resource class
-                resource_class = detailed_layer_data.get('layer', {}).get('resource', {}).get('@class') # Note the '@class' key
-                
-                if resource_class:
-                    if "coverage" in resource_class.lower(): # 'coverage' for rasters
-                        detected_type = 'raster'
-                    elif "feature" in resource_class.lower(): # 'featureType' for vectors
-                        detected_type = 'vector'
-                else:
-                    app.logger.warning(f"Could not find '@class' for layer '{layer_name}' at '{layer_detail_href}'.")
+    # GeoServer can return a single layer as a dict, or multiple as a list
+    layers_list = layers_summary_data.get('layers', {}).get('layer', [])
+    if isinstance(layers_list, dict):
+        layers_list = [layers_list] # Convert single dict to a list for consistent iteration
 
-            except requests.exceptions.RequestException as e:
-                app.logger.warning(f"Failed to fetch detailed layer info for '{layer_name}' at '{layer_detail_href}': {e}")
-            except ValueError as e: # Catch JSON decoding errors for the detailed response
-                app.logger.warning(f"Failed to parse JSON for detailed layer '{layer_name}' at '{layer_detail_href}': {e}")
-            
-            # Add to lists based on detected type
-            if detected_type == 'raster':
-                raster_layers.append(layer_name)
-            elif detected_type == 'vector':
-                vector_layers.append(layer_name)
-            else:
-                app.logger.warning(f"Could not determine type for layer '{layer_name}' in workspace '{workspace_name}'. Skipping.")
+    app.logger.info(f"Processing {len(layers_list)} layers for workspace {workspace_name}")
 
-        return jsonify({
-            'workspace': workspace_name,
-            'raster_layers': raster_layers,
-            'vector_layers': vector_layers
-        })
+    lookup_summary = {'total': len(layers_list), 'resolved': 0, 'unknown_type': 0,
+                      'skipped': 0, 'failed': 0, 'timed_out': 0}
+
+    pending_lookups = []
+    for layer_info in layers_list:
+        layer_name = layer_info.get('name')
+        layer_detail_href = layer_info.get('href') # This is the key: get the URL to the full layer definition
+
+        if not layer_name or not layer_detail_href:
+            app.logger.warning(f"Layer info missing 'name' or 'href' in workspace {workspace_name}: {layer_info}")
+            lookup_summary['skipped'] += 1
+            continue # Skip to next layer if essential info is missing
+
+        pending_lookups.append((layer_name, layer_detail_href))
+
+    results = {}
+    if pending_lookups:
+        executor = ThreadPoolExecutor(
+            max_workers=min(GEOSERVER_LAYER_LOOKUP_WORKERS, len(pending_lookups)),
+            thread_name_prefix='layer-lookup'
+        )
+        futures = {
+            executor.submit(resolve_layer_type, layer_name, layer_detail_href): layer_name
+            for layer_name, layer_detail_href in pending_lookups
+        }
+        done, not_done = wait(futures, timeout=GEOSERVER_LAYER_LOOKUP_DEADLINE)
+        # Don't hold the request open for stragglers; they finish (or time out) on their own
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        for future in done:
+            results[futures[future]] = future.result()
+        for future in not_done:
+            app.logger.warning(f"Layer lookup for '{futures[future]}' did not finish within {GEOSERVER_LAYER_LOOKUP_DEADLINE}s")
+            results[futures[future]] = (None, 'timeout')
+
+    # Add to lists based on detected type, preserving GeoServer's layer order
+    for layer_name, _ in pending_lookups:
+        detected_type, lookup_status = results[layer_name]
+        if lookup_status == 'timeout':
+            lookup_summary['timed_out'] += 1
+        elif lookup_status == 'failed':
+            lookup_summary['failed'] += 1
+        elif detected_type == 'raster':
+            raster_layers.append(layer_name)
+            lookup_summary['resolved'] += 1
+        elif detected_type == 'vector':
+            vector_layers.append(layer_name)
+            lookup_summary['resolved'] += 1
+        else:
+            app.logger.warning(f"Could not determine type for layer '{layer_name}' in workspace '{workspace_name}'. Skipping.")
+            lookup_summary['unknown_type'] += 1
+
+    return {
+        'workspace': workspace_name,
+        'raster_layers': raster_layers,
+        'vector_layers': vector_layers,
+        'partial': lookup_summary['resolved'] + lookup_summary['unknown_type'] < lookup_summary['total'],
+        'lookup_summary': lookup_summary,
+        'source': 'rest'
+    }
+
+def layers_cache_ttl(layers_payload):
+    """Partial layer lists are retried sooner than complete ones"""
+    return CATALOG_PARTIAL_TTL if layers_payload['partial'] else CATALOG_CACHE_TTL
+
+@app.route('/api/geoserver/workspaces/<workspace_name>/layers')
+def get_geoserver_layers(workspace_name):
+    """
+    Returns the raster and vector layers of a workspace, served from the catalog cache.
+    """
+    try:
+        layers_payload = catalog_cache.get(
+            layers_key(workspace_name),
+            partial(fetch_workspace_layers, workspace_name),
+            ttl=layers_cache_ttl
+        )
+        return make_cacheable(jsonify(layers_payload), 'catalog',
+                              last_modified=catalog_cache.fetched_at([layers_key(workspace_name)]))
 
     except requests.exceptions.RequestException as e:
         app.logger.error(f"Error fetching workspace layers summary for '{workspace_name}': {e}")
         # Try to extract GeoServer's error message if response is available and JSON
         error_message = f'Failed to fetch layers from GeoServer: {e}'
         status_code = 500
+        response = getattr(e, 'response', None)
         if response is not None:
             status_code = response.status_code
             try:
@@ -1357,57 +1682,89 @@ def get_geoserver_layers(workspace_name):
         return jsonify({'error': f'An unexpected server error occurred: {e}'}), 500
 
 
+def fetch_layer_bounds(workspace_name, layer_name):
+    """
+    Returns the lat/lon bounds of a layer, taken from the workspace's GetCapabilities
+    catalog when it has them and from the REST catalog otherwise.
+    """
+    layer_info = get_catalog_layer_info(workspace_name, layer_name)
+    if layer_info and layer_info.get('bounds'):
+        return layer_info['bounds']
+    return fetch_layer_bounds_rest(workspace_name, layer_name)
+
+def fetch_layer_bounds_rest(workspace_name, layer_name):
+    """
+    Fetches the lat/lon bounding box for a specific layer from the GeoServer REST catalog.
+    Returns Leaflet-style [[min_lat, min_lon], [max_lat, max_lon]] bounds, or None
+    if the layer has no usable bounding box.
+    """
+    full_layer_id = f"{workspace_name}:{layer_name}"
+    response = geoserver.get(f"rest/layers/{full_layer_id}.json")
+    response.raise_for_status()
+    layer_data = response.json()
+
+    lat_lon_bbox = {}
+
+    # Check the primary layer resource link for detailed metadata
+    resource_href = layer_data.get('layer', {}).get('resource', {}).get('href')
+
+    if resource_href:
+        resource_response = geoserver.get(resource_href)
+        resource_response.raise_for_status()
+        full_resource_data = resource_response.json()
+
+        # For Coverages (rasters)
+        if 'coverage' in full_resource_data:
+            coverage_data = full_resource_data['coverage']
+            # Always use latLonBoundingBox for web mapping
+            lat_lon_bbox = coverage_data.get('latLonBoundingBox', {})
+            if not lat_lon_bbox or lat_lon_bbox.get('minx') is None:
+                lat_lon_bbox = coverage_data.get('nativeBoundingBox', {})
+
+        # For FeatureTypes (vectors)
+        elif 'featureType' in full_resource_data:
+            feature_type_data = full_resource_data['featureType']
+            # Always use latLonBoundingBox for web mapping
+            lat_lon_bbox = feature_type_data.get('latLonBoundingBox', {})
+            if not lat_lon_bbox or lat_lon_bbox.get('minx') is None:
+                lat_lon_bbox = feature_type_data.get('nativeBoundingBox', {})
+
+    if lat_lon_bbox and lat_lon_bbox.get('minx') is not None and lat_lon_bbox.get('miny') is not None:
+        # GeoServer's bounds are typically [minx, miny, maxx, maxy]
+        # Leaflet's fitBounds expects [[min_lat, min_lon], [max_lat, max_lon]]
+        return [
+            [lat_lon_bbox['miny'], lat_lon_bbox['minx']], # South-West: [min_lat, min_lon]
+            [lat_lon_bbox['maxy'], lat_lon_bbox['maxx']]  # North-East: [max_lat, max_lon]
+        ]
+    return None
+
+def bounds_cache_ttl(bounds):
+    """Layers without a bounding box are re-checked sooner than layers with one"""
+    return CATALOG_CACHE_TTL if bounds else CATALOG_PARTIAL_TTL
+
+def get_cached_layer_bounds(workspace_name, layer_name):
+    """Layer bounds through the catalog cache; None if the layer has no usable bounding box"""
+    return catalog_cache.get(
+        bounds_key(workspace_name, layer_name),
+        partial(fetch_layer_bounds, workspace_name, layer_name),
+        ttl=bounds_cache_ttl
+    )
+
 ### New GeoServer Layer Bounds Endpoint ###
 @app.route('/api/geoserver/layer_bounds/<workspace_name>:<layer_name>')
 def get_geoserver_layer_bounds(workspace_name, layer_name):
     """
-    Fetches the lat/lon bounding box for a specific layer from GeoServer.
+    Returns the lat/lon bounding box for a specific layer, served from the catalog cache.
     Always returns bounds in EPSG:4326 (WGS84) format for web mapping.
     """
     full_layer_id = f"{workspace_name}:{layer_name}"
-    url = f"{GEOSERVER_BASE_URL}/rest/layers/{full_layer_id}.json"
-    
+
     try:
-        response = requests.get(url, auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD))
-        response.raise_for_status()
-        layer_data = response.json()
-
-        lat_lon_bbox = {}
-
-        # Check the primary layer resource link for detailed metadata
-        resource_href = layer_data.get('layer', {}).get('resource', {}).get('href')
-
-        if resource_href:
-            resource_response = requests.get(resource_href, auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD))
-            resource_response.raise_for_status()
-            full_resource_data = resource_response.json()
-
-            # For Coverages (rasters)
-            if 'coverage' in full_resource_data:
-                coverage_data = full_resource_data['coverage']
-                # Always use latLonBoundingBox for web mapping
-                lat_lon_bbox = coverage_data.get('latLonBoundingBox', {})
-                if not lat_lon_bbox or lat_lon_bbox.get('minx') is None:
-                    lat_lon_bbox = coverage_data.get('nativeBoundingBox', {})
-
-            # For FeatureTypes (vectors)
-            elif 'featureType' in full_resource_data:
-                feature_type_data = full_resource_data['featureType']
-                # Always use latLonBoundingBox for web mapping
-                lat_lon_bbox = feature_type_data.get('latLonBoundingBox', {})
-                if not lat_lon_bbox or lat_lon_bbox.get('minx') is None:
-                    lat_lon_bbox = feature_type_data.get('nativeBoundingBox', {})
-            
-        if lat_lon_bbox and lat_lon_bbox.get('minx') is not None and lat_lon_bbox.get('miny') is not None:
-            # GeoServer's bounds are typically [minx, miny, maxx, maxy]
-            # Leaflet's fitBounds expects [[min_lat, min_lon], [max_lat, max_lon]]
-            bounds = [
-                [lat_lon_bbox['miny'], lat_lon_bbox['minx']], # South-West: [min_lat, min_lon]
-                [lat_lon_bbox['maxy'], lat_lon_bbox['maxx']]  # North-East: [max_lat, max_lon]
-            ]
-            
+        bounds = get_cached_layer_bounds(workspace_name, layer_name)
+        if bounds:
             app.logger.info(f"Returning lat/lon bounds for {full_layer_id}: {bounds}")
-            return jsonify({'bounds': bounds, 'crs': 'EPSG:4326'})
+            return make_cacheable(jsonify({'bounds': bounds, 'crs': 'EPSG:4326'}), 'catalog',
+                                  last_modified=catalog_cache.fetched_at([bounds_key(workspace_name, layer_name)]))
         else:
             app.logger.warning(f"No valid lat/lon bounding box found for layer: {full_layer_id}")
             return jsonify({'error': 'Lat/lon bounding box not found for this layer or is incomplete.'}), 404
@@ -1416,9 +1773,1137 @@ def get_geoserver_layer_bounds(workspace_name, layer_name):
         app.logger.error(f"Error fetching bounds for {full_layer_id} from GeoServer: {e}")
         return jsonify({'error': f'Failed to fetch bounds for {full_layer_id}: {e}'}), 500
 
+@app.route('/api/geoserver/layer_bounds', methods=['POST'])
+def get_geoserver_layer_bounds_batch():
+    """
+    Returns lat/lon bounds for many layers in one request.
+    Expects {"layers": ["workspace:layer", ...]}. Repeated names are looked up once,
+    cached bounds are reused and the remaining lookups run concurrently. Each layer
+    gets either {"bounds": ...} or {"error": ..., "status": ...} in 'results'.
+    """
+    data = request.get_json(silent=True) or {}
+    layer_ids = data.get('layers')
+    if not isinstance(layer_ids, list) or not layer_ids:
+        return jsonify({'error': "'layers' must be a non-empty list of 'workspace:layer' names"}), 400
+
+    unique_layer_ids = list(dict.fromkeys(str(layer_id) for layer_id in layer_ids))
+    if len(unique_layer_ids) > GEOSERVER_BATCH_BOUNDS_LIMIT:
+        return jsonify({'error': f'At most {GEOSERVER_BATCH_BOUNDS_LIMIT} layers can be requested at once'}), 400
+
+    results = {}
+    summary = {'requested': len(layer_ids), 'unique': len(unique_layer_ids), 'cached': 0,
+               'fetched': 0, 'not_found': 0, 'failed': 0, 'timed_out': 0}
+
+    def record(full_layer_id, bounds):
+        if bounds:
+            results[full_layer_id] = {'bounds': bounds}
+        else:
+            results[full_layer_id] = {'error': 'Lat/lon bounding box not found for this layer or is incomplete.', 'status': 404}
+            summary['not_found'] += 1
+
+    pending_lookups = []
+    for full_layer_id in unique_layer_ids:
+        workspace_name, separator, layer_name = full_layer_id.partition(':')
+        if not separator or not workspace_name or not layer_name:
+            results[full_layer_id] = {'error': "Expected a 'workspace:layer' name", 'status': 400}
+            summary['failed'] += 1
+        elif catalog_cache.peek(bounds_key(workspace_name, layer_name), MISSING) is not MISSING:
+            summary['cached'] += 1
+            record(full_layer_id, get_cached_layer_bounds(workspace_name, layer_name))
+        else:
+            pending_lookups.append((full_layer_id, workspace_name, layer_name))
+
+    if pending_lookups:
+        executor = ThreadPoolExecutor(
+            max_workers=min(GEOSERVER_LAYER_LOOKUP_WORKERS, len(pending_lookups)),
+            thread_name_prefix='bounds-lookup'
+        )
+        futures = {
+            executor.submit(get_cached_layer_bounds, workspace_name, layer_name): full_layer_id
+            for full_layer_id, workspace_name, layer_name in pending_lookups
+        }
+        done, not_done = wait(futures, timeout=GEOSERVER_LAYER_LOOKUP_DEADLINE)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        for future in done:
+            full_layer_id = futures[future]
+            try:
+                record(full_layer_id, future.result())
+                summary['fetched'] += 1
+            except requests.exceptions.RequestException as e:
+                app.logger.warning(f"Error fetching bounds for {full_layer_id} from GeoServer: {e}")
+                response = getattr(e, 'response', None)
+                results[full_layer_id] = {'error': f'Failed to fetch bounds for {full_layer_id}: {e}',
+                                          'status': response.status_code if response is not None else 502}
+                summary['failed'] += 1
+        for future in not_done:
+            results[futures[future]] = {'error': 'Timed out fetching bounds', 'status': 504}
+            summary['timed_out'] += 1
+
+    return jsonify({'results': results, 'crs': 'EPSG:4326', 'summary': summary})
+
+def catalog_snapshot_workspace(workspace_name):
+    """
+    One workspace's entry in the catalog snapshot: layer names by type plus whatever bounds
+    are already known (all of them for GetCapabilities workspaces), without new bounds lookups
+    """
+    layers_payload = catalog_cache.get(
+        layers_key(workspace_name),
+        partial(fetch_workspace_layers, workspace_name),
+        ttl=layers_cache_ttl
+    )
+    workspace_catalog = get_capabilities_catalog(workspace_name) if layers_payload['source'] == 'capabilities' else None
+
+    bounds = {}
+    for layer_name in layers_payload['raster_layers'] + layers_payload['vector_layers']:
+        if workspace_catalog and layer_name in workspace_catalog['layers']:
+            layer_bounds = workspace_catalog['layers'][layer_name].get('bounds')
+        else:
+            layer_bounds = catalog_cache.peek(bounds_key(workspace_name, layer_name))
+        if layer_bounds:
+            bounds[layer_name] = layer_bounds
+
+    return {
+        'name': workspace_name,
+        'raster_layers': layers_payload['raster_layers'],
+        'vector_layers': layers_payload['vector_layers'],
+        'bounds': bounds,
+        'partial': layers_payload['partial']
+    }
+
+def build_catalog_snapshot():
+    """Every workspace with its layers and known bounds, loading uncached workspaces concurrently"""
+    workspace_names = catalog_cache.get(workspaces_key(), fetch_workspace_names)
+    workspaces = []
+    if workspace_names:
+        executor = ThreadPoolExecutor(
+            max_workers=min(GEOSERVER_LAYER_LOOKUP_WORKERS, len(workspace_names)),
+            thread_name_prefix='catalog-snapshot'
+        )
+        futures = [executor.submit(catalog_snapshot_workspace, workspace_name) for workspace_name in workspace_names]
+        executor.shutdown()
+        for workspace_name, future in zip(workspace_names, futures):
+            try:
+                workspaces.append(future.result())
+            except requests.exceptions.RequestException as e:
+                app.logger.warning(f"Catalog snapshot could not load workspace '{workspace_name}': {e}")
+                workspaces.append({'name': workspace_name, 'raster_layers': [], 'vector_layers': [],
+                                   'bounds': {}, 'partial': True, 'error': 'Failed to fetch layers from GeoServer'})
+    return {
+        'format_version': CATALOG_SNAPSHOT_FORMAT_VERSION,
+        'crs': 'EPSG:4326',
+        'workspaces': workspaces,
+        'partial': any(workspace['partial'] for workspace in workspaces)
+    }
+
+@app.route('/api/geoserver/catalog')
+@login_required
+def get_catalog_snapshot():
+    """
+    The whole catalog (workspaces, raster/vector layers, bounds) as one compact document.
+    The ETag is a hash of the content and doubles as its version, so clients revalidate
+    with If-None-Match and get a 304 while nothing has changed.
+    """
+    try:
+        snapshot = build_catalog_snapshot()
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Error building catalog snapshot: {e}")
+        return jsonify({'error': f'Failed to fetch workspaces from GeoServer: {e}'}), 500
+
+    body = json.dumps(snapshot, separators=(',', ':'), sort_keys=True)
+    version = hashlib.sha1(body.encode('utf-8')).hexdigest()[:16]
+    # The version sits outside the hashed content; splice it in without re-serializing
+    body = f'{{"version":"{version}",{body[1:]}'
+
+    # Last modified when the newest catalog entry it was built from was loaded
+    entry_keys = [workspaces_key()]
+    for workspace in snapshot['workspaces']:
+        entry_keys += [layers_key(workspace['name']), capabilities_key(workspace['name'])]
+        entry_keys += [bounds_key(workspace['name'], layer_name)
+                       for layer_name in workspace['raster_layers'] + workspace['vector_layers']]
+    return make_cacheable(app.response_class(body, mimetype='application/json'), 'catalog', etag=version,
+                          last_modified=catalog_cache.fetched_at(entry_keys))
+
+@app.route('/api/geoserver/cache')
+@admin_required
+def get_geoserver_cache_stats():
+    """Catalog cache, layer index and tile cache statistics for the admin dashboard"""
+    return jsonify({**catalog_cache.stats(), 'layer_index': layer_index.stats(), 'tile_cache': tile_cache.stats(),
+                    'metatiles': metatile_renderer.stats(), 'tile_encoding': tile_encoder.stats(),
+                    'simplification': generalizer.stats(), 'thumbnails': thumbnail_renderer.stats(),
+                    'feature_info': feature_info_cache.stats(), 'legend_sprites': legend_sprite_cache.stats()})
+
+@app.route('/api/geoserver/client')
+@admin_required
+def get_geoserver_client_stats():
+    """Health, latency, routing and circuit breaker state of every GeoServer instance"""
+    return jsonify(geoserver.stats())
+
+@app.route('/api/geoserver/cache/invalidate', methods=['POST'])
+@admin_required
+def invalidate_geoserver_cache():
+    """
+    Drop cached catalog entries and tiles. With no body the whole catalog is invalidated;
+    {"workspace": ...} drops one workspace and {"workspace": ..., "layer": ...} one layer.
+    """
+    data = request.get_json(silent=True) or {}
+    workspace_name = data.get('workspace')
+    layer_name = data.get('layer')
+
+    if layer_name and not workspace_name:
+        return jsonify({'success': False, 'message': 'workspace is required when layer is given'}), 400
+
+    if workspace_name and layer_name:
+        removed = int(catalog_cache.delete(bounds_key(workspace_name, layer_name)))
+        # The layer may have been added, removed or retyped, so its workspace listing goes too
+        removed += int(catalog_cache.delete(layers_key(workspace_name)))
+        removed += int(catalog_cache.delete(capabilities_key(workspace_name)))
+        removed += int(catalog_cache.delete(layer_style_key(workspace_name, layer_name)))
+        removed += int(catalog_cache.delete(feature_type_key(workspace_name, layer_name)))
+        removed += catalog_cache.invalidate(legend_prefix(workspace_name, layer_name))
+    elif workspace_name:
+        removed = int(catalog_cache.delete(layers_key(workspace_name)))
+        removed += int(catalog_cache.delete(capabilities_key(workspace_name)))
+        removed += catalog_cache.invalidate(bounds_key(workspace_name, ''))
+        removed += catalog_cache.invalidate(layer_style_key(workspace_name, ''))
+        removed += catalog_cache.invalidate(feature_type_key(workspace_name, ''))
+        removed += catalog_cache.invalidate(legend_prefix(workspace_name))
+        removed += catalog_cache.invalidate(style_key(f'{workspace_name}:'))
+        removed += catalog_cache.invalidate(style_key(f'{workspace_name}/'))
+        removed += int(catalog_cache.delete(workspaces_key()))
+    else:
+        removed = catalog_cache.invalidate()
+    tile_groups_removed = tile_cache.invalidate(workspace_name, layer_name)
+    thumbnails_removed = thumbnail_renderer.store.invalidate(workspace_name, layer_name)
+    feature_info_cache.invalidate(workspace_name, layer_name)
+    legend_sprite_cache.invalidate(workspace_name, layer_name)
+
+    app.logger.info(f"Catalog cache invalidated by {session.get('username')}: {removed} entries, "
+                    f"{tile_groups_removed} tile layer groups and {thumbnails_removed} thumbnails removed")
+    return jsonify({'success': True, 'removed': removed, 'tile_groups_removed': tile_groups_removed,
+                    'thumbnails_removed': thumbnails_removed})
+
+@app.route('/api/geoserver/cache/tiles')
+@admin_required
+def get_tile_cache_stats():
+    """
+    Tile cache hit ratio, bytes by layer group, quota usage and eviction counts, and the
+    bytes saved by re-encoding tiles, per layer list
+    """
+    try:
+        return jsonify({**tile_cache.usage_stats(), 'encoding': tile_encoder.stats()})
+    except OSError as e:
+        app.logger.error(f"Could not read tile cache usage: {e}")
+        return jsonify({'error': 'Could not read tile cache usage'}), 500
+
+@app.route('/api/geoserver/cache/tiles/compact', methods=['POST'])
+@admin_required
+def compact_tile_cache():
+    """Remove expired tiles from the tile cache and return their space to the filesystem"""
+    try:
+        result = tile_cache.compact()
+    except OSError as e:
+        app.logger.error(f"Tile cache compaction failed: {e}")
+        return jsonify({'error': 'Tile cache compaction failed'}), 500
+    app.logger.info(f"Tile cache compacted by {session.get('username')}: {result}")
+    return jsonify({'success': True, **result})
+
+def leaflet_bounds_to_bbox(bounds):
+    """[[south, west], [north, east]] -> (west, south, east, north)"""
+    (south, west), (north, east) = bounds
+    return float(west), float(south), float(east), float(north)
+
+def index_catalog_entry(key, value):
+    """
+    Catalog cache listener that keeps layer_index in step with the catalog: a workspace's
+    GetCapabilities catalog replaces all of its indexed layers, a REST layer list drops
+    layers that no longer exist, and individually fetched bounds update one layer.
+    """
+    kind, _, rest = key.partition(':')
+    if kind == 'capabilities' and value:
+        entries = {
+            f"{value['workspace']}:{layer_name}": (
+                leaflet_bounds_to_bbox(info['bounds']),
+                {'workspace': value['workspace'], 'layer': layer_name,
+                 'type': info['type'], 'title': info.get('title')}
+            )
+            for layer_name, info in value['layers'].items() if info.get('bounds')
+        }
+        changes = layer_index.replace_group(value['workspace'], entries)
+        if any(changes.values()):
+            app.logger.info(f"Layer index updated for workspace {value['workspace']}: {changes}")
+    elif kind == 'layers' and value.get('source') == 'rest' and not value['partial']:
+        layer_names = value['raster_layers'] + value['vector_layers']
+        layer_index.retain_group(rest, [f"{rest}:{layer_name}" for layer_name in layer_names])
+    elif kind == 'bounds':
+        workspace_name, _, layer_name = rest.partition(':')
+        if catalog_cache.peek(capabilities_key(workspace_name)):
+            return  # already indexed, with richer metadata, from the capabilities catalog
+        full_layer_id = f"{workspace_name}:{layer_name}"
+        if not value:
+            layer_index.remove(full_layer_id, workspace_name)
+            return
+        layers_payload = catalog_cache.peek(layers_key(workspace_name)) or {}
+        layer_type = 'vector' if layer_name in layers_payload.get('vector_layers', ()) else (
+            'raster' if layer_name in layers_payload.get('raster_layers', ()) else None)
+        layer_index.upsert(full_layer_id, workspace_name, leaflet_bounds_to_bbox(value),
+                           {'workspace': workspace_name, 'layer': layer_name, 'type': layer_type, 'title': None})
+
+catalog_cache.add_listener(index_catalog_entry)
+
+def index_rest_workspace_bounds(workspace_name, layers_payload):
+    """
+    Fetch (through the cache) the bounds of every layer of a REST-discovered workspace so
+    that it appears in layer_index. Capabilities workspaces are indexed for free.
+    """
+    layer_names = layers_payload['raster_layers'] + layers_payload['vector_layers']
+    if not layer_names:
+        return
+    executor = ThreadPoolExecutor(
+        max_workers=min(GEOSERVER_LAYER_LOOKUP_WORKERS, len(layer_names)),
+        thread_name_prefix='bounds-index'
+    )
+    futures = [executor.submit(get_cached_layer_bounds, workspace_name, layer_name) for layer_name in layer_names]
+    wait(futures)
+    executor.shutdown()
+    failed = [future for future in futures if future.exception() is not None]
+    if failed:
+        app.logger.warning(f"Could not index {len(failed)} layers of workspace {workspace_name}: {failed[0].exception()}")
+
+@app.route('/api/geoserver/layers_in_view')
+@login_required
+def get_layers_in_view():
+    """
+    Returns the layers whose lat/lon extent intersects a viewport, most relevant first.
+    Query: bbox=west,south,east,north (EPSG:4326, Leaflet's toBBoxString()), optional
+    limit, type (raster|vector) and workspace filters. Answered from layer_index only.
+    """
+    try:
+        west, south, east, north = (float(v) for v in request.args.get('bbox', '').split(','))
+    except ValueError:
+        return jsonify({'error': "bbox must be 'west,south,east,north' in degrees"}), 400
+    if west > east or south > north:
+        return jsonify({'error': 'bbox must have west <= east and south <= north'}), 400
+
+    try:
+        limit = min(int(request.args.get('limit', LAYERS_IN_VIEW_LIMIT)), LAYERS_IN_VIEW_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    layer_type = request.args.get('type')
+    workspace_name = request.args.get('workspace')
+
+    def wanted(layer):
+        return ((not layer_type or layer['type'] == layer_type)
+                and (not workspace_name or layer['workspace'] == workspace_name))
+
+    started = time.perf_counter()
+    matches, total = layer_index.query((west, south, east, north), limit=max(limit, 0), predicate=wanted)
+    query_ms = (time.perf_counter() - started) * 1000
+
+    layers = [
+        {
+            'id': match['key'],
+            'workspace': match['workspace'],
+            'layer': match['layer'],
+            'type': match['type'],
+            'title': match['title'],
+            'bounds': [[match['bbox'][1], match['bbox'][0]], [match['bbox'][3], match['bbox'][2]]],
+            'view_coverage': match['view_coverage'],
+            'layer_in_view': match['layer_in_view']
+        }
+        for match in matches
+    ]
+    return jsonify({
+        'layers': layers,
+        'total': total,
+        'indexed_layers': len(layer_index),
+        'query_ms': round(query_ms, 3),
+        'crs': 'EPSG:4326'
+    })
+
+def warm_catalog_cache():
+    """
+    Prefetch workspaces and their layer lists so the first map load is answered from memory,
+    and fill layer_index with every layer's extent
+    """
+    try:
+        for workspace_name in catalog_cache.get(workspaces_key(), fetch_workspace_names):
+            layers_payload = catalog_cache.get(layers_key(workspace_name),
+                                               partial(fetch_workspace_layers, workspace_name),
+                                               ttl=layers_cache_ttl)
+            if layers_payload['source'] == 'rest':
+                index_rest_workspace_bounds(workspace_name, layers_payload)
+        app.logger.info(f"Catalog cache warmed: {catalog_cache.stats()['entries']} entries, "
+                        f"{len(layer_index)} layers indexed")
+    except requests.exceptions.RequestException as e:
+        app.logger.warning(f"Catalog cache warm-up failed: {e}")
+
+def fetch_rest_layer_state(layer_detail_href):
+    """
+    (fingerprint, type) of a REST layer. The layer and its resource (which holds the bounds)
+    are both read; their dateModified timestamps are the fingerprint when GeoServer reports
+    them, a hash of the two documents otherwise.
+    """
+    try:
+        detailed_layer_data, _ = catalog_getter.get_json(layer_detail_href, timeout=GEOSERVER_LAYER_LOOKUP_TIMEOUT)
+        layer = detailed_layer_data.get('layer', {})
+        resource_data = {}
+        if layer.get('resource', {}).get('href'):
+            resource_data, _ = catalog_getter.get_json(layer['resource']['href'], timeout=GEOSERVER_LAYER_LOOKUP_TIMEOUT)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        app.logger.warning(f"Catalog sync could not read layer at '{layer_detail_href}': {e}")
+        return None, None
+
+    resource = next(iter(resource_data.values()), {}) if resource_data else {}
+    if layer.get('dateModified') and resource.get('dateModified'):
+        fingerprint = f"{layer['dateModified']}|{resource['dateModified']}"
+    else:
+        fingerprint = layer_fingerprint([layer, resource])
+    return fingerprint, layer_type_from_detail(detailed_layer_data)
+
+def snapshot_workspace_for_sync(workspace_name):
+    """
+    Fingerprint every layer of a workspace. With GetCapabilities this is two requests and
+    covers bounds and styles too; otherwise two (conditional) REST reads per layer.
+    """
+    if CATALOG_USE_CAPABILITIES:
+        workspace_catalog = load_capabilities_catalog(workspace_name)
+        if workspace_catalog:
+            snapshot = {name: layer_fingerprint(info) for name, info in workspace_catalog['layers'].items()}
+            return snapshot, ('capabilities', workspace_catalog)
+
+    layers_summary_data, _ = catalog_getter.get_json(f"rest/workspaces/{workspace_name}/layers.json")
+    layers_list = layers_summary_data.get('layers', {}).get('layer', [])
+    if isinstance(layers_list, dict):
+        layers_list = [layers_list]
+    layers_list = [layer_info for layer_info in layers_list if layer_info.get('name') and layer_info.get('href')]
+
+    executor = ThreadPoolExecutor(max_workers=GEOSERVER_LAYER_LOOKUP_WORKERS, thread_name_prefix='catalog-sync-layer')
+    try:
+        states = list(executor.map(fetch_rest_layer_state, [layer_info['href'] for layer_info in layers_list]))
+    finally:
+        executor.shutdown()
+
+    snapshot = {}
+    layer_types = {}
+    for layer_info, (fingerprint, layer_type) in zip(layers_list, states):
+        snapshot[layer_info['name']] = fingerprint
+        layer_types[layer_info['name']] = layer_type
+    return snapshot, ('rest', layer_types)
+
+def apply_catalog_delta(workspace_name, delta, payload):
+    """
+    Apply one workspace's catalog changes to the catalog cache and the tile cache; layer_index
+    follows through the cache listener. Only the added, removed and changed layers are touched.
+    """
+    stale_thumbnails = []
+    for layer_name in delta['removed'] + delta['changed']:
+        catalog_cache.delete(bounds_key(workspace_name, layer_name))
+        catalog_cache.delete(layer_style_key(workspace_name, layer_name))
+        catalog_cache.delete(feature_type_key(workspace_name, layer_name))
+        catalog_cache.invalidate(legend_prefix(workspace_name, layer_name))
+        tile_cache.invalidate(workspace_name, layer_name)
+        feature_info_cache.invalidate(workspace_name, layer_name)
+        legend_sprite_cache.invalidate(workspace_name, layer_name)
+        if thumbnail_renderer.store.invalidate(workspace_name, layer_name) and layer_name in delta['changed']:
+            stale_thumbnails.append(layer_name)
+    for layer_name in delta['removed']:
+        layer_index.remove(f"{workspace_name}:{layer_name}", workspace_name)
+
+    if delta['workspace_removed']:
+        tile_cache.invalidate(workspace_name)
+        thumbnail_renderer.store.invalidate(workspace_name)
+        feature_info_cache.invalidate(workspace_name)
+        legend_sprite_cache.invalidate(workspace_name)
+        catalog_cache.invalidate(legend_prefix(workspace_name))
+        catalog_cache.delete(layers_key(workspace_name))
+        catalog_cache.delete(capabilities_key(workspace_name))
+        layer_index.replace_group(workspace_name, {})
+        return
+
+    source, data = payload
+    if source == 'capabilities':
+        catalog_cache.set(capabilities_key(workspace_name), data)
+        catalog_cache.set(layers_key(workspace_name), layers_payload_from_capabilities(workspace_name, data),
+                          ttl=layers_cache_ttl)
+        refresh_layer_thumbnails(workspace_name, stale_thumbnails)
+        return
+
+    # REST workspace: patch the cached layer lists instead of re-resolving every layer
+    catalog_cache.delete(capabilities_key(workspace_name))
+    layers_payload = catalog_cache.peek(layers_key(workspace_name))
+    if layers_payload is None or layers_payload.get('source') != 'rest':
+        lists = {'raster': [], 'vector': []}
+        updated_layers = list(data)
+    else:
+        lists = {'raster': list(layers_payload['raster_layers']), 'vector': list(layers_payload['vector_layers'])}
+        updated_layers = delta['added'] + delta['changed']
+
+    for layer_name in delta['removed'] + updated_layers:
+        for names in lists.values():
+            if layer_name in names:
+                names.remove(layer_name)
+    for layer_name in updated_layers:
+        if data.get(layer_name) in lists:
+            lists[data[layer_name]].append(layer_name)
+
+    resolved = len(lists['raster']) + len(lists['vector'])
+    catalog_cache.set(layers_key(workspace_name), {
+        'workspace': workspace_name,
+        'raster_layers': lists['raster'],
+        'vector_layers': lists['vector'],
+        'partial': resolved < len(data),
+        'lookup_summary': {'total': len(data), 'resolved': resolved, 'unknown_type': 0, 'skipped': 0,
+                           'failed': len(data) - resolved, 'timed_out': 0},
+        'source': 'rest'
+    }, ttl=layers_cache_ttl)
+
+    # Re-read bounds only for layers that are new or changed, keeping layer_index current
+    for layer_name in updated_layers:
+        if data.get(layer_name):
+            try:
+                get_cached_layer_bounds(workspace_name, layer_name)
+            except requests.exceptions.RequestException as e:
+                app.logger.warning(f"Catalog sync could not refresh bounds of {workspace_name}:{layer_name}: {e}")
+    refresh_layer_thumbnails(workspace_name, stale_thumbnails)
+
+def refresh_layer_thumbnails(workspace_name, layer_names):
+    """Re-render, in the background, the thumbnails a catalog change made stale"""
+    for layer_name in layer_names:
+        thumbnail_renderer.refresh(workspace_name, layer_name,
+                                   partial(layer_thumbnail_source, workspace_name, layer_name))
+
+def apply_workspace_list(workspace_names, added, removed):
+    catalog_cache.set(workspaces_key(), workspace_names)
+
+catalog_getter = ConditionalGetter(geoserver)
+catalog_sync = CatalogSyncJob(
+    fetch_workspace_names, snapshot_workspace_for_sync, apply_catalog_delta,
+    apply_workspaces=apply_workspace_list, interval=CATALOG_SYNC_INTERVAL
+)
+
+@app.route('/api/geoserver/catalog/sync')
+@admin_required
+def get_catalog_sync_status():
+    """Catalog freshness: last sync time, duration and added/removed/changed counts"""
+    return jsonify({
+        **catalog_sync.stats(),
+        'enabled': CATALOG_SYNC_INTERVAL > 0,
+        'conditional_requests': {'not_modified': catalog_getter.not_modified, 'modified': catalog_getter.modified}
+    })
+
+@app.route('/api/geoserver/catalog/sync', methods=['POST'])
+@admin_required
+def trigger_catalog_sync():
+    """Run a catalog sync now instead of waiting for the next interval"""
+    if CATALOG_SYNC_INTERVAL > 0:
+        catalog_sync.trigger()
+        return jsonify({'success': True, 'message': 'Catalog sync scheduled'}), 202
+    try:
+        return jsonify({'success': True, 'diff': catalog_sync.run_once()})
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Catalog sync failed: {e}")
+        return jsonify({'success': False, 'error': f'Catalog sync failed: {e}'}), 500
+
+if len(geoserver.instances) > 1:
+    # A single instance is covered by its circuit breaker; several need routing state
+    geoserver.start_health_checks()
+
+tile_cache.start_eviction()
+
+if CATALOG_SYNC_INTERVAL > 0:
+    # The first sync loads every workspace into the cache, so it doubles as the warm-up
+    catalog_sync.start(initial_delay=0 if CATALOG_WARM_ON_START else CATALOG_SYNC_INTERVAL)
+elif CATALOG_WARM_ON_START:
+    threading.Thread(target=warm_catalog_cache, name='catalog-warmup', daemon=True).start()
+
+def fetch_getmap_image(workspace_name, params):
+    """
+    Image bytes of a GetMap against a workspace's WMS endpoint. Raises TileUpstreamError
+    when GeoServer answers with an error instead of an image (it reports rendering errors
+    as 200 responses with an XML ServiceException), requests exceptions otherwise.
+    """
+    response = geoserver.get(f"{workspace_name}/wms", params=params, timeout=TILE_PROXY_TIMEOUT)
+    if response.status_code != 200 or not response.headers.get('Content-Type', '').startswith('image/'):
+        raise TileUpstreamError(f"HTTP {response.status_code}: {response.text[:500]}")
+    return response.content
+
+metatile_renderer = MetatileRenderer(fetch_getmap_image, tile_cache, size=METATILE_SIZE, gutter=METATILE_GUTTER)
+
+def cached_layers_type(layers):
+    """
+    'raster' or 'vector' when every layer of a GetMap LAYERS list has that type in the cached
+    catalog, None when they are mixed or not known yet. Never fetches.
+    """
+    layer_types = set()
+    for full_name in layers.split(','):
+        workspace_name, _, layer_name = full_name.partition(':')
+        layers_payload = catalog_cache.peek(layers_key(workspace_name)) or {}
+        if layer_name in layers_payload.get('raster_layers', ()):
+            layer_types.add('raster')
+        elif layer_name in layers_payload.get('vector_layers', ()):
+            layer_types.add('vector')
+        else:
+            workspace_catalog = catalog_cache.peek(capabilities_key(workspace_name)) or {}
+            layer_info = workspace_catalog.get('layers', {}).get(layer_name)
+            if layer_info is None:
+                return None
+            layer_types.add(layer_info['type'])
+    return layer_types.pop() if len(layer_types) == 1 else None
+
+def cached_tile_entry(layers, key, image_format, mimetype):
+    """
+    (entry, None) with a tile's tile_cache entry (None on a miss), or (None, response) with
+    a 304 when the request revalidates a cached tile that has not changed. A revalidation is
+    answered from the tile's stored validators, without reading the tile.
+    """
+    conditional = bool(request.if_none_match or request.if_modified_since)
+    entry = tile_cache.get_entry(layers, key, image_format, with_data=not conditional)
+    if entry is not None and entry.data is None:
+        not_modified = make_cacheable(app.response_class(mimetype=mimetype), 'tile', etag=entry.etag,
+                                      last_modified=entry.modified)
+        if not_modified.status_code == 304:
+            not_modified.headers['X-Tile-Cache'] = 'HIT'
+            return None, not_modified
+        # The validators did not match: read the tile, without counting the lookup again
+        entry = tile_cache.get_entry(layers, key, image_format, record=False)
+    return entry, None
+
+def render_wms_tile(workspace_name, params, key):
+    """
+    Image bytes of a GetMap that missed tile_cache, fetched from GeoServer and cached.
+    Web Mercator grid tiles are rendered with the whole metatile around them.
+    """
+    tile = grid_tile(params) if metatile_renderer.can_render(params) else None
+    if tile is not None:
+        return metatile_renderer.render(workspace_name, params, key, tile)
+    data = fetch_getmap_image(workspace_name, params)
+    tile_cache.put(params['LAYERS'], key, params['FORMAT'], data)
+    return data
+
+def serve_wms_tile(workspace_name, args):
+    """
+    Serve a GetMap from tile_cache, forwarding misses to GeoServer and caching the image.
+    PNG tiles are served in the variant tile_encoder negotiates from the Accept header,
+    which is cached under its own key next to the PNG. The X-Tile-Cache response header
+    says whether the tile was served without asking GeoServer.
+    """
+    try:
+        params = canonical_getmap_params(args, workspace_name, max_size=TILE_PROXY_MAX_SIZE)
+    except TileRequestError as e:
+        return jsonify({'error': str(e)}), 400
+
+    key = tile_cache_key(workspace_name, params)
+    layer_type = cached_layers_type(params['LAYERS'])
+    variant = tile_encoder.variant_for(params, layer_type, request.accept_mimetypes)
+    # A PNG served as rendered is also a choice made from Accept
+    varies = variant is not None or (tile_encoder.enabled and params['FORMAT'] == 'image/png')
+    served_key = key
+    if variant is not None:
+        served_key = tile_cache_key(workspace_name, {**params, 'ENCODING': f"{variant}/{layer_type or 'unknown'}"})
+    mimetype = format_content_type(params['FORMAT'])
+    entry, not_modified = cached_tile_entry(params['LAYERS'], served_key, params['FORMAT'], mimetype)
+    if not_modified is not None:
+        if varies:
+            not_modified.vary.add('Accept')
+        return not_modified
+    data = entry.data if entry is not None else None
+    cached = data is not None
+    if data is None:
+        try:
+            if variant is not None:
+                # The PNG may be cached already, for another variant
+                data = tile_cache.get(params['LAYERS'], key, params['FORMAT'])
+                cached = data is not None
+            if data is None:
+                data = render_wms_tile(workspace_name, params, key)
+            if variant is not None:
+                data = tile_encoder.encode(params['LAYERS'], data, variant, layer_type)
+                tile_cache.put(params['LAYERS'], served_key, params['FORMAT'], data)
+        except requests.exceptions.RequestException as e:
+            app.logger.error(f"Error fetching tile of {params['LAYERS']} from GeoServer: {e}")
+            return jsonify({'error': f'Failed to fetch tile from GeoServer: {e}'}), 500
+        except (TileUpstreamError, OSError) as e:
+            # OSError: Pillow could not decode the metatile or the tile to re-encode
+            app.logger.warning(f"GeoServer did not render tile of {params['LAYERS']}: {e}")
+            return jsonify({'error': 'GeoServer could not render the tile', 'details': str(e)}), 500
+
+    if variant is not None:
+        # A variant may have been stored as the PNG itself when encoding did not pay off
+        mimetype = sniff_image_type(data) or mimetype
+        tile_encoder.record_served(params['LAYERS'], len(data))
+    tile_response = make_cacheable(app.response_class(data, mimetype=mimetype), 'tile',
+                                   etag=entry.etag if entry is not None else None,
+                                   last_modified=entry.modified if entry is not None else time.time())
+    if varies:
+        tile_response.vary.add('Accept')
+    tile_response.headers['X-Tile-Cache'] = 'HIT' if cached else 'MISS'
+    return tile_response
+
+@app.route('/api/tiles/wms/<workspace_name>')
+@login_required
+def get_wms_tile(workspace_name):
+    """WMS GetMap proxy for L.tileLayer.wms, served from the shared tile cache"""
+    return serve_wms_tile(workspace_name, request.args)
+
+@app.route('/api/tiles/<workspace_name>/<layer_name>/<int:z>/<int:x>/<int:y>.png')
+@login_required
+def get_xyz_tile(workspace_name, layer_name, z, x, y):
+    """XYZ (Web Mercator, 256px) tile of one layer; shares cache entries with the WMS route"""
+    try:
+        params = tile_request_params(
+            f"{workspace_name}:{layer_name}", z, x, y, styles=request.args.get('styles', ''),
+            transparent=request.args.get('transparent', 'true').lower() == 'true'
+        )
+    except TileRequestError as e:
+        return jsonify({'error': str(e)}), 400
+    return serve_wms_tile(workspace_name, params)
+
+def fetch_wfs_features(workspace_name, layer_name, bbox):
+    """
+    GeoJSON features of a layer within an EPSG:3857 bbox, in EPSG:3857, at most
+    MVT_MAX_FEATURES of them. Raises TileUpstreamError when GeoServer answers with an
+    error instead of GeoJSON, requests exceptions otherwise.
+    """
+    params = {
+        'SERVICE': 'WFS',
+        'VERSION': '2.0.0',
+        'REQUEST': 'GetFeature',
+        'TYPENAMES': f'{workspace_name}:{layer_name}',
+        'OUTPUTFORMAT': 'application/json',
+        'SRSNAME': 'EPSG:3857',
+        'BBOX': ','.join(repr(value) for value in bbox) + ',EPSG:3857',
+        'COUNT': str(MVT_MAX_FEATURES)
+    }
+    response = geoserver.get(f"{workspace_name}/wfs", params=params, timeout=TILE_PROXY_TIMEOUT)
+    if response.status_code != 200 or 'json' not in response.headers.get('Content-Type', ''):
+        raise TileUpstreamError(f"HTTP {response.status_code}: {response.text[:500]}")
+    try:
+        features = response.json().get('features') or []
+    except ValueError as e:
+        raise TileUpstreamError(f'Invalid GeoJSON: {e}')
+    if len(features) >= MVT_MAX_FEATURES:
+        app.logger.warning(f"Vector tile of {workspace_name}:{layer_name} at {bbox} truncated to "
+                           f"{MVT_MAX_FEATURES} features")
+    return features
+
+@app.route('/api/tiles/mvt/<workspace_name>/<layer_name>/<int:z>/<int:x>/<int:y>.pbf')
+@login_required
+def get_vector_tile(workspace_name, layer_name, z, x, y):
+    """
+    Mapbox Vector Tile of a vector layer (XYZ, Web Mercator), built from the layer's WFS
+    features, so clients style it themselves. Cached in tile_cache with the layer's other
+    tiles, so it is dropped when the layer changes.
+    """
+    if z < 0 or not (0 <= x < (1 << z)) or not (0 <= y < (1 << z)):
+        return jsonify({'error': f'Tile {z}/{x}/{y} is outside the tile grid'}), 400
+    full_layer_name = f"{workspace_name}:{layer_name}"
+    if cached_layers_type(full_layer_name) == 'raster':
+        return jsonify({'error': f"'{full_layer_name}' is a raster layer"}), 400
+
+    key = tile_cache_key(workspace_name, {'LAYERS': full_layer_name, 'FORMAT': MVT_CONTENT_TYPE,
+                                          'TILE': f'{z}/{x}/{y}', 'EXTENT': str(MVT_EXTENT),
+                                          'BUFFER': str(MVT_BUFFER)})
+    entry, not_modified = cached_tile_entry(full_layer_name, key, MVT_CONTENT_TYPE, MVT_CONTENT_TYPE)
+    if not_modified is not None:
+        return not_modified
+    data = entry.data if entry is not None else None
+    if data is None:
+        bounds = tile_bbox(z, x, y)
+        margin = (bounds[2] - bounds[0]) * MVT_BUFFER / MVT_EXTENT
+        try:
+            features = fetch_wfs_features(workspace_name, layer_name,
+                                          [bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin])
+        except requests.exceptions.RequestException as e:
+            app.logger.error(f"Error fetching features of {full_layer_name} from GeoServer: {e}")
+            return jsonify({'error': f'Failed to fetch features from GeoServer: {e}'}), 500
+        except TileUpstreamError as e:
+            app.logger.warning(f"GeoServer did not return features of {full_layer_name}: {e}")
+            return jsonify({'error': 'GeoServer could not return the features', 'details': str(e)}), 500
+        data = encode_vector_tile([(layer_name, features)], bounds, extent=MVT_EXTENT, buffer=MVT_BUFFER)
+        tile_cache.put(full_layer_name, key, MVT_CONTENT_TYPE, data)
+
+    tile_response = make_cacheable(app.response_class(data, mimetype=MVT_CONTENT_TYPE), 'tile',
+                                   etag=entry.etag if entry is not None else None,
+                                   last_modified=entry.modified if entry is not None else time.time())
+    tile_response.headers['X-Tile-Cache'] = 'HIT' if entry is not None else 'MISS'
+    return tile_response
+
+def fetch_feature_type_schema(workspace_name, layer_name):
+    """
+    The layer's geometry and attribute names from WFS DescribeFeatureType, or None when
+    GeoServer does not describe it as a feature type
+    """
+    params = {
+        'SERVICE': 'WFS',
+        'VERSION': '2.0.0',
+        'REQUEST': 'DescribeFeatureType',
+        'TYPENAMES': f'{workspace_name}:{layer_name}',
+        'OUTPUTFORMAT': 'application/json'
+    }
+    response = geoserver.get(f"{workspace_name}/wfs", params=params)
+    if response.status_code >= 500:
+        response.raise_for_status()
+    try:
+        return feature_type_schema(response.json()) if response.status_code == 200 else None
+    except ValueError:
+        app.logger.warning(f"No feature type description for {workspace_name}:{layer_name}: {response.text[:200]}")
+        return None
+
+def feature_type_cache_ttl(schema):
+    return CATALOG_CACHE_TTL if schema else CATALOG_PARTIAL_TTL
+
+def cached_feature_type_schema(workspace_name, layer_name):
+    return catalog_cache.get(feature_type_key(workspace_name, layer_name),
+                             partial(fetch_feature_type_schema, workspace_name, layer_name),
+                             ttl=feature_type_cache_ttl)
+
+def fetch_wfs_page(workspace_name, params):
+    """One GetFeature page as a GeoJSON dict; raises WFSStreamError when GeoServer answers otherwise"""
+    response = geoserver.get(f"{workspace_name}/wfs", params=params, timeout=WFS_STREAM_TIMEOUT)
+    if response.status_code != 200 or 'json' not in response.headers.get('Content-Type', ''):
+        raise WFSStreamError(f"HTTP {response.status_code}: {response.text[:500]}")
+    try:
+        return response.json()
+    except ValueError as e:
+        raise WFSStreamError(f'Invalid GeoJSON: {e}')
+
+@app.route('/api/geoserver/wfs/<workspace_name>/<layer_name>')
+@login_required
+def stream_wfs_features(workspace_name, layer_name):
+    """
+    A vector layer's features, streamed page by page from WFS GetFeature so that layers of
+    any size pass through in bounded memory. Query: optional bbox=west,south,east,north
+    (degrees), properties=a,b (attributes to return), format=geojson|ndjson and limit.
+    """
+    output_format = request.args.get('format', 'geojson').lower()
+    if output_format not in STREAM_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(STREAM_FORMATS)}"}), 400
+    bbox = None
+    if request.args.get('bbox'):
+        try:
+            bbox = [float(v) for v in request.args['bbox'].split(',')]
+            west, south, east, north = bbox
+        except ValueError:
+            return jsonify({'error': "bbox must be 'west,south,east,north' in degrees"}), 400
+        if west > east or south > north:
+            return jsonify({'error': 'bbox must have west <= east and south <= north'}), 400
+    try:
+        limit = min(int(request.args.get('limit', WFS_STREAM_MAX_FEATURES)), WFS_STREAM_MAX_FEATURES)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+
+    full_layer_name = f"{workspace_name}:{layer_name}"
+    try:
+        schema = cached_feature_type_schema(workspace_name, layer_name)
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Error describing {full_layer_name} on GeoServer: {e}")
+        return jsonify({'error': f'Failed to describe the layer on GeoServer: {e}'}), 500
+    if schema is None:
+        return jsonify({'error': f"'{full_layer_name}' is not a WFS feature type"}), 404
+    properties = None
+    if request.args.get('properties'):
+        properties = [name.strip() for name in request.args['properties'].split(',') if name.strip()]
+        unknown = sorted(set(properties) - set(schema['properties']))
+        if unknown:
+            return jsonify({'error': f"Unknown properties: {', '.join(unknown)}",
+                            'properties': schema['properties']}), 400
+
+    pager = WFSPager(partial(fetch_wfs_page, workspace_name), full_layer_name, bbox=bbox, properties=properties,
+                     geometry_name=schema['geometry'], page_size=WFS_STREAM_PAGE_SIZE, max_features=limit)
+    try:
+        chunks = stream_features(pager, output_format, prefetch_pages=WFS_STREAM_PREFETCH_PAGES)
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Error fetching features of {full_layer_name} from GeoServer: {e}")
+        return jsonify({'error': f'Failed to fetch features from GeoServer: {e}'}), 500
+    except WFSStreamError as e:
+        app.logger.warning(f"GeoServer did not return features of {full_layer_name}: {e}")
+        return jsonify({'error': 'GeoServer could not return the features', 'details': str(e)}), 500
+    response = app.response_class(chunks, mimetype=STREAM_FORMATS[output_format])
+    response.headers['Cache-Control'] = 'private, no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass chunks on as they come
+    return response
+
+@app.route('/api/geoserver/simplified/<workspace_name>/<layer_name>/<int:z>/<int:x>/<int:y>.geojson')
+@login_required
+def get_simplified_features(workspace_name, layer_name, z, x, y):
+    """
+    The features of a vector layer that meet an XYZ tile, as GeoJSON simplified for the zoom
+    band of z. Each tile is built from its own WFS pages, so a build holds one tile's features,
+    and kept in tile_cache with the layer's tiles, so it is dropped when the layer changes.
+    """
+    if z < 0 or not (0 <= x < (1 << z)) or not (0 <= y < (1 << z)):
+        return jsonify({'error': f'Tile {z}/{x}/{y} is outside the tile grid'}), 400
+    band = generalizer.band(z)
+    if band is None:
+        return jsonify({'error': f'No simplification above zoom {generalizer.bands[-1][1]}; '
+                                 f'use /api/geoserver/wfs/{workspace_name}/{layer_name} for full resolution'}), 400
+
+    full_layer_name = f"{workspace_name}:{layer_name}"
+    image_format = 'application/geo+json'
+    key = tile_cache_key(workspace_name, {'LAYERS': full_layer_name, 'FORMAT': image_format,
+                                          'TILE': f'{z}/{x}/{y}', 'BAND': f'{band[0]}-{band[1]}',
+                                          'METHOD': generalizer.method,
+                                          'TOLERANCE': str(generalizer.tolerance_px)})
+    entry, not_modified = cached_tile_entry(full_layer_name, key, image_format, image_format)
+    if not_modified is not None:
+        return not_modified
+    data = entry.data if entry is not None else None
+    if data is None:
+        with generalizer.building(key):
+            entry = tile_cache.get_entry(full_layer_name, key, image_format)
+            data = entry.data if entry is not None else None
+            if data is None:
+                try:
+                    schema = cached_feature_type_schema(workspace_name, layer_name)
+                    if schema is None:
+                        return jsonify({'error': f"'{full_layer_name}' is not a WFS feature type"}), 404
+                    minx, miny, maxx, maxy = tile_bbox(z, x, y)
+                    pager = WFSPager(partial(fetch_wfs_page, workspace_name), full_layer_name,
+                                     bbox=mercator_to_lonlat(minx, miny) + mercator_to_lonlat(maxx, maxy),
+                                     geometry_name=schema['geometry'], page_size=WFS_STREAM_PAGE_SIZE,
+                                     max_features=SIMPLIFY_MAX_FEATURES)
+                    collection = generalizer.generalize(full_layer_name, pager, band)
+                except requests.exceptions.RequestException as e:
+                    app.logger.error(f"Error fetching features of {full_layer_name} from GeoServer: {e}")
+                    return jsonify({'error': f'Failed to fetch features from GeoServer: {e}'}), 500
+                except WFSStreamError as e:
+                    app.logger.warning(f"GeoServer did not return features of {full_layer_name}: {e}")
+                    return jsonify({'error': 'GeoServer could not return the features', 'details': str(e)}), 500
+                collection['generalization']['truncated'] = pager.truncated
+                app.logger.info(f"Simplified {full_layer_name} tile {z}/{x}/{y} for zoom {band[0]}-{band[1]}: "
+                                f"{collection['generalization']}")
+                data = json.dumps(collection, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+                tile_cache.put(full_layer_name, key, image_format, data)
+
+    response = make_cacheable(app.response_class(data, mimetype=image_format), 'tile',
+                              etag=entry.etag if entry is not None else None,
+                              last_modified=entry.modified if entry is not None else time.time())
+    response.headers['X-Tile-Cache'] = 'HIT' if entry is not None else 'MISS'
+    return response
+
+def layer_thumbnail_source(workspace_name, layer_name):
+    """(version, GetMap params) of a layer's thumbnail, or None when the layer has no bounds"""
+    bounds = get_cached_layer_bounds(workspace_name, layer_name)
+    if not bounds:
+        return None
+    return thumbnail_renderer.source(f"{workspace_name}:{layer_name}", bounds)
+
+@app.route('/api/geoserver/thumbnail/<workspace_name>/<layer_name>')
+@login_required
+def get_layer_thumbnail(workspace_name, layer_name):
+    """
+    A small preview of a layer's full extent, for the layer panel. A missing thumbnail is
+    rendered by the background pool; when that takes longer than THUMBNAIL_RENDER_WAIT the
+    response is a 202 with Retry-After, and the render carries on.
+    """
+    full_layer_name = f"{workspace_name}:{layer_name}"
+    try:
+        source = layer_thumbnail_source(workspace_name, layer_name)
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Error fetching bounds of {full_layer_name} from GeoServer: {e}")
+        return jsonify({'error': f'Failed to fetch bounds of {full_layer_name}: {e}'}), 500
+    if source is None:
+        return jsonify({'error': f"'{full_layer_name}' has no bounding box to preview"}), 404
+    version, params = source
+
+    # Revalidations are answered from the stored ETag, without reading the image
+    store = thumbnail_renderer.store
+    conditional = bool(request.if_none_match or request.if_modified_since)
+    entry = store.get(workspace_name, layer_name, version, with_data=not conditional)
+    if entry is not None and entry.data is None:
+        not_modified = make_cacheable(app.response_class(), 'thumbnail', etag=entry.etag,
+                                      last_modified=entry.modified)
+        if not_modified.status_code == 304:
+            return not_modified
+        entry = store.get(workspace_name, layer_name, version, record=False)
+
+    if entry is None:
+        try:
+            entry = thumbnail_renderer.submit(workspace_name, layer_name, version, params).result(
+                timeout=THUMBNAIL_RENDER_WAIT)
+        except FutureTimeoutError:
+            response = jsonify({'status': 'rendering'})
+            response.status_code = 202
+            response.headers['Retry-After'] = '2'
+            return response
+        except requests.exceptions.RequestException as e:
+            app.logger.error(f"Error fetching thumbnail of {full_layer_name} from GeoServer: {e}")
+            return jsonify({'error': f'Failed to fetch thumbnail from GeoServer: {e}'}), 500
+        except (TileUpstreamError, OSError) as e:
+            # OSError: Pillow could not decode the GetMap response
+            app.logger.warning(f"GeoServer did not render thumbnail of {full_layer_name}: {e}")
+            return jsonify({'error': 'GeoServer could not render the thumbnail', 'details': str(e)}), 500
+
+    return make_cacheable(app.response_class(entry.data, mimetype=sniff_image_type(entry.data) or 'image/png'),
+                          'thumbnail', etag=entry.etag, last_modified=entry.modified)
+
+def fetch_legend_graphic(workspace_name, layer_name, style_name):
+    """
+    GetLegendGraphic PNG of a layer as {'content_type', 'data', 'etag'}, or None when GeoServer
+    answers with an error document instead of an image
+    """
+    params = {
+        'SERVICE': 'WMS',
+        'REQUEST': 'GetLegendGraphic',
+        'VERSION': '1.0.0',
+        'FORMAT': 'image/png',
+        'LAYER': f'{workspace_name}:{layer_name}',
+        'STYLE': style_name
+    }
+    response = geoserver.get(f"{workspace_name}/wms", params=params)
+    if response.status_code >= 500:
+        response.raise_for_status()
+    content_type = response.headers.get('Content-Type', '')
+    if response.status_code != 200 or not content_type.startswith('image/'):
+        app.logger.warning(f"No legend graphic for {workspace_name}:{layer_name}: {response.text[:200]}")
+        return None
+    return {'content_type': format_content_type(content_type), 'data': response.content,
+            'etag': content_etag(response.content)}
+
+def legend_cache_ttl(legend):
+    return CATALOG_CACHE_TTL if legend else CATALOG_PARTIAL_TTL
+
+def get_cached_legend(workspace_name, layer_name, style_name=''):
+    """
+    A layer's legend image as {'content_type', 'data', 'etag'} from the catalog cache, or None
+    when GeoServer has none; fetched from GeoServer once per layer and style. Layers missing
+    from the workspace's capabilities catalog get None without a cache entry.
+    """
+    workspace_catalog = get_capabilities_catalog(workspace_name)
+    if workspace_catalog and layer_name not in workspace_catalog['layers']:
+        return None
+    return catalog_cache.get(
+        legend_key(workspace_name, layer_name, style_name),
+        partial(fetch_legend_graphic, workspace_name, layer_name, style_name),
+        ttl=legend_cache_ttl
+    )
+
+def parse_sprite_layers(args):
+    """
+    [(workspace, layer, style)] from ?layers=ws:layer,...&styles=..., with styles matched to
+    layers by position as in WMS. Raises ValueError for a malformed list.
+    """
+    names = [name.strip() for name in args.get('layers', '').split(',') if name.strip()]
+    if not names:
+        raise ValueError('layers is required')
+    if len(names) > LEGEND_SPRITE_MAX_LAYERS:
+        raise ValueError(f'At most {LEGEND_SPRITE_MAX_LAYERS} layers per sprite')
+    styles = args.get('styles', '').split(',') if args.get('styles') else []
+    if styles and len(styles) != len(names):
+        raise ValueError('styles must list one style (possibly empty) per layer')
+    entries = []
+    for index, name in enumerate(names):
+        workspace_name, sep, layer_name = name.partition(':')
+        if not sep or not workspace_name or not layer_name:
+            raise ValueError(f"Layer '{name}' must be workspace:layer")
+        entries.append((workspace_name, layer_name, styles[index].strip() if styles else ''))
+    return entries
+
+def build_legend_sprite(entries):
+    """
+    The legends of [(workspace, layer, style)] packed into one sprite, as {'png', 'etag',
+    'width', 'height', 'legends': {ws:layer: offsets}, 'missing': [ws:layer]}. Legends come
+    from the per-layer cache (missing ones are fetched concurrently), and the sprite is kept in
+    legend_sprite_cache with a digest of the legends' ETags, so it is repacked whenever one of
+    them changes.
+    Raises requests.exceptions.RequestException when GeoServer cannot be reached.
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=min(GEOSERVER_LAYER_LOOKUP_WORKERS, len(entries)),
+        thread_name_prefix='legend-sprite'
+    )
+    futures = [executor.submit(get_cached_legend, *entry) for entry in entries]
+    wait(futures)
+    executor.shutdown()
+    legends = [future.result() for future in futures]
+
+    names = [f'{workspace_name}:{layer_name}' + (f'@{style_name}' if style_name else '')
+             for workspace_name, layer_name, style_name in entries]
+    components = sorted(
+        (name, legend['etag'] if legend else None) for name, legend in zip(names, legends)
+    )
+    digest = hashlib.sha1(json.dumps([components, LEGEND_SPRITE_MAX_WIDTH]).encode('utf-8')).hexdigest()
+
+    sprite = legend_sprite_cache.get(names, digest)
+    if sprite is None:
+        images = [(name, legend['data']) for name, legend in zip(names, legends) if legend]
+        png, offsets, (width, height) = pack_sprite(images, max_width=LEGEND_SPRITE_MAX_WIDTH)
+        sprite = {'png': png, 'etag': content_etag(png), 'width': width, 'height': height, 'modified': time.time(),
+                  'legends': offsets, 'missing': sorted(name for name, legend in zip(names, legends) if not legend)}
+        legend_sprite_cache.put(names, digest, sprite)
+    return sprite
+
+@app.route('/api/geoserver/legend/<workspace_name>/<layer_name>')
+@login_required
+def get_legend_graphic(workspace_name, layer_name):
+    """
+    A layer's legend image (optional ?style=) from the catalog cache, fetched from GeoServer
+    once per layer and style. Dropped with the layer's other catalog entries when it changes.
+    """
+    style_name = request.args.get('style', '')
+    try:
+        legend = get_cached_legend(workspace_name, layer_name, style_name)
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Error fetching legend of {workspace_name}:{layer_name} from GeoServer: {e}")
+        return jsonify({'error': f'Failed to fetch legend from GeoServer: {e}'}), 500
+    if legend is None:
+        return jsonify({'error': 'GeoServer has no legend graphic for this layer'}), 404
+    return make_cacheable(app.response_class(legend['data'], mimetype=legend['content_type']), 'legend',
+                          etag=legend['etag'],
+                          last_modified=catalog_cache.fetched_at([legend_key(workspace_name, layer_name, style_name)]))
+
+def load_legend_sprite():
+    """(sprite, None) for the request's ?layers=&styles=, or (None, error response)"""
+    try:
+        entries = parse_sprite_layers(request.args)
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 400)
+    try:
+        return build_legend_sprite(entries), None
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Error fetching legends from GeoServer: {e}")
+        return None, (jsonify({'error': f'Failed to fetch legends from GeoServer: {e}'}), 500)
+    except OSError as e:
+        # Pillow could not decode one of the legend images
+        app.logger.warning(f"Could not pack legend sprite: {e}")
+        return None, (jsonify({'error': 'Could not pack the legend images', 'details': str(e)}), 500)
+
+@app.route('/api/geoserver/legend_sprite.png')
+@login_required
+def get_legend_sprite_image():
+    """The legends of ?layers= (and optional ?styles=) packed into one PNG"""
+    sprite, error = load_legend_sprite()
+    if error:
+        return error
+    return make_cacheable(app.response_class(sprite['png'], mimetype='image/png'), 'legend', etag=sprite['etag'],
+                          last_modified=sprite['modified'])
+
+@app.route('/api/geoserver/legend_sprite.json')
+@login_required
+def get_legend_sprite_index():
+    """Where each legend of ?layers= sits in the matching legend_sprite.png"""
+    sprite, error = load_legend_sprite()
+    if error:
+        return error
+    return make_cacheable(jsonify({
+        'image': url_for('get_legend_sprite_image', **request.args) + f"&v={sprite['etag']}",
+        'width': sprite['width'],
+        'height': sprite['height'],
+        'legends': sprite['legends'],
+        'missing': sprite['missing']
+    }), 'legend', last_modified=sprite['modified'])
+
 @app.route('/api/geoserver/feature_info/<workspace>/<layer>')
 @login_required
 def get_feature_info(workspace, layer):
+    """
+    GetFeatureInfo of a map click (the map's bbox, width and height and the clicked x, y).
+    The click is snapped to a grid cell of FEATURE_INFO_SNAP_PX pixels at its zoom level, and
+    the answer for the cell is served from feature_info_cache while it is fresh.
+    """
     try:
         # Get query parameters
         bbox = request.args.get('bbox')
@@ -1429,39 +2914,43 @@ def get_feature_info(workspace, layer):
         
         if not all([bbox, width, height, x, y]):
             return jsonify({'error': 'Missing required parameters'}), 400
+
+        try:
+            cell = snap_click(bbox, width, height, x, y, snap_px=FEATURE_INFO_SNAP_PX)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid map parameters: {e}'}), 400
+
+        full_layer_name = f'{workspace}:{layer}'
+        cached = feature_info_cache.get(full_layer_name, 1, cell)
+        if cached is not None:
+            data, etag, stored = cached
+            info_response = make_cacheable(app.response_class(data, mimetype='application/json'), 'feature_info',
+                                           etag=etag, last_modified=stored)
+            info_response.headers['X-Feature-Info-Cache'] = 'HIT'
+            return info_response
+
+        # GetFeatureInfo of the cell's centre, the same for every click in the cell
+        params = cell_query_params(cell, FEATURE_INFO_SNAP_PX, full_layer_name, feature_count=1)
         
-        # Build GetFeatureInfo URL
-        params = {
-            'REQUEST': 'GetFeatureInfo',
-            'SERVICE': 'WMS',
-            'SRS': 'EPSG:4326',
-            'VERSION': '1.1.1',
-            'FORMAT': 'image/png',
-            'BBOX': bbox,
-            'HEIGHT': height,
-            'WIDTH': width,
-            'LAYERS': f'{workspace}:{layer}',
-            'QUERY_LAYERS': f'{workspace}:{layer}',
-            'INFO_FORMAT': 'application/json',
-            'X': x,
-            'Y': y,
-            'FEATURE_COUNT': '1'
-        }
-        
-        url = f"{GEOSERVER_BASE_URL}/{workspace}/wms?" + "&".join([f"{k}={v}" for k, v in params.items()])
-        
-        app.logger.info(f"GetFeatureInfo URL: {url}")
+        app.logger.info(f"GetFeatureInfo for {full_layer_name} at cell {tuple(cell)} with params: {params}")
         
-        response = requests.get(url, auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD), timeout=10)
+        response = geoserver.get(f"{workspace}/wms", params=params, timeout=10)
         response.raise_for_status()
         
         # Check if response is JSON
         try:
-            data = response.json()
-            return jsonify(data)
+            document = response.json()
         except ValueError:
             # If not JSON, return the text response
             return jsonify({'error': 'Non-JSON response from GeoServer', 'response': response.text[:500]})
+
+        data = jsonify(document).get_data()
+        etag = content_etag(data)
+        feature_info_cache.put(full_layer_name, 1, cell, data, etag)
+        info_response = make_cacheable(app.response_class(data, mimetype='application/json'), 'feature_info',
+                                       etag=etag, last_modified=time.time())
+        info_response.headers['X-Feature-Info-Cache'] = 'MISS'
+        return info_response
             
     except requests.exceptions.RequestException as e:
         app.logger.error(f"Error getting feature info for {workspace}:{layer}: {e}")
@@ -1470,6 +2959,174 @@ def get_feature_info(workspace, layer):
         app.logger.error(f"Unexpected error in get_feature_info: {e}", exc_info=True)
         return jsonify({'error': f'Unexpected error: {e}'}), 500
 
+def parse_feature_info_layers(args):
+    """
+    {workspace: [layer, ...]} from ?layers=ws:layer,..., in request order. Raises ValueError
+    for a malformed list.
+    """
+    names = [name.strip() for name in args.get('layers', '').split(',') if name.strip()]
+    if not names:
+        raise ValueError('layers is required')
+    if len(names) > FEATURE_INFO_MAX_LAYERS:
+        raise ValueError(f'At most {FEATURE_INFO_MAX_LAYERS} layers per request')
+    groups = {}
+    for name in names:
+        workspace_name, sep, layer_name = name.partition(':')
+        if not sep or not workspace_name or not layer_name:
+            raise ValueError(f"Layer '{name}' must be workspace:layer")
+        if layer_name not in groups.setdefault(workspace_name, []):
+            groups[workspace_name].append(layer_name)
+    return groups
+
+def query_feature_info(workspace_name, layer_names, cell, feature_count):
+    """
+    One GetFeatureInfo over layers of a workspace, asking for feature_count features per layer.
+    GeoServer applies FEATURE_COUNT to all QUERY_LAYERS together, so it is multiplied by the
+    number of layers. Returns (the answer, its features split per layer and trimmed to
+    feature_count, features not told apart). Raises requests exceptions, or ValueError when
+    GeoServer does not answer with a FeatureCollection.
+    """
+    layers = ','.join(f'{workspace_name}:{layer_name}' for layer_name in layer_names)
+    params = cell_query_params(cell, FEATURE_INFO_SNAP_PX, layers, feature_count=feature_count * len(layer_names))
+    app.logger.info(f"GetFeatureInfo for {layers} at cell {tuple(cell)}")
+    response = geoserver.get(f"{workspace_name}/wms", params=params, timeout=10)
+    response.raise_for_status()
+    document = response.json()
+    collections, unmatched = split_by_layer(document, layer_names, feature_count)
+    return document, collections, unmatched
+
+def fetch_feature_info_group(workspace_name, layer_names, cell, feature_count):
+    """
+    Feature info of several layers of a workspace, with one GetFeatureInfo where that gives
+    each layer's full answer. Layers are queried again one by one when GeoServer returned
+    features it did not name after a queried layer (a layer published under another name
+    than its feature type), and, when it stopped at the total feature count, the layers that
+    got fewer than feature_count features.
+
+    Returns {'layers': {layer name: FeatureCollection or {'error'}}, 'cacheable': layer names
+    whose answer is complete, 'unmatched': features of layers that could not be re-queried,
+    'requests': GetFeatureInfo calls sent}. Raises like query_feature_info for the first call.
+    """
+    document, collections, unmatched = query_feature_info(workspace_name, layer_names, cell, feature_count)
+    requery = []
+    if len(layer_names) > 1:
+        if unmatched:
+            requery = list(layer_names)
+        elif len(document['features']) >= feature_count * len(layer_names):
+            requery = [name for name in layer_names if len(collections[name]['features']) < feature_count]
+
+    failed = False
+    if requery:
+        executor = ThreadPoolExecutor(
+            max_workers=min(GEOSERVER_LAYER_LOOKUP_WORKERS, len(requery)),
+            thread_name_prefix='feature-info-layer'
+        )
+        futures = {layer_name: executor.submit(query_feature_info, workspace_name, [layer_name], cell, feature_count)
+                   for layer_name in requery}
+        wait(futures.values())
+        executor.shutdown()
+        for layer_name, future in futures.items():
+            try:
+                collections[layer_name] = future.result()[1][layer_name]
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # Keep what the group answer had for the layer, but do not cache it
+                app.logger.warning(f"Error getting feature info for {workspace_name}:{layer_name}: {e}")
+                failed = True
+
+    cacheable = set(layer_names) - set(requery) if failed else set(layer_names)
+    return {
+        'layers': collections,
+        'cacheable': cacheable,
+        # Re-queried layers carry their own features now, unless one of them failed
+        'unmatched': unmatched if failed else [],
+        'requests': 1 + len(requery)
+    }
+
+@app.route('/api/geoserver/feature_info')
+@login_required
+def get_multi_layer_feature_info():
+    """
+    GetFeatureInfo of a map click over several layers (?layers=ws:layer,... plus the map's
+    bbox, width, height and the clicked x, y). Layers answered from feature_info_cache are not
+    queried again; the others are queried with one GetFeatureInfo per workspace, all
+    workspaces at once. Each layer's answer is cached on its own.
+    """
+    try:
+        groups = parse_feature_info_layers(request.args)
+        feature_count = request.args.get('feature_count', FEATURE_INFO_FEATURE_COUNT)
+        if not str(feature_count).isdigit() or not 1 <= int(feature_count) <= FEATURE_INFO_MAX_FEATURE_COUNT:
+            raise ValueError(f'feature_count must be between 1 and {FEATURE_INFO_MAX_FEATURE_COUNT}')
+        feature_count = int(feature_count)
+        missing = [name for name in ('bbox', 'width', 'height', 'x', 'y') if not request.args.get(name)]
+        if missing:
+            raise ValueError(f"Missing required parameters: {', '.join(missing)}")
+        cell = snap_click(request.args['bbox'], request.args['width'], request.args['height'],
+                          request.args['x'], request.args['y'], snap_px=FEATURE_INFO_SNAP_PX)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = {}
+    queries = {}
+    last_modified = None
+    for workspace_name, layer_names in groups.items():
+        for layer_name in layer_names:
+            full_layer_name = f'{workspace_name}:{layer_name}'
+            cached = feature_info_cache.get(full_layer_name, feature_count, cell)
+            if cached is not None:
+                results[full_layer_name] = json.loads(cached[0])
+                last_modified = max(last_modified or 0, cached[2])
+            else:
+                queries.setdefault(workspace_name, []).append(layer_name)
+
+    from_cache = len(results)
+    unmatched = []
+    failed = 0
+    requests_sent = 0
+    if queries:
+        executor = ThreadPoolExecutor(
+            max_workers=min(GEOSERVER_LAYER_LOOKUP_WORKERS, len(queries)),
+            thread_name_prefix='feature-info'
+        )
+        futures = {workspace_name: executor.submit(fetch_feature_info_group, workspace_name, layer_names, cell,
+                                                   feature_count)
+                   for workspace_name, layer_names in queries.items()}
+        wait(futures.values())
+        executor.shutdown()
+        for workspace_name, future in futures.items():
+            try:
+                group = future.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                app.logger.error(f"Error getting feature info for workspace {workspace_name}: {e}")
+                failed += 1
+                requests_sent += 1
+                for layer_name in queries[workspace_name]:
+                    results[f'{workspace_name}:{layer_name}'] = {'error': f'Failed to get feature info: {e}'}
+                continue
+            unmatched.extend(group['unmatched'])
+            requests_sent += group['requests']
+            for layer_name, collection in group['layers'].items():
+                full_layer_name = f'{workspace_name}:{layer_name}'
+                if layer_name in group['cacheable']:
+                    data = json.dumps(collection, separators=(',', ':')).encode('utf-8')
+                    feature_info_cache.put(full_layer_name, feature_count, cell, data, content_etag(data))
+                results[full_layer_name] = collection
+
+    payload = {
+        'layers': {f'{workspace_name}:{layer_name}': results[f'{workspace_name}:{layer_name}']
+                   for workspace_name, layer_names in groups.items() for layer_name in layer_names},
+        'feature_count': feature_count,
+        'requests': requests_sent
+    }
+    if unmatched:
+        payload['unmatched'] = unmatched
+    if queries and failed == len(queries) and not from_cache:
+        return jsonify({'error': 'Failed to get feature info from GeoServer', **payload}), 500
+    # Layers queried now are as new as the response
+    info_response = make_cacheable(jsonify(payload), 'feature_info',
+                                   last_modified=time.time() if queries else last_modified)
+    info_response.headers['X-Feature-Info-Cache'] = 'MISS' if queries else 'HIT'
+    return info_response
+
 # @app.route('/api/map_screenshot', methods=['POST'])
 # def generate_map_screenshot():
 #     ... (removed)
@@ -1602,16 +3259,24 @@ def export_pdf():
                 except (ValueError, TypeError):
                     opacity_percent = "80%"
                 
-                # Get color information for vector layers
+                # The layer's legend image, from the same cache the web legend uses;
+                # vector layers without one fall back to their style palette
                 color_element = "N/A"
-                if layer_type.lower() == 'vector':
+                try:
+                    legend = get_cached_legend(workspace, layer_name)
+                except requests.exceptions.RequestException as e:
+                    app.logger.warning(f"Could not get legend for layer {layer_name}: {e}")
+                    legend = None
+                if legend:
+                    try:
+                        color_element = create_legend_image(legend['data'])
+                    except OSError as e:
+                        app.logger.warning(f"Could not read legend of layer {layer_name}: {e}")
+                        legend = None
+                if not legend and layer_type.lower() == 'vector':
                     try:
-                        color_hex = get_layer_style_color(workspace, layer_name)
-                        if color_hex.startswith('#') and len(color_hex) == 7:
-                            # Create a colored line element
-                            color_element = create_color_line(color_hex)
-                        else:
-                            color_element = color_hex  # "Default" or "Unknown"
+                        rules = get_layer_style_palette(workspace, layer_name)
+                        color_element = create_palette_legend(rules) if rules is not None else "Unknown"
                     except Exception as e:
                         app.logger.warning(f"Could not get color for layer {layer_name}: {e}")
                         color_element = "Unknown"
@@ -1624,12 +3289,12 @@ def export_pdf():
                 ])
             
             # Create table with adjusted column widths for color column
-            legend_table = Table(legend_data, colWidths=[120, 60, 60, 80])
+            legend_table = Table(legend_data, colWidths=[110, 50, 50, 210])
             legend_table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e9ecef')),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
                 ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (3, 1), (3, -1), 'CENTER'),  # Center align color column
+                ('ALIGN', (3, 1), (3, -1), 'LEFT'),  # Palettes list one rule per line
                 ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
                 ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
                 ('FONTSIZE', (0, 0), (-1, -1), 9),
@@ -1727,11 +3392,7 @@ def generate_map_image(data):
                     'TRANSPARENT': 'TRUE'
                 }
                 
-                wms_url = f"{GEOSERVER_BASE_URL}/{workspace}/wms"
-                
-                response = requests.get(wms_url, params=wms_params, 
-                                      auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD), 
-                                      timeout=30)
+                response = geoserver.get(f"{workspace}/wms", params=wms_params)
                 
                 if response.status_code == 200 and 'image' in response.headers.get('content-type', ''):
                     # Overlay the GeoServer layers on base map
@@ -1771,88 +3432,129 @@ def generate_map_image(data):
         app.logger.error(f"Map image generation failed: {str(e)}")
         return None
 
-def get_layer_style_color(workspace, layer_name):
+def style_rest_path(style_name, workspace_name=None):
+    """REST path of a style; 'workspace:style' names and workspace_name select a workspace style"""
+    style_workspace, separator, bare_name = style_name.rpartition(':')
+    if separator:
+        return f"rest/workspaces/{style_workspace}/styles/{bare_name}"
+    if workspace_name:
+        return f"rest/workspaces/{workspace_name}/styles/{style_name}"
+    return f"rest/styles/{style_name}"
+
+@lru_cache(maxsize=STYLE_PALETTE_CACHE_SIZE)
+def fetch_style_rules(style_path, last_modified):
     """
-    Get the primary color used in a layer's style from GeoServer
+    Download and parse one revision of a style. Keyed by the style's last-modified time,
+    so an unchanged style is never downloaded twice and an edited one always is.
     """
-    try:
-        # Get the layer's default style
-        style_url = f"{GEOSERVER_BASE_URL}/rest/layers/{workspace}:{layer_name}.json"
-        
-        response = requests.get(style_url, auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD), timeout=10)
-        if not response.ok:
-            return "Unknown"
-        
-        layer_info = response.json()
-        default_style = layer_info.get('layer', {}).get('defaultStyle', {}).get('name', '')
-        
-        if not default_style:
-            return "Default"
-        
-        # Get the style definition
-        style_def_url = f"{GEOSERVER_BASE_URL}/rest/styles/{default_style}.sld"
-        
-        style_response = requests.get(style_def_url, auth=(GEOSERVER_USERNAME, GEOSERVER_PASSWORD), timeout=10)
-        if not style_response.ok:
-            return "Default"
-        
-        sld_content = style_response.text
-        
-        # Parse SLD to extract color information
-        color = extract_color_from_sld(sld_content)
-        return color
-        
-    except Exception as e:
-        app.logger.warning(f"Error getting style color for {workspace}:{layer_name}: {e}")
-        return "Unknown"
+    response = geoserver.get(f"{style_path}.sld", timeout=10)
+    response.raise_for_status()
+    return tuple(parse_sld(response.content))
 
-def extract_color_from_sld(sld_content):
+def load_style_palette(style_name, workspace_name):
     """
-    Extract primary color from SLD content
+    Look up a style's last-modified time (one small REST call) and return its parsed rules,
+    re-downloading the SLD only when the style has changed. An unqualified name is looked up
+    in the layer's workspace first, then among the global styles, as GeoServer resolves it.
     """
-    import re
-    
-    # Look for common color patterns in SLD
-    # Check for stroke color (lines/polygons)
-    stroke_match = re.search(r'<CssParameter name="stroke"[^>]*>([^<]+)</CssParameter>', sld_content, re.IGNORECASE)
-    if stroke_match:
-        color = stroke_match.group(1).strip()
-        if color.startswith('#'):
-            return color.upper()
-    
-    # Check for fill color (polygons)
-    fill_match = re.search(r'<CssParameter name="fill"[^>]*>([^<]+)</CssParameter>', sld_content, re.IGNORECASE)
-    if fill_match:
-        color = fill_match.group(1).strip()
-        if color.startswith('#'):
-            return color.upper()
-    
-    # Check for stroke parameter in different format
-    stroke_param = re.search(r'stroke:\s*([#\w]+)', sld_content, re.IGNORECASE)
-    if stroke_param:
-        color = stroke_param.group(1).strip()
-        if color.startswith('#'):
-            return color.upper()
-    
-    # Check for fill parameter in different format
-    fill_param = re.search(r'fill:\s*([#\w]+)', sld_content, re.IGNORECASE)
-    if fill_param:
-        color = fill_param.group(1).strip()
-        if color.startswith('#'):
-            return color.upper()
-    
-    return "Default"
+    candidate_paths = [style_rest_path(style_name, workspace_name)]
+    if ':' not in style_name and workspace_name:
+        candidate_paths.append(style_rest_path(style_name))
+
+    for style_path in candidate_paths:
+        response = geoserver.get(f"{style_path}.json", timeout=10)
+        if response.status_code == 404:
+            continue
+        response.raise_for_status()
+        last_modified = response.json().get('style', {}).get('dateModified')
+        if last_modified:
+            rules = fetch_style_rules(style_path, last_modified)
+        else:
+            # Older GeoServers do not track modification times; parse afresh on every reload
+            rules = fetch_style_rules.__wrapped__(style_path, None)
+        return {'style': style_name, 'last_modified': last_modified, 'rules': list(rules)}
+
+    app.logger.warning(f"Style '{style_name}' not found in GeoServer")
+    return None
+
+def fetch_layer_default_style_rest(workspace_name, layer_name):
+    response = geoserver.get(f"rest/layers/{workspace_name}:{layer_name}.json", timeout=10)
+    response.raise_for_status()
+    return response.json().get('layer', {}).get('defaultStyle', {}).get('name') or None
 
-def create_color_line(color_hex):
+def get_layer_style_palette(workspace, layer_name):
+    """
+    Legend entries (one per style rule) for a layer's default style, served from the
+    catalog cache. Returns None if the layer or its style cannot be found.
+    Raises requests.exceptions.RequestException or xml.etree.ElementTree.ParseError.
+    """
+    # Get the layer's default style, from the capabilities catalog when it is loaded
+    catalog_layer_info = get_catalog_layer_info(workspace, layer_name)
+    if catalog_layer_info and catalog_layer_info.get('default_style'):
+        default_style = catalog_layer_info['default_style']
+    else:
+        default_style = catalog_cache.get(
+            layer_style_key(workspace, layer_name),
+            partial(fetch_layer_default_style_rest, workspace, layer_name)
+        )
+    if not default_style:
+        return None
+
+    palette = catalog_cache.get(
+        style_key(default_style if ':' in default_style else f"{workspace}/{default_style}"),
+        partial(load_style_palette, default_style, workspace),
+        ttl=lambda palette: CATALOG_CACHE_TTL if palette else CATALOG_PARTIAL_TTL
+    )
+    return palette['rules'] if palette else None
+
+def create_legend_image(data, max_width=200, max_height=90):
+    """Legend cell holding a legend graphic, scaled down to fit the cell"""
+    with PILImage.open(io.BytesIO(data)) as legend_image:
+        width, height = legend_image.size
+    scale = min(1.0, max_width / width, max_height / height)
+    return Image(io.BytesIO(data), width=width * scale, height=height * scale)
+
+def create_palette_legend(rules, max_entries=6):
+    """
+    Legend cell for a vector layer: a single swatch for one-rule styles, otherwise a
+    swatch and label per rule (categorized / graduated styles)
+    """
+    entries = [(rule_label(rule, index), rule) for index, rule in enumerate(rules) if rule_color(rule)]
+    if not entries:
+        return "Default"
+    if len(entries) == 1:
+        return create_color_line(rule_color(entries[0][1]), stroke_hex=entries[0][1].get('stroke'))
+
+    label_style = getSampleStyleSheet()['Normal'].clone('LegendLabel', fontSize=7, leading=8)
+    rows = [
+        [create_color_line(rule_color(rule), width=24, stroke_hex=rule.get('stroke')),
+         Paragraph(escape(label[:40]), label_style)]
+        for label, rule in entries[:max_entries]
+    ]
+    if len(entries) > max_entries:
+        rows.append(['', Paragraph(f'+{len(entries) - max_entries} more', label_style)])
+
+    palette_table = Table(rows, colWidths=[28, 170])
+    palette_table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 1),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 1),
+        ('TOPPADDING', (0, 0), (-1, -1), 1),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+    ]))
+    return palette_table
+
+def create_color_line(color_hex, width=60, stroke_hex=None):
     """
-    Create a colored line element for PDF table
+    Create a colored line element for PDF table, outlined in stroke_hex when given
     """
     from reportlab.platypus import Flowable
     from reportlab.lib import colors as reportlab_colors
     
     class ColorLine(Flowable):
-        def __init__(self, color_hex, width=60, height=8):
+        def __init__(self, color_hex, width=60, height=8, stroke_hex=None):
             self.color_hex = color_hex
+            self.stroke_hex = stroke_hex if stroke_hex and stroke_hex != color_hex else None
             self.width = width
             self.height = height
             
@@ -1861,17 +3563,17 @@ def create_color_line(color_hex):
                 # Convert hex color to ReportLab color
                 color = reportlab_colors.HexColor(self.color_hex)
                 self.canv.setFillColor(color)
-                self.canv.setStrokeColor(color)
+                self.canv.setStrokeColor(reportlab_colors.HexColor(self.stroke_hex) if self.stroke_hex else color)
                 
                 # Draw a thick line (rectangle)
-                self.canv.rect(5, 2, self.width - 10, self.height - 4, fill=1, stroke=0)
+                self.canv.rect(5, 2, self.width - 10, self.height - 4, fill=1, stroke=1 if self.stroke_hex else 0)
                 
             except Exception as e:
                 # Fallback to drawing text if color parsing fails
                 self.canv.setFillColor(reportlab_colors.black)
                 self.canv.drawString(5, 2, self.color_hex)
     
-    return ColorLine(color_hex)
+    return ColorLine(color_hex, width=width, stroke_hex=stroke_hex)
 
 # Test route for i18n
 @app.route('/test_i18n')
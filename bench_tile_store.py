@@ -0,0 +1,192 @@
+"""
+Compare the tile cache backends: one file per tile (DiskTileCache) against one SQLite
+bundle per layer group (PackedTileCache).
+
+Both stores are filled with the same synthetic tiles, written through the same put()
+the tile proxy uses. Tile sizes follow a log-normal distribution around --mean-size
+bytes, since most tiles are small and a few detailed ones are large. The report covers:
+
+- write throughput
+- disk footprint (allocated blocks, not file sizes) and the number of inodes used
+- random read latency for hits and misses, each read in a fresh thread so both stores
+  pay their real per-lookup costs, as under Flask's threaded server
+- the time to drop one layer group
+
+Run it on the filesystem that will hold TILE_CACHE_DIR, since small-file overhead depends
+on the block size:
+
+    python bench_tile_store.py --dir /srv/divyadrishti/bench --tiles 200000 --groups 20
+"""
+
+import argparse
+import math
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from tile_cache import DiskTileCache
+from tile_store import PackedTileCache
+
+
+def disk_usage(root):
+    """(allocated bytes, apparent bytes, inodes) of everything under root"""
+    allocated = apparent = inodes = 0
+    for directory, dirnames, filenames in os.walk(root):
+        inodes += 1
+        for name in filenames:
+            st = os.lstat(os.path.join(directory, name))
+            allocated += st.st_blocks * 512
+            apparent += st.st_size
+            inodes += 1
+    return allocated, apparent, inodes
+
+
+def make_tiles(count, groups, mean_size, seed):
+    rng = random.Random(seed)
+    sigma = 1.0
+    mu = math.log(max(100, mean_size)) - sigma ** 2 / 2  # so the distribution's mean is mean_size
+    payload = os.urandom(1 << 20)
+    tiles = []
+    for i in range(count):
+        size = min(len(payload), max(100, int(rng.lognormvariate(mu, sigma))))
+        offset = rng.randrange(len(payload) - size + 1)
+        layers = f'bench:layer{i % groups}'
+        tiles.append((layers, f'{rng.getrandbits(160):040x}', payload[offset:offset + size]))
+    return tiles
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6
+    return {'mean': statistics.fmean(samples) * 1e6, 'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+
+def timed_reads(cache, lookups, batch):
+    """Per-lookup latencies, each batch of lookups in a new thread"""
+    latencies = []
+
+    def run(chunk):
+        for layers, key in chunk:
+            started = time.perf_counter()
+            cache.get(layers, key, 'image/png')
+            latencies.append(time.perf_counter() - started)
+
+    for start in range(0, len(lookups), batch):
+        thread = threading.Thread(target=run, args=(lookups[start:start + batch],))
+        thread.start()
+        thread.join()
+    return latencies
+
+
+def drop_caches():
+    """Ask the kernel to drop the page cache (root only); True if it did"""
+    try:
+        os.sync()
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+        return True
+    except OSError:
+        return False
+
+
+def bench(name, cache, root, tiles, reads, batch, rng):
+    started = time.perf_counter()
+    for layers, key, data in tiles:
+        cache.put(layers, key, 'image/png', data)
+    write_seconds = time.perf_counter() - started
+    allocated, apparent, inodes = disk_usage(root)
+
+    cold = drop_caches()
+    hits = [(layers, key) for layers, key, _ in rng.sample(tiles, min(reads, len(tiles)))]
+    hit_latencies = timed_reads(cache, hits, batch)
+    misses = [(layers, f'{rng.getrandbits(160):040x}') for layers, _, _ in rng.sample(tiles, min(reads, len(tiles)))]
+    miss_latencies = timed_reads(cache, misses, batch)
+
+    started = time.perf_counter()
+    cache.invalidate('bench', 'layer0')
+    drop_seconds = time.perf_counter() - started
+    return {
+        'name': name,
+        'writes_per_second': len(tiles) / write_seconds,
+        'allocated': allocated,
+        'apparent': apparent,
+        'inodes': inodes,
+        'cold': cold,
+        'hit': percentiles(hit_latencies),
+        'miss': percentiles(miss_latencies),
+        'drop_seconds': drop_seconds
+    }
+
+
+def _mb(value):
+    return f'{value / 1e6:,.1f} MB'
+
+
+def print_report(results, tiles, groups):
+    payload = sum(len(data) for _, _, data in tiles)
+    print(f'{len(tiles):,} tiles in {groups} layer groups, {_mb(payload)} of tile data')
+    if not results[0]['cold']:
+        print('(page cache not dropped - run as root for cold-cache reads; these are warm-cache latencies)')
+    rows = [
+        ('writes/s', lambda r: f"{r['writes_per_second']:,.0f}"),
+        ('disk allocated', lambda r: _mb(r['allocated'])),
+        ('apparent size', lambda r: _mb(r['apparent'])),
+        ('overhead vs data', lambda r: f"{(r['allocated'] / payload - 1) * 100:+.0f}%"),
+        ('inodes', lambda r: f"{r['inodes']:,}"),
+        ('hit p50 / p99 (us)', lambda r: f"{r['hit']['p50']:.0f} / {r['hit']['p99']:.0f}"),
+        ('hit mean (us)', lambda r: f"{r['hit']['mean']:.0f}"),
+        ('miss p50 / p99 (us)', lambda r: f"{r['miss']['p50']:.0f} / {r['miss']['p99']:.0f}"),
+        (f'drop 1 of {groups} groups', lambda r: f"{r['drop_seconds'] * 1000:,.1f} ms"),
+    ]
+    print(f"{'':<22}" + ''.join(f"{r['name']:>20}" for r in results))
+    for label, value in rows:
+        print(f'{label:<22}' + ''.join(f'{value(r):>20}' for r in results))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Benchmark the plain-file and packed tile cache backends')
+    parser.add_argument('--tiles', type=int, default=50000, help='tiles to write (default: 50000)')
+    parser.add_argument('--groups', type=int, default=10, help='layer groups the tiles are spread over (default: 10)')
+    parser.add_argument('--mean-size', type=int, default=12000, help='mean tile size in bytes (default: 12000)')
+    parser.add_argument('--reads', type=int, default=5000, help='random hits and misses to time (default: 5000)')
+    parser.add_argument('--batch', type=int, default=50, help='lookups per reader thread (default: 50)')
+    parser.add_argument('--dir', help='directory to benchmark in (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true', help='keep the written stores')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.tiles < 1 or args.groups < 1:
+        print('--tiles and --groups must be positive', file=sys.stderr)
+        return 2
+    base = args.dir or tempfile.mkdtemp(prefix='tile-bench-')
+    os.makedirs(base, exist_ok=True)
+    roots = []
+    tiles = make_tiles(args.tiles, args.groups, args.mean_size, args.seed)
+    results = []
+    try:
+        for name, factory in (('files', DiskTileCache), ('packed', PackedTileCache)):
+            root = os.path.join(base, f'bench-{name}')
+            shutil.rmtree(root, ignore_errors=True)
+            roots.append(root)
+            results.append(bench(name, factory(root, ttl=0), root, tiles, args.reads, args.batch,
+                                 random.Random(args.seed)))
+    finally:
+        if not args.keep:
+            for root in roots:
+                shutil.rmtree(root, ignore_errors=True)
+            if not args.dir:
+                os.rmdir(base)
+    print_report(results, tiles, args.groups)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Incremental change detection for the GeoServer catalog.
+
+CatalogSyncJob polls GeoServer on a background thread, reduces every workspace to a
+{layer_name: fingerprint} snapshot (a modification timestamp where GeoServer reports one,
+a content hash otherwise), diffs it against the previous poll and hands only the added,
+removed and changed layers to a callback. ConditionalGetter sends If-None-Match /
+If-Modified-Since on repeat REST reads so unchanged resources cost a 304 and no parsing.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Dict[str, Optional[str]]  # layer name -> fingerprint (None: could not be determined)
+
+
+def layer_fingerprint(layer_info) -> str:
+    """Stable digest of a layer's catalog metadata"""
+    encoded = json.dumps(layer_info, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> Dict[str, List[str]]:
+    """
+    Added, removed and changed layer names between two snapshots. A layer whose new
+    fingerprint is None (lookup failed) is assumed unchanged rather than reported.
+    """
+    return {
+        'added': sorted(name for name in new if name not in old),
+        'removed': sorted(name for name in old if name not in new),
+        'changed': sorted(
+            name for name, fingerprint in new.items()
+            if name in old and fingerprint is not None and old[name] is not None and fingerprint != old[name]
+        )
+    }
+
+
+class ConditionalGetter:
+    """
+    JSON GETs through a GeoServerClient that remember each URL's ETag / Last-Modified and
+    body, and revalidate with a conditional request next time.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._validators: Dict[str, Tuple[Optional[str], Optional[str], Any]] = {}
+        self._lock = threading.Lock()
+        self.not_modified = 0
+        self.modified = 0
+
+    def get_json(self, path_or_url: str, timeout=None) -> Tuple[Any, bool]:
+        """
+        Returns (data, modified). modified is False when GeoServer answered 304 and the
+        remembered body was reused. Raises requests.exceptions.RequestException / ValueError.
+        """
+        url = self.client.url(path_or_url)
+        with self._lock:
+            etag, last_modified, body = self._validators.get(url, (None, None, None))
+
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        response = self.client.get(url, timeout=timeout, headers=headers)
+        if response.status_code == 304 and body is not None:
+            self.not_modified += 1
+            return body, False
+
+        response.raise_for_status()
+        data = response.json()
+        self.modified += 1
+        if response.headers.get('ETag') or response.headers.get('Last-Modified'):
+            with self._lock:
+                self._validators[url] = (response.headers.get('ETag'), response.headers.get('Last-Modified'), data)
+        return data, True
+
+    def forget(self, path_or_url: str):
+        with self._lock:
+            self._validators.pop(self.client.url(path_or_url), None)
+
+
+class CatalogSyncJob:
+    """
+    Periodic catalog diff.
+
+    list_workspaces() -> [workspace names]
+    snapshot_workspace(name) -> (Snapshot, payload); payload is passed through untouched
+    apply_delta(name, delta, payload) is called when something changed, and for a workspace's
+        first snapshot so the caller can seed its state; delta has 'added', 'removed' and
+        'changed' layer lists and 'workspace_removed'
+    apply_workspaces(names, added, removed), optional, when the workspace list changes
+    """
+
+    def __init__(self, list_workspaces: Callable[[], List[str]],
+                 snapshot_workspace: Callable[[str], Tuple[Snapshot, Any]],
+                 apply_delta: Callable[[str, Dict, Any], None],
+                 apply_workspaces: Optional[Callable[[List[str], List[str], List[str]], None]] = None,
+                 interval: float = 300, workers: int = 4):
+        self.list_workspaces = list_workspaces
+        self.snapshot_workspace = snapshot_workspace
+        self.apply_delta = apply_delta
+        self.apply_workspaces = apply_workspaces
+        self.interval = interval
+        self.workers = workers
+
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._workspaces: List[str] = []
+        self._workspace_state: Dict[str, Dict] = {}
+        self._sync_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = {
+            'syncs': 0, 'failures': 0,
+            'last_sync_started': None, 'last_sync_finished': None, 'last_sync_duration_ms': None,
+            'last_error': None, 'last_diff': None,
+            'totals': {'workspaces_added': 0, 'workspaces_removed': 0,
+                       'layers_added': 0, 'layers_removed': 0, 'layers_changed': 0}
+        }
+        self._last_finished_monotonic = None
+
+    def start(self, initial_delay: float = 0):
+        """Sync after initial_delay seconds, then every interval seconds, on a daemon thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(initial_delay,), name='catalog-sync', daemon=True)
+        self._thread.start()
+
+    def trigger(self):
+        """Ask the background thread to sync now instead of waiting for the next interval"""
+        self._wake.set()
+
+    def _run(self, initial_delay: float):
+        if initial_delay:
+            self._wake.wait(initial_delay)
+            self._wake.clear()
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning(f"Catalog sync failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _snapshot(self, workspace_name: str):
+        try:
+            return self.snapshot_workspace(workspace_name), None
+        except Exception as e:
+            return None, e
+
+    def run_once(self) -> Dict[str, int]:
+        """Poll every workspace once and apply the differences; returns the diff counts"""
+        with self._sync_lock:
+            started = time.monotonic()
+            with self._stats_lock:
+                self._stats['last_sync_started'] = datetime.now().isoformat()
+
+            try:
+                workspace_names = list(self.list_workspaces())
+            except Exception as e:
+                self._record_failure(e)
+                raise
+
+            # The first poll only records a baseline; its layers are not reported as added
+            baseline = self._stats['syncs'] == 0
+            counts = {'workspaces_added': 0, 'workspaces_removed': 0,
+                      'layers_added': 0, 'layers_removed': 0, 'layers_changed': 0}
+            known = set(self._workspaces)
+            added_workspaces = [name for name in workspace_names if name not in known]
+            removed_workspaces = sorted(known - set(workspace_names))
+            counts['workspaces_added'] = 0 if baseline else len(added_workspaces)
+            counts['workspaces_removed'] = len(removed_workspaces)
+            if (added_workspaces or removed_workspaces) and self.apply_workspaces is not None:
+                self.apply_workspaces(workspace_names, added_workspaces, removed_workspaces)
+            self._workspaces = workspace_names
+
+            for workspace_name in removed_workspaces:
+                old = self._snapshots.pop(workspace_name, {})
+                delta = {'added': [], 'removed': sorted(old), 'changed': [], 'workspace_removed': True}
+                self._apply(workspace_name, delta, None)
+                counts['layers_removed'] += len(old)
+                self._workspace_state.pop(workspace_name, None)
+
+            errors = []
+            executor = ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(workspace_names) or 1)),
+                                          thread_name_prefix='catalog-sync')
+            try:
+                results = dict(zip(workspace_names, executor.map(self._snapshot, workspace_names)))
+            finally:
+                executor.shutdown()
+
+            for workspace_name in workspace_names:
+                result, error = results[workspace_name]
+                if error is not None:
+                    logger.warning(f"Catalog sync skipped workspace '{workspace_name}': {error}")
+                    errors.append(f'{workspace_name}: {error}')
+                    continue
+
+                snapshot, payload = result
+                first_sync = workspace_name not in self._snapshots
+                old = self._snapshots.get(workspace_name, {})
+                # Carry over fingerprints that could not be determined this time
+                merged = {name: (fingerprint if fingerprint is not None else old.get(name))
+                          for name, fingerprint in snapshot.items()}
+                delta = diff_snapshots(old, merged)
+                delta['workspace_removed'] = False
+                self._snapshots[workspace_name] = merged
+
+                changed = delta['added'] or delta['removed'] or delta['changed']
+                if changed or first_sync:
+                    self._apply(workspace_name, delta, payload)
+                if not baseline:
+                    counts['layers_added'] += len(delta['added'])
+                counts['layers_removed'] += len(delta['removed'])
+                counts['layers_changed'] += len(delta['changed'])
+                self._workspace_state[workspace_name] = {
+                    'layers': len(merged),
+                    'last_synced': datetime.now().isoformat(),
+                    'last_diff': {key: len(delta[key]) for key in ('added', 'removed', 'changed')}
+                }
+
+            with self._stats_lock:
+                self._stats['syncs'] += 1
+                self._stats['last_sync_finished'] = datetime.now().isoformat()
+                self._stats['last_sync_duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+                self._stats['last_diff'] = counts
+                self._stats['last_error'] = '; '.join(errors) or None
+                if errors:
+                    self._stats['failures'] += 1
+                for key, value in counts.items():
+                    self._stats['totals'][key] += value
+                self._last_finished_monotonic = time.monotonic()
+
+            if any(counts.values()):
+                logger.info(f"Catalog sync applied changes: {counts}")
+            return counts
+
+    def _apply(self, workspace_name: str, delta: Dict, payload):
+        try:
+            self.apply_delta(workspace_name, delta, payload)
+        except Exception as e:
+            logger.warning(f"Applying catalog changes for workspace '{workspace_name}' failed: {e}", exc_info=True)
+            # Forget the snapshot so the next poll reports (and applies) the changes again
+            self._snapshots.pop(workspace_name, None)
+
+    def _record_failure(self, error: Exception):
+        with self._stats_lock:
+            self._stats['failures'] += 1
+            self._stats['last_error'] = str(error)
+            self._stats['last_sync_finished'] = datetime.now().isoformat()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                **self._stats,
+                'totals': dict(self._stats['totals']),
+                'interval_seconds': self.interval,
+                'running': self._thread is not None and self._thread.is_alive(),
+                'seconds_since_sync': (
+                    round(time.monotonic() - self._last_finished_monotonic, 1)
+                    if self._last_finished_monotonic is not None else None
+                ),
+                'workspaces': {name: dict(state) for name, state in self._workspace_state.items()}
+            }
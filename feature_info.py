@@ -0,0 +1,207 @@
+"""
+GetFeatureInfo answered from a cache keyed on a snapped ground grid.
+
+The map sends each click with its own bbox, size and pixel, so two users clicking the same
+parcel never send the same GetFeatureInfo, and nothing could be reused. snap_click() turns a
+click into the ground point it hit (interpolated in Web Mercator, like the map) and snaps it
+to a grid whose cells are snap_px screen pixels wide at the click's zoom level. The zoom
+comes from the bbox's resolution, rounded to the nearest Web Mercator level.
+
+cell_query_params() then asks GeoServer about the centre of the cell, through a fixed window
+at that zoom's resolution. The answer depends only on the layers and the cell, so
+FeatureInfoCache can keep it as encoded JSON under (layers, feature count, cell), LRU-bounded
+with a TTL. A click lands at most snap_px / 2 pixels from where it is answered for.
+
+Several layers of a workspace are queried with one GetFeatureInfo (QUERY_LAYERS lists them
+all), and split_by_layer() divides the answer into one FeatureCollection per layer, so that
+each layer is cached on its own whichever set of layers it was queried with. GeoServer's
+FEATURE_COUNT is a total over all the queried layers, so callers ask for the per-layer count
+times the number of layers and split_by_layer() trims each layer back.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from tile_cache import WEB_MERCATOR_EXTENT, lonlat_to_mercator, mercator_to_lonlat
+
+MAX_ZOOM = 24
+QUERY_WINDOW_PX = 101  # odd, so the cell centre is a pixel centre
+
+
+class GridCell(NamedTuple):
+    """A snapped click: Web Mercator zoom level and the cell's column and row on that level's grid"""
+    zoom: int
+    column: int
+    row: int
+
+
+def zoom_resolution(zoom: int) -> float:
+    """EPSG:3857 metres per pixel of a 256-pixel-tile zoom level"""
+    return 2 * WEB_MERCATOR_EXTENT / (256 * (1 << zoom))
+
+
+def snap_click(bbox: str, width, height, x, y, snap_px: float = 3) -> GridCell:
+    """
+    The grid cell a click hit. bbox is the map's 'west,south,east,north' in degrees, width and
+    height its size in pixels and x, y the clicked pixel. Raises ValueError for a malformed or
+    empty map.
+    """
+    parts = bbox.split(',')
+    if len(parts) != 4:
+        raise ValueError(f'Invalid bbox: {bbox}')
+    west, south, east, north = (float(value) for value in parts)
+    width, height, x, y = float(width), float(height), float(x), float(y)
+    if not all(math.isfinite(value) for value in (west, south, east, north, x, y)) \
+            or east <= west or north <= south or width <= 0 or height <= 0:
+        raise ValueError(f'Invalid map: bbox={bbox} width={width} height={height}')
+    minx, miny = lonlat_to_mercator(west, south)
+    maxx, maxy = lonlat_to_mercator(east, north)
+    ground_x = minx + (x + 0.5) / width * (maxx - minx)
+    ground_y = maxy - (y + 0.5) / height * (maxy - miny)
+
+    resolution = (maxx - minx) / width
+    zoom = min(MAX_ZOOM, max(0, round(math.log2(zoom_resolution(0) / resolution))))
+    cell_size = snap_px * zoom_resolution(zoom)
+    return GridCell(zoom, math.floor(ground_x / cell_size), math.floor(ground_y / cell_size))
+
+
+def cell_query_params(cell: GridCell, snap_px: float, layers: str, feature_count: int = 1) -> Dict[str, str]:
+    """GetFeatureInfo of the cell's centre at its zoom level, through a QUERY_WINDOW_PX window"""
+    resolution = zoom_resolution(cell.zoom)
+    cell_size = snap_px * resolution
+    centre_x, centre_y = (cell.column + 0.5) * cell_size, (cell.row + 0.5) * cell_size
+    half = QUERY_WINDOW_PX / 2 * resolution
+    west, south = mercator_to_lonlat(centre_x - half, centre_y - half)
+    east, north = mercator_to_lonlat(centre_x + half, centre_y + half)
+    return {
+        'REQUEST': 'GetFeatureInfo',
+        'SERVICE': 'WMS',
+        'SRS': 'EPSG:4326',
+        'VERSION': '1.1.1',
+        'FORMAT': 'image/png',
+        'BBOX': f'{west!r},{south!r},{east!r},{north!r}',
+        'HEIGHT': str(QUERY_WINDOW_PX),
+        'WIDTH': str(QUERY_WINDOW_PX),
+        'LAYERS': layers,
+        'QUERY_LAYERS': layers,
+        'INFO_FORMAT': 'application/json',
+        'X': str(QUERY_WINDOW_PX // 2),
+        'Y': str(QUERY_WINDOW_PX // 2),
+        'FEATURE_COUNT': str(feature_count)
+    }
+
+
+def split_by_layer(document: Any, layer_names: List[str],
+                   feature_count: Optional[int] = None) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    One FeatureCollection per layer (by layer name, without workspace) of a GetFeatureInfo
+    answer over layer_names, each cut to feature_count features, and the features that could
+    not be told apart. GeoServer names each feature '<layer>.<feature id>'; with one layer
+    every feature is that layer's. Raises ValueError when the answer is not a FeatureCollection.
+    """
+    if not isinstance(document, dict) or not isinstance(document.get('features'), list):
+        raise ValueError('GetFeatureInfo answer is not a FeatureCollection')
+    members = {key: value for key, value in document.items()
+               if key not in ('features', 'totalFeatures', 'numberReturned')}
+    features: Dict[str, List[Dict[str, Any]]] = {name: [] for name in layer_names}
+    # Longest first, so that a layer 'roads.major' is not taken for 'roads'
+    prefixes = sorted(layer_names, key=len, reverse=True)
+    unmatched = []
+    for feature in document['features']:
+        if len(layer_names) == 1:
+            features[layer_names[0]].append(feature)
+            continue
+        feature_id = str(feature.get('id') or '')
+        name = next((name for name in prefixes if feature_id.startswith(f'{name}.')), None)
+        if name is not None:
+            features[name].append(feature)
+        else:
+            unmatched.append(feature)
+    if feature_count is not None:
+        features = {name: layer_features[:feature_count] for name, layer_features in features.items()}
+    collections = {name: {**members, 'features': layer_features, 'numberReturned': len(layer_features)}
+                   for name, layer_features in features.items()}
+    return collections, unmatched
+
+
+class FeatureInfoCache:
+    """
+    Encoded GetFeatureInfo responses by (layers, feature count, cell), at most max_entries
+    (least recently used dropped first), each for ttl seconds
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Tuple[str, int, GridCell], Tuple[float, bytes, str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, layers: str, feature_count: int, cell: GridCell) -> Optional[Tuple[bytes, str, float]]:
+        """(JSON bytes, ETag, time stored in epoch seconds) of a cached response, or None"""
+        key = (layers, feature_count, cell)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2], entry[3]
+
+    def put(self, layers: str, feature_count: int, cell: GridCell, data: bytes, etag: str):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(layers, feature_count, cell)] = (time.monotonic() + self.ttl, data, etag, time.time())
+            self._entries.move_to_end((layers, feature_count, cell))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def invalidate(self, workspace_name: Optional[str] = None, layer_name: Optional[str] = None) -> int:
+        """
+        Drop every response, or those that include any layer of a workspace or one layer;
+        returns the number dropped
+        """
+        with self._lock:
+            if workspace_name is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            stale = []
+            for key in self._entries:
+                names = key[0].split(',')
+                if layer_name is not None:
+                    matches = f'{workspace_name}:{layer_name}' in names
+                else:
+                    matches = any(name.startswith(f'{workspace_name}:') for name in names)
+                if matches:
+                    stale.append(key)
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None
+            }
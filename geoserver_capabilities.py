@@ -0,0 +1,239 @@
+"""
+Workspace catalog discovery from WMS/WFS GetCapabilities documents.
+
+One WMS and one WFS GetCapabilities request per workspace replace the 1 + N REST
+calls (plus two more per layer for bounds) of the REST discovery path. Documents are
+parsed incrementally with iterparse straight from the HTTP stream, and every Layer /
+FeatureType element is discarded as soon as it has been read, so memory stays flat
+even for workspaces with thousands of layers.
+"""
+
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+def _local_name(tag: str) -> str:
+    """Strip the '{namespace}' prefix ElementTree puts on qualified tags"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _check_root(elem, expected: Tuple[str, ...]):
+    """
+    Raise ParseError unless a document's root element is one of expected: GeoServer answers
+    errors with a ServiceExceptionReport and HTTP 200, which would otherwise read as no layers
+    """
+    if _local_name(elem.tag) not in expected:
+        raise ET.ParseError(f"Expected {' or '.join(expected)}, got {_local_name(elem.tag)}")
+
+
+def _child(elem, name: str):
+    for child in elem:
+        if _local_name(child.tag) == name:
+            return child
+    return None
+
+
+def _child_text(elem, name: str) -> Optional[str]:
+    child = _child(elem, name)
+    if child is None or child.text is None:
+        return None
+    return child.text.strip()
+
+
+def _unqualified(name: str, workspace_name: str) -> str:
+    """Workspace services may or may not prefix names with 'workspace:'"""
+    prefix = f'{workspace_name}:'
+    return name[len(prefix):] if name.startswith(prefix) else name
+
+
+def _wms_layer_bounds(layer_elem) -> Optional[List[List[float]]]:
+    """Leaflet-style [[south, west], [north, east]] bounds from a WMS Layer element"""
+    geo_bbox = _child(layer_elem, 'EX_GeographicBoundingBox')  # WMS 1.3.0
+    if geo_bbox is not None:
+        try:
+            west = float(_child_text(geo_bbox, 'westBoundLongitude'))
+            east = float(_child_text(geo_bbox, 'eastBoundLongitude'))
+            south = float(_child_text(geo_bbox, 'southBoundLatitude'))
+            north = float(_child_text(geo_bbox, 'northBoundLatitude'))
+            return [[south, west], [north, east]]
+        except (TypeError, ValueError):
+            pass
+
+    lat_lon_bbox = _child(layer_elem, 'LatLonBoundingBox')  # WMS 1.1.1
+    if lat_lon_bbox is not None:
+        try:
+            return [
+                [float(lat_lon_bbox.get('miny')), float(lat_lon_bbox.get('minx'))],
+                [float(lat_lon_bbox.get('maxy')), float(lat_lon_bbox.get('maxx'))]
+            ]
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def _wms_layer_info(layer_elem) -> Dict:
+    styles = []
+    legend_url = None
+    for child in layer_elem:
+        if _local_name(child.tag) != 'Style':
+            continue
+        style_name = _child_text(child, 'Name')
+        if style_name:
+            styles.append(style_name)
+        if legend_url is None:
+            legend = _child(child, 'LegendURL')
+            resource = _child(legend, 'OnlineResource') if legend is not None else None
+            if resource is not None:
+                legend_url = resource.get('{http://www.w3.org/1999/xlink}href')
+
+    return {
+        'title': _child_text(layer_elem, 'Title'),
+        'bounds': _wms_layer_bounds(layer_elem),
+        # GeoServer lists a layer's default style first
+        'default_style': styles[0] if styles else None,
+        'styles': styles,
+        'legend_url': legend_url,
+        'queryable': layer_elem.get('queryable') == '1',
+        'opaque': layer_elem.get('opaque') == '1'
+    }
+
+
+def parse_wms_capabilities(source) -> Dict[str, Dict]:
+    """
+    Parse a WMS 1.1.1 / 1.3.0 capabilities document from a file-like object.
+    Returns {layer_name: info} for every named leaf layer, in document order.
+    Layer groups published as a tree (a named Layer containing other Layers) are skipped.
+    Raises ParseError for a document that is not WMS capabilities (a service exception).
+    """
+    layers = {}
+    open_layers = []  # [element, has_child_layers] for every Layer not yet closed
+    root = None
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if root is None:
+            root = elem
+            _check_root(root, ('WMS_Capabilities', 'WMT_MS_Capabilities'))
+        if _local_name(elem.tag) != 'Layer':
+            continue
+        if event == 'start':
+            if open_layers:
+                open_layers[-1][1] = True
+            open_layers.append([elem, False])
+            continue
+
+        _, is_group = open_layers.pop()
+        layer_name = _child_text(elem, 'Name')
+        if layer_name and not is_group:
+            layers[layer_name] = _wms_layer_info(elem)
+
+        # Drop the finished layer entirely so the tree never holds more than one at a time
+        elem.clear()
+        if open_layers:
+            open_layers[-1][0].remove(elem)
+
+    return layers
+
+
+def parse_wfs_feature_types(source) -> Dict[str, Optional[List[List[float]]]]:
+    """
+    Parse a WFS 1.1.0 / 2.0.0 capabilities document from a file-like object.
+    Returns {feature_type_name: bounds or None}. Raises ParseError for a document that is
+    not WFS capabilities (a service exception).
+    """
+    feature_types = {}
+    feature_type_list = None  # the parent of the FeatureType elements
+    root = None
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = _local_name(elem.tag)
+        if root is None:
+            root = elem
+            _check_root(root, ('WFS_Capabilities',))
+        if event == 'start':
+            if tag == 'FeatureTypeList':
+                feature_type_list = elem
+            continue
+        if tag != 'FeatureType':
+            continue
+
+        name = _child_text(elem, 'Name')
+        bounds = None
+        wgs84_bbox = _child(elem, 'WGS84BoundingBox')
+        if wgs84_bbox is not None:
+            try:
+                west, south = map(float, _child_text(wgs84_bbox, 'LowerCorner').split())
+                east, north = map(float, _child_text(wgs84_bbox, 'UpperCorner').split())
+                bounds = [[south, west], [north, east]]
+            except (AttributeError, ValueError):
+                pass
+        if name:
+            feature_types[name] = bounds
+
+        # Drop the finished feature type entirely, as for WMS layers
+        elem.clear()
+        if feature_type_list is not None:
+            feature_type_list.remove(elem)
+
+    return feature_types
+
+
+def _stream_capabilities(client, path: str, params: Dict, timeout):
+    """Open a GetCapabilities request and return (response, decoded raw stream)"""
+    response = client.get(path, params=params, timeout=timeout, stream=True)
+    try:
+        response.raise_for_status()
+        response.raw.decode_content = True  # let urllib3 undo gzip transparently
+        return response, response.raw
+    except Exception:
+        response.close()
+        raise
+
+
+def fetch_workspace_capabilities(client, workspace_name: str, timeout=None) -> Dict:
+    """
+    Build a workspace catalog from its WMS and WFS GetCapabilities documents.
+
+    Every WMS layer is listed with its lat/lon bounds and default style; layers that
+    are also published as WFS feature types are vectors, the rest are rasters.
+    client is a geoserver_client.GeoServerClient.
+    Raises requests.exceptions.RequestException or xml.etree.ElementTree.ParseError.
+    """
+    response, stream = _stream_capabilities(
+        client, f'{workspace_name}/wms',
+        {'SERVICE': 'WMS', 'REQUEST': 'GetCapabilities', 'VERSION': '1.3.0'},
+        timeout
+    )
+    with response:
+        wms_layers = parse_wms_capabilities(stream)
+
+    response, stream = _stream_capabilities(
+        client, f'{workspace_name}/wfs',
+        {'SERVICE': 'WFS', 'REQUEST': 'GetCapabilities', 'VERSION': '2.0.0'},
+        timeout
+    )
+    with response:
+        wfs_feature_types = {
+            _unqualified(name, workspace_name): bounds
+            for name, bounds in parse_wfs_feature_types(stream).items()
+        }
+
+    layers = {}
+    for name, info in wms_layers.items():
+        layer_name = _unqualified(name, workspace_name)
+        is_vector = layer_name in wfs_feature_types
+        info['type'] = 'vector' if is_vector else 'raster'
+        if info['bounds'] is None and is_vector:
+            info['bounds'] = wfs_feature_types[layer_name]
+        layers[layer_name] = info
+
+    return {
+        'workspace': workspace_name,
+        'layers': layers,
+        'fetched_at': datetime.now().isoformat()
+    }
+
+
+def layer_names_by_type(workspace_catalog: Dict, layer_type: str) -> List[str]:
+    """Names of the 'raster' or 'vector' layers in a workspace catalog, in document order"""
+    return [name for name, info in workspace_catalog['layers'].items() if info['type'] == layer_type]
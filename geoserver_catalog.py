@@ -0,0 +1,233 @@
+"""
+In-memory cache for GeoServer catalog lookups (workspaces, layer lists, layer types, bounds and styles)
+with TTLs, stale-while-revalidate background refresh and explicit invalidation
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# A TTL is either a fixed number of seconds or a function of the loaded value,
+# so that e.g. partial or empty results can expire sooner than complete ones.
+TTL = Union[float, Callable[[Any], float]]
+
+
+class CacheEntry:
+    """A cached value with its freshness and staleness deadlines"""
+
+    __slots__ = ('value', 'fetched_at', 'fresh_until', 'stale_until', 'refreshing')
+
+    def __init__(self, value, fresh_ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self.value = value
+        self.fetched_at = time.time()
+        self.fresh_until = now + fresh_ttl
+        self.stale_until = now + fresh_ttl + stale_ttl
+        self.refreshing = False
+
+
+class CatalogCache:
+    """
+    Key/value cache for catalog data fetched from GeoServer.
+
+    Fresh entries are returned directly. Entries past their TTL but still inside the
+    stale window are returned immediately while a background thread reloads them.
+    Missing or expired entries are loaded synchronously; concurrent misses for the
+    same key share one load. Listeners registered with add_listener are told about
+    every value stored, so derived structures can follow catalog changes.
+    """
+
+    def __init__(self, fresh_ttl: float = 300, stale_ttl: float = 86400, refresh_workers: int = 2):
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[str, CacheEntry] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._loaders: Dict[str, tuple] = {}
+        self._listeners: List[Callable[[str, Any], None]] = []
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='catalog-refresh')
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0,
+                       'refresh_failures': 0, 'invalidations': 0}
+
+    def _resolve_ttl(self, ttl: Optional[TTL], value) -> float:
+        if ttl is None:
+            return self.fresh_ttl
+        if callable(ttl):
+            return ttl(value)
+        return ttl
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get(self, key: str, loader: Callable[[], Any], ttl: Optional[TTL] = None):
+        """Return the cached value for key, calling loader() on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            self._loaders[key] = (loader, ttl)
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.fresh_until:
+                self._stats['hits'] += 1
+                return entry.value
+            if entry is not None and now < entry.stale_until:
+                self._stats['stale_hits'] += 1
+                if not entry.refreshing:
+                    entry.refreshing = True
+                    self._refresher.submit(self._refresh, key, loader, ttl)
+                return entry.value
+
+        # Miss: load synchronously, letting only one caller per key hit GeoServer
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() < entry.fresh_until:
+                    self._stats['hits'] += 1
+                    return entry.value
+                self._stats['misses'] += 1
+            value = loader()
+            self.set(key, value, ttl)
+            return value
+
+    def peek(self, key: str, default=None):
+        """Return the cached value (fresh or stale) without loading or refreshing"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry.stale_until:
+                return default
+            return entry.value
+
+    def fetched_at(self, keys: Iterable[str]) -> Optional[float]:
+        """When the most recently loaded of keys was loaded (epoch seconds), or None if none is cached"""
+        with self._lock:
+            times = [entry.fetched_at for entry in map(self._entries.get, keys) if entry is not None]
+        return max(times, default=None)
+
+    def set(self, key: str, value, ttl: Optional[TTL] = None):
+        """Store a value, replacing any existing entry"""
+        entry = CacheEntry(value, self._resolve_ttl(ttl, value), self.stale_ttl)
+        with self._lock:
+            self._entries[key] = entry
+        self._notify(key, value)
+
+    def add_listener(self, listener: Callable[[str, Any], None]):
+        """Call listener(key, value) whenever a value is stored or refreshed"""
+        self._listeners.append(listener)
+
+    def _notify(self, key: str, value):
+        for listener in self._listeners:
+            try:
+                listener(key, value)
+            except Exception as e:
+                logger.warning(f"Catalog cache listener failed for '{key}': {e}", exc_info=True)
+
+    def _refresh(self, key: str, loader: Callable[[], Any], ttl: Optional[TTL]):
+        """Reload a stale entry in the background, keeping the old value on failure"""
+        try:
+            value = loader()
+        except Exception as e:
+            logger.warning(f"Background refresh of catalog entry '{key}' failed: {e}")
+            with self._lock:
+                self._stats['refresh_failures'] += 1
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refreshing = False
+            return
+
+        with self._lock:
+            self._stats['refreshes'] += 1
+            # An invalidation while we were loading wins over our (possibly outdated) result
+            stored = key in self._entries
+            if stored:
+                self._entries[key] = CacheEntry(value, self._resolve_ttl(ttl, value), self.stale_ttl)
+        if stored:
+            self._notify(key, value)
+
+    def refresh(self, key: str) -> bool:
+        """Schedule a background reload of key using its last known loader"""
+        with self._lock:
+            registered = self._loaders.get(key)
+            entry = self._entries.get(key)
+            if registered is None or entry is None or entry.refreshing:
+                return False
+            entry.refreshing = True
+        loader, ttl = registered
+        self._refresher.submit(self._refresh, key, loader, ttl)
+        return True
+
+    def delete(self, key: str) -> bool:
+        """Drop a single entry; returns whether it existed"""
+        with self._lock:
+            if self._entries.pop(key, None) is None:
+                return False
+            self._stats['invalidations'] += 1
+            return True
+
+    def invalidate(self, prefix: Optional[str] = None) -> int:
+        """Drop every entry (or every entry whose key starts with prefix); returns the count removed"""
+        with self._lock:
+            if prefix is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            self._stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current entry count"""
+        with self._lock:
+            now = time.monotonic()
+            lookups = self._stats['hits'] + self._stats['stale_hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'stale_entries': len([e for e in self._entries.values() if now >= e.fresh_until]),
+                'hit_ratio': round((self._stats['hits'] + self._stats['stale_hits']) / lookups, 3) if lookups else None,
+                'fresh_ttl_seconds': self.fresh_ttl,
+                'stale_ttl_seconds': self.stale_ttl
+            }
+
+
+def workspaces_key() -> str:
+    return 'workspaces'
+
+
+def layers_key(workspace_name: str) -> str:
+    return f'layers:{workspace_name}'
+
+
+def bounds_key(workspace_name: str, layer_name: str) -> str:
+    return f'bounds:{workspace_name}:{layer_name}'
+
+
+def capabilities_key(workspace_name: str) -> str:
+    return f'capabilities:{workspace_name}'
+
+
+def style_key(style_name: str) -> str:
+    return f'style:{style_name}'
+
+
+def layer_style_key(workspace_name: str, layer_name: str) -> str:
+    return f'layerstyle:{workspace_name}:{layer_name}'
+
+
+def feature_type_key(workspace_name: str, layer_name: str) -> str:
+    return f'featuretype:{workspace_name}:{layer_name}'
+
+
+def legend_key(workspace_name: str, layer_name: str, style_name: str = '') -> str:
+    return f'legend:{workspace_name}:{layer_name}:{style_name}'
+
+
+def legend_prefix(workspace_name: str, layer_name: Optional[str] = None) -> str:
+    """Key prefix of every legend of a workspace, or of one layer"""
+    return f'legend:{workspace_name}:' if layer_name is None else f'legend:{workspace_name}:{layer_name}:'
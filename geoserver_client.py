@@ -0,0 +1,345 @@
+"""
+Shared HTTP client for GeoServer REST, WMS and WFS traffic.
+
+All GeoServer requests go through one requests.Session with keep-alive connection
+pooling, consistent connect/read timeouts and retry with exponential backoff for
+idempotent methods. A per-host concurrency limit and a circuit breaker keep a slow
+or unreachable GeoServer from tying up every Flask worker: once a host keeps failing,
+requests to it fail fast until a trial request succeeds again. SingleFlight lets
+concurrent identical requests share one upstream call.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class GeoServerUnavailableError(requests.exceptions.RequestException):
+    """Raised without contacting GeoServer when the client refuses to send a request"""
+
+
+class CircuitOpenError(GeoServerUnavailableError):
+    """The circuit breaker for the target host is open"""
+
+
+class ConnectionLimitError(GeoServerUnavailableError):
+    """No connection slot for the target host became free in time"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed:    requests flow; failure_threshold consecutive failures open the circuit
+    open:      requests are rejected until reset_timeout has passed
+    half_open: one trial request is let through; success closes the circuit, failure reopens it
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def cancel_trial(self):
+        """Forget a half-open trial request that ended without telling us anything about the host"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected_requests': self.rejected,
+                'retry_in_seconds': (
+                    max(0.0, round(self.reset_timeout - (time.monotonic() - self.opened_at), 1))
+                    if self.state == self.OPEN else None
+                )
+            }
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Duplicate call suppression. The first caller for a key (the leader) runs the call;
+    callers arriving with the same key while it is in flight (followers) wait for it and
+    receive its result, or its exception. Nothing is cached once the call has finished.
+    Counters are kept per label so the coalescing rate of different kinds of calls can
+    be told apart.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Any, _Flight] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, list] = {}  # label -> [leaders, followers]
+
+    def do(self, key, call, label: str = 'default'):
+        """Returns (result, shared); shared is True for followers"""
+        with self._lock:
+            counts = self._counts.setdefault(label, [0, 0])
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                counts[0] += 1
+            else:
+                flight.followers += 1
+                counts[1] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = call()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {label: list(values) for label, values in self._counts.items()}
+            in_flight = len(self._flights)
+        leaders = sum(values[0] for values in counts.values())
+        followers = sum(values[1] for values in counts.values())
+
+        def summary(leader_count, follower_count):
+            total = leader_count + follower_count
+            return {
+                'upstream_calls': leader_count,
+                'coalesced': follower_count,
+                'coalesced_ratio': round(follower_count / total, 3) if total else None
+            }
+
+        return {
+            **summary(leaders, followers),
+            'in_flight': in_flight,
+            'by_kind': {label: summary(*values) for label, values in sorted(counts.items())}
+        }
+
+
+class _HostState:
+    """Per-host concurrency slots, circuit breaker and counters"""
+
+    def __init__(self, max_connections: int, failure_threshold: int, reset_timeout: float):
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.requests = 0
+        self.failures = 0
+        self.slot_timeouts = 0
+        self.total_latency = 0.0
+
+
+class GeoServerClient:
+    """Pooled, retrying, circuit-broken HTTP client bound to one GeoServer base URL"""
+
+    def __init__(self, base_url: str, username: Optional[str] = None, password: Optional[str] = None,
+                 connect_timeout: float = 5, read_timeout: float = 30, max_retries: int = 3,
+                 backoff_factor: float = 0.5, max_connections_per_host: int = 16,
+                 failure_threshold: int = 5, reset_timeout: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.auth = (username, password) if username else None
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_connections_per_host = max_connections_per_host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=min(max_retries, 1),  # a read timeout usually means GeoServer is busy; retry it once at most
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=max_connections_per_host,
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._hosts: Dict[str, _HostState] = {}
+        self._hosts_lock = threading.Lock()
+
+    def url(self, path_or_url: str) -> str:
+        """Resolve a path relative to the GeoServer base URL; absolute URLs pass through"""
+        if path_or_url.startswith(('http://', 'https://')):
+            return path_or_url
+        return f"{self.base_url}/{path_or_url.lstrip('/')}"
+
+    def _host_state(self, url: str) -> _HostState:
+        host = urlsplit(url).netloc
+        with self._hosts_lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostState(
+                    self.max_connections_per_host, self.failure_threshold, self.reset_timeout
+                )
+            return state
+
+    def _record_failure(self, host: _HostState, url: str):
+        host.failures += 1
+        was_open = host.breaker.state == CircuitBreaker.OPEN
+        host.breaker.record_failure()
+        if not was_open and host.breaker.state == CircuitBreaker.OPEN:
+            logger.warning(f"Circuit opened for GeoServer at {urlsplit(url).netloc} after "
+                           f"{host.breaker.consecutive_failures} consecutive failures")
+
+    def request(self, method: str, path_or_url: str, params=None, timeout=None,
+                stream: bool = False, **kwargs) -> requests.Response:
+        """
+        Send a request to GeoServer. Raises CircuitOpenError / ConnectionLimitError without
+        sending anything when the host is failing or saturated, and the usual
+        requests.exceptions otherwise. HTTP error statuses are returned, not raised.
+        """
+        url = self.url(path_or_url)
+        host = self._host_state(url)
+
+        slot_timeout = timeout if isinstance(timeout, (int, float)) else self.timeout[0]
+        if not host.slots.acquire(timeout=slot_timeout):
+            host.slot_timeouts += 1
+            raise ConnectionLimitError(
+                f'All {self.max_connections_per_host} connections to {urlsplit(url).netloc} are busy'
+            )
+
+        if not host.breaker.allow_request():
+            host.slots.release()
+            raise CircuitOpenError(f'GeoServer at {urlsplit(url).netloc} is failing; circuit open')
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                host.slots.release()
+
+        started = time.monotonic()
+        host.requests += 1
+        try:
+            response = self.session.request(
+                method, url, params=params, auth=kwargs.pop('auth', self.auth),
+                timeout=timeout if timeout is not None else self.timeout,
+                stream=stream, **kwargs
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self._record_failure(host, url)
+            release()
+            raise
+        except Exception:
+            host.breaker.cancel_trial()
+            release()
+            raise
+
+        host.total_latency += time.monotonic() - started
+        if response.status_code >= 500:
+            self._record_failure(host, url)
+        else:
+            host.breaker.record_success()
+
+        if stream:
+            # The connection stays busy until the caller has finished reading the body
+            original_close = response.close
+
+            def close():
+                try:
+                    original_close()
+                finally:
+                    release()
+            response.close = close
+        else:
+            release()
+        return response
+
+    def get(self, path_or_url: str, params=None, timeout=None, stream: bool = False, **kwargs) -> requests.Response:
+        return self.request('GET', path_or_url, params=params, timeout=timeout, stream=stream, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._hosts_lock:
+            hosts = dict(self._hosts)
+        return {
+            'base_url': self.base_url,
+            'connect_timeout_seconds': self.timeout[0],
+            'read_timeout_seconds': self.timeout[1],
+            'max_connections_per_host': self.max_connections_per_host,
+            'hosts': {
+                netloc: {
+                    'requests': state.requests,
+                    'failures': state.failures,
+                    'connection_limit_rejections': state.slot_timeouts,
+                    'avg_latency_ms': round(state.total_latency / state.requests * 1000, 1) if state.requests else None,
+                    'circuit': state.breaker.snapshot()
+                }
+                for netloc, state in hosts.items()
+            }
+        }
@@ -0,0 +1,434 @@
+"""
+Routing across several GeoServer instances.
+
+GeoServerFederation wraps one GeoServerClient per instance and exposes the same
+url() / request() / get() / stats() interface, so callers do not need to know how many
+GeoServers there are. Instances may be replicas of each other or serve different
+workspaces (or a mix of both):
+
+- a background thread health-checks every instance by listing its workspaces, which also
+  records which instance serves which workspace;
+- routed requests and health checks feed an exponentially weighted moving average of each
+  instance's latency;
+- a request goes to the healthiest, fastest instance that serves the workspace it refers
+  to, and fails over to the next one on connection errors, timeouts, open circuits and 5xx;
+- list_workspaces() merges the workspace lists of all instances;
+- concurrent identical GET requests (same path, parameters and headers) share a single
+  upstream call.
+"""
+
+import copy
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+import requests
+
+from geoserver_client import GeoServerClient, GeoServerUnavailableError, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_REST_WORKSPACE = re.compile(r'^rest/workspaces/([^/]+?)(?:\.json|\.xml)?(?:/|$)')
+_REST_LAYER = re.compile(r'^rest/layers/([^/:]+):')
+_OWS_WORKSPACE = re.compile(r'^([^/]+)/(?:[^/]+/)?(?:wms|wfs|wcs|wmts|ows)(?:$|[/?])', re.IGNORECASE)
+_GLOBAL_PREFIXES = frozenset(['rest', 'gwc', 'web', 'wms', 'wfs', 'wcs', 'wmts', 'ows', 'www', 'openlayers'])
+_LAYER_PARAMS = frozenset(['layers', 'query_layers', 'layer', 'typename', 'typenames'])
+_IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+
+def workspace_of_request(path: str, params=None) -> Optional[str]:
+    """
+    The workspace a GeoServer request is scoped to: from REST paths
+    (rest/workspaces/<ws>/..., rest/layers/<ws>:<layer>), virtual OWS services
+    (<ws>/wms, <ws>/<layer>/wfs) or, for the global services, the prefix of the first
+    qualified layer / type name in the query parameters. None for catalog-wide requests.
+    """
+    path = path.lstrip('/').split('?', 1)[0]
+    for pattern in (_REST_WORKSPACE, _REST_LAYER):
+        match = pattern.match(path)
+        if match:
+            return match.group(1)
+    match = _OWS_WORKSPACE.match(path)
+    if match and match.group(1).lower() not in _GLOBAL_PREFIXES:
+        return match.group(1)
+    if isinstance(params, dict):
+        for key, value in params.items():
+            if key.lower() in _LAYER_PARAMS and isinstance(value, str):
+                first = value.split(',', 1)[0]
+                if ':' in first:
+                    return first.split(':', 1)[0]
+    return None
+
+
+class GeoServerInstance:
+    """One GeoServer behind the federation: its client plus health and latency state"""
+
+    def __init__(self, client: GeoServerClient, ewma_alpha: float = 0.3):
+        self.client = client
+        self.base_url = client.base_url
+        self.base_path = urlsplit(client.base_url).path.rstrip('/')
+        self.ewma_alpha = ewma_alpha
+        self.healthy = True  # optimistic until a check or request says otherwise
+        self.ewma_latency = None  # seconds
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.workspaces: Optional[Set[str]] = None  # None: not discovered yet
+        self.workspace_order: List[str] = []
+        self.last_check = None
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def record_latency(self, seconds: float):
+        with self._lock:
+            if self.ewma_latency is None:
+                self.ewma_latency = seconds
+            else:
+                self.ewma_latency = self.ewma_alpha * seconds + (1 - self.ewma_alpha) * self.ewma_latency
+
+    def routing_key(self):
+        """
+        Sort key: healthy instances first, then those without recent failures, then by
+        expected latency under current load (in-flight requests queue behind each other)
+        """
+        with self._lock:
+            latency = self.ewma_latency or 0.0
+            return (0 if self.healthy else 1, self.consecutive_failures, latency * (1 + self.in_flight))
+
+    def serves(self, workspace_name: str) -> Optional[bool]:
+        """True / False once this instance's workspaces are known, None before"""
+        workspaces = self.workspaces
+        return None if workspaces is None else workspace_name in workspaces
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'base_url': self.base_url,
+                'healthy': self.healthy,
+                'ewma_latency_ms': round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'failures': self.failures,
+                'consecutive_failures': self.consecutive_failures,
+                'workspaces': len(self.workspaces) if self.workspaces is not None else None,
+                'last_check': self.last_check,
+                'last_error': self.last_error
+            }
+
+
+class GeoServerFederation:
+    """
+    Health-weighted router over one or more GeoServer instances.
+
+    An instance is marked unhealthy after unhealthy_threshold consecutive failures and
+    healthy again after healthy_threshold consecutive successes (health checks and routed
+    requests both count). Unhealthy instances are still tried, but only after every
+    healthy one, so a request succeeds as long as any instance can answer it.
+    """
+
+    def __init__(self, base_urls: List[str], username: Optional[str] = None, password: Optional[str] = None,
+                 health_check_interval: float = 15, health_check_timeout: float = 5,
+                 ewma_alpha: float = 0.3, unhealthy_threshold: int = 2, healthy_threshold: int = 2,
+                 coalesce_requests: bool = True, **client_options):
+        if not base_urls:
+            raise ValueError('At least one GeoServer base URL is required')
+        self.instances = [
+            GeoServerInstance(GeoServerClient(base_url, username, password, **client_options), ewma_alpha)
+            for base_url in dict.fromkeys(url.rstrip('/') for url in base_urls)
+        ]
+        self.primary = self.instances[0]
+        self.base_url = self.primary.base_url
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.unhealthy_threshold = unhealthy_threshold
+        self.healthy_threshold = healthy_threshold
+        self.coalesce_requests = coalesce_requests
+        self.flights = SingleFlight()
+        self.failovers = 0
+        self.health_checks = 0
+        self._thread = None
+        self._wake = threading.Event()
+
+    # --- routing ---
+
+    def url(self, path_or_url: str) -> str:
+        """Canonical URL of a path (on the primary instance); routing happens in request()"""
+        return self.primary.client.url(path_or_url)
+
+    def _relative_path(self, url: str) -> Optional[str]:
+        """
+        A GeoServer URL relative to its base path, or None if it does not belong to any
+        instance. Host names are ignored because GeoServer builds hrefs from its proxy base
+        URL, which need not match the address we reach it on.
+        """
+        parts = urlsplit(url)
+        for instance in self.instances:
+            prefix = instance.base_path + '/'
+            if parts.path.startswith(prefix):
+                relative = parts.path[len(prefix):]
+                return f'{relative}?{parts.query}' if parts.query else relative
+        return None
+
+    def _candidates(self, workspace_name: Optional[str]) -> List[GeoServerInstance]:
+        instances = self.instances
+        if workspace_name is not None:
+            # Instances known not to serve the workspace are skipped, unless none is known to
+            serving = [instance for instance in instances if instance.serves(workspace_name) is not False]
+            if serving:
+                instances = serving
+        if len(instances) == 1:
+            return list(instances)
+        return sorted(instances, key=GeoServerInstance.routing_key)
+
+    def _record_result(self, instance: GeoServerInstance, ok: bool, error=None):
+        with instance._lock:
+            was_healthy = instance.healthy
+            if ok:
+                instance.consecutive_failures = 0
+                instance.consecutive_successes += 1
+                instance.last_error = None
+                if instance.consecutive_successes >= self.healthy_threshold:
+                    instance.healthy = True
+            else:
+                instance.failures += 1
+                instance.consecutive_successes = 0
+                instance.consecutive_failures += 1
+                instance.last_error = str(error) if error is not None else None
+                if instance.consecutive_failures >= self.unhealthy_threshold:
+                    instance.healthy = False
+            healthy = instance.healthy
+        if healthy != was_healthy and len(self.instances) > 1:
+            if healthy:
+                logger.info(f"GeoServer instance {instance.base_url} is healthy again")
+            else:
+                logger.warning(f"GeoServer instance {instance.base_url} marked unhealthy: {error}")
+
+    @staticmethod
+    def _request_kind(path: str, params) -> str:
+        """Label for coalescing statistics: 'rest' or the OWS request name ('getmap', ...)"""
+        if path.lstrip('/').startswith('rest/'):
+            return 'rest'
+        if isinstance(params, dict):
+            for key, value in params.items():
+                if key.lower() == 'request' and isinstance(value, str):
+                    return value.lower()
+        return 'other'
+
+    @staticmethod
+    def _flight_key(method: str, path: str, params, kwargs):
+        """Identity of a request: parameter order and name case (OWS names are case-insensitive) do not matter"""
+        if isinstance(params, dict):
+            params = params.items()
+        if path.lstrip('/').startswith('rest/'):
+            normalized_params = tuple(sorted((str(k), str(v)) for k, v in (params or ())))
+        else:
+            normalized_params = tuple(sorted((str(k).upper(), str(v)) for k, v in (params or ())))
+        headers = tuple(sorted((k.lower(), v) for k, v in (kwargs.get('headers') or {}).items()))
+        return method.upper(), path, normalized_params, headers, repr(kwargs.get('auth'))
+
+    def request(self, method: str, path_or_url: str, params=None, timeout=None,
+                stream: bool = False, **kwargs) -> requests.Response:
+        """
+        Send a request to the best instance for it, failing over to the others.
+        Raises the last error (or returns the last 5xx response) when every instance failed.
+
+        Identical GET / HEAD requests that arrive while one is in flight wait for it and get
+        a copy of its response (the body is shared) instead of reaching GeoServer. Streamed
+        responses and requests with a body are always sent on their own.
+        """
+        if (not self.coalesce_requests or stream or method.upper() not in ('GET', 'HEAD')
+                or set(kwargs) - {'headers', 'auth'}):
+            return self._route(method, path_or_url, params, timeout, stream, **kwargs)
+
+        path = path_or_url
+        if path_or_url.startswith(('http://', 'https://')):
+            path = self._relative_path(path_or_url) or path_or_url
+        response, shared = self.flights.do(
+            self._flight_key(method, path, params, kwargs),
+            lambda: self._route(method, path_or_url, params, timeout, stream, **kwargs),
+            label=self._request_kind(path, params)
+        )
+        return copy.copy(response) if shared else response
+
+    def _route(self, method: str, path_or_url: str, params, timeout, stream: bool, **kwargs) -> requests.Response:
+        path = path_or_url
+        if path_or_url.startswith(('http://', 'https://')):
+            path = self._relative_path(path_or_url)
+            if path is None:
+                return self.primary.client.request(method, path_or_url, params=params, timeout=timeout,
+                                                   stream=stream, **kwargs)
+
+        workspace_name = workspace_of_request(path, params)
+        candidates = self._candidates(workspace_name)
+        idempotent = method.upper() in _IDEMPOTENT_METHODS
+        last_error = None
+        for attempt, instance in enumerate(candidates):
+            is_last = attempt == len(candidates) - 1
+            if attempt:
+                self.failovers += 1
+            with instance._lock:
+                instance.in_flight += 1
+                instance.requests += 1
+            started = time.monotonic()
+            try:
+                response = instance.client.request(method, path, params=params, timeout=timeout,
+                                                   stream=stream, **kwargs)
+            except GeoServerUnavailableError as e:
+                # Nothing was sent, so any method can go elsewhere
+                self._record_result(instance, False, e)
+                last_error = e
+                if is_last:
+                    raise
+                continue
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record_result(instance, False, e)
+                last_error = e
+                if is_last or not idempotent:
+                    raise
+                logger.info(f"GeoServer request to {instance.base_url} failed ({e}); trying another instance")
+                continue
+            finally:
+                with instance._lock:
+                    instance.in_flight -= 1
+
+            instance.record_latency(time.monotonic() - started)
+            if response.status_code >= 500:
+                self._record_result(instance, False, f'HTTP {response.status_code}')
+                if not is_last and idempotent:
+                    response.close()
+                    continue
+                return response
+            self._record_result(instance, True)
+            if (response.status_code == 404 and workspace_name is not None and not is_last
+                    and instance.serves(workspace_name) is None):
+                # Workspace map not discovered yet: another instance may have it
+                response.close()
+                continue
+            return response
+
+        raise last_error or GeoServerUnavailableError('No GeoServer instance could serve the request')
+
+    def get(self, path_or_url: str, params=None, timeout=None, stream: bool = False, **kwargs) -> requests.Response:
+        return self.request('GET', path_or_url, params=params, timeout=timeout, stream=stream, **kwargs)
+
+    # --- merged catalog ---
+
+    def _fetch_workspaces(self, instance: GeoServerInstance, timeout=None) -> List[str]:
+        """List one instance's workspaces and remember them for routing"""
+        started = time.monotonic()
+        try:
+            response = instance.client.get('rest/workspaces.json', timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self._record_result(instance, False, e)
+            raise
+        instance.record_latency(time.monotonic() - started)
+        self._record_result(instance, True)
+        workspaces = data.get('workspaces') or {}  # GeoServer returns "" for an empty catalog
+        names = [ws['name'] for ws in workspaces.get('workspace', [])]
+        with instance._lock:
+            instance.workspace_order = names
+            instance.workspaces = set(names)
+        return names
+
+    def list_workspaces(self) -> List[str]:
+        """
+        Workspace names across all instances, in instance order without duplicates. An
+        instance that cannot be reached contributes its last known list, so a brief outage
+        of one replica does not make its workspaces disappear. Raises the first error when
+        no instance has ever answered.
+        """
+        if len(self.instances) == 1:
+            return self._fetch_workspaces(self.primary)
+
+        executor = ThreadPoolExecutor(max_workers=len(self.instances), thread_name_prefix='geoserver-workspaces')
+        try:
+            futures = [executor.submit(self._fetch_workspaces, instance) for instance in self.instances]
+        finally:
+            executor.shutdown(wait=True)
+
+        merged = {}
+        first_error = None
+        answered = False
+        for instance, future in zip(self.instances, futures):
+            error = future.exception()
+            if error is None:
+                names = future.result()
+                answered = True
+            else:
+                logger.warning(f"Listing workspaces on {instance.base_url} failed: {error}")
+                first_error = first_error or error
+                if instance.workspaces is None:
+                    continue
+                names = instance.workspace_order
+                answered = True
+            merged.update(dict.fromkeys(names))
+        if not answered:
+            raise first_error
+        return list(merged)
+
+    def workspace_instances(self) -> Dict[str, List[str]]:
+        """Which instances serve each known workspace"""
+        result: Dict[str, List[str]] = {}
+        for instance in self.instances:
+            for name in instance.workspace_order:
+                result.setdefault(name, []).append(instance.base_url)
+        return result
+
+    # --- health checks ---
+
+    def check_health(self):
+        """Probe every instance once (in parallel) and update health, latency and workspaces"""
+        def probe(instance: GeoServerInstance):
+            try:
+                self._fetch_workspaces(instance, timeout=self.health_check_timeout)
+            except (requests.exceptions.RequestException, ValueError):
+                pass  # recorded against the instance
+            with instance._lock:
+                instance.last_check = datetime.now().isoformat()
+
+        self.health_checks += 1
+        executor = ThreadPoolExecutor(max_workers=len(self.instances), thread_name_prefix='geoserver-health')
+        try:
+            list(executor.map(probe, self.instances))
+        finally:
+            executor.shutdown(wait=True)
+
+    def start_health_checks(self):
+        """Run check_health now and then every health_check_interval seconds on a daemon thread"""
+        if self._thread is not None or self.health_check_interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run_health_checks, name='geoserver-health', daemon=True)
+        self._thread.start()
+
+    def _run_health_checks(self):
+        while True:
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.warning(f"GeoServer health check failed: {e}")
+            self._wake.wait(self.health_check_interval)
+            self._wake.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'base_url': self.base_url,
+            'instances': [
+                {**instance.snapshot(), 'client': instance.client.stats()}
+                for instance in self.instances
+            ],
+            'failovers': self.failovers,
+            'coalescing': self.flights.stats(),
+            'health_checks': self.health_checks,
+            'health_check_interval_seconds': self.health_check_interval,
+            'health_checks_running': self._thread is not None and self._thread.is_alive(),
+            'workspaces': self.workspace_instances()
+        }
@@ -0,0 +1,125 @@
+"""
+Legend sprites: the legend images of a set of layers packed into one PNG.
+
+A map showing a dozen layers would otherwise load a dozen legend images, and the PDF export
+would fetch them again. pack_sprite() places the images with a shelf packer: tallest first,
+left to right on rows ("shelves") no wider than max_width, each row as tall as its first
+image. It returns the sprite and the offset of every image, so that a client can draw a
+legend as a background-position into the sprite.
+
+LegendSpriteCache keeps the packed sprites, one per list of layers and bounded by count, so
+neither new layer combinations nor changed legends make it grow without limit.
+"""
+
+import io
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+
+def pack_sprite(images: List[Tuple[str, bytes]], max_width: int = 1024,
+                padding: int = 2) -> Tuple[bytes, Dict[str, Dict[str, int]], Tuple[int, int]]:
+    """
+    (PNG bytes, {name: {'x', 'y', 'width', 'height'}}, (width, height)) of a sprite holding
+    each named image. Raises OSError when an image cannot be decoded.
+    """
+    decoded = []
+    for name, data in images:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        decoded.append((name, image.convert('RGBA')))
+    decoded.sort(key=lambda item: (-item[1].height, item[0]))
+
+    offsets: Dict[str, Dict[str, int]] = {}
+    x = y = shelf_height = width = 0
+    for name, image in decoded:
+        if x and x + image.width > max_width:
+            y += shelf_height + padding
+            x = shelf_height = 0
+        offsets[name] = {'x': x, 'y': y, 'width': image.width, 'height': image.height}
+        x += image.width + padding
+        shelf_height = max(shelf_height, image.height)
+        width = max(width, x - padding)
+    height = y + shelf_height
+
+    sprite = Image.new('RGBA', (max(width, 1), max(height, 1)), (0, 0, 0, 0))
+    for name, image in decoded:
+        sprite.paste(image, (offsets[name]['x'], offsets[name]['y']))
+    buffer = io.BytesIO()
+    sprite.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue(), offsets, (sprite.width, sprite.height)
+
+
+class LegendSpriteCache:
+    """
+    Packed sprites by their sorted list of legend names ('workspace:layer' or
+    'workspace:layer@style'), at most max_entries (least recently used dropped first). Each
+    list keeps only its latest sprite, stored with a digest of the legends it was packed from,
+    so a changed legend replaces the sprite instead of adding one.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, ...], Tuple[str, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, names: Iterable[str], digest: str) -> Optional[Dict[str, Any]]:
+        """The sprite of names if it was packed from the legends digest stands for, else None"""
+        key = tuple(sorted(names))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != digest:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, names: Iterable[str], digest: str, sprite: Dict[str, Any]):
+        if self.max_entries <= 0:
+            return
+        key = tuple(sorted(names))
+        with self._lock:
+            self._entries[key] = (digest, sprite)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def invalidate(self, workspace_name: Optional[str] = None, layer_name: Optional[str] = None) -> int:
+        """Drop every sprite, or those holding a legend of a workspace or of one layer; returns the number dropped"""
+        with self._lock:
+            if workspace_name is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            stale = []
+            for key in self._entries:
+                layers = [name.partition('@')[0] for name in key]
+                if layer_name is not None:
+                    matches = f'{workspace_name}:{layer_name}' in layers
+                else:
+                    matches = any(name.startswith(f'{workspace_name}:') for name in layers)
+                if matches:
+                    stale.append(key)
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': sum(len(sprite['png']) for _, sprite in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evicted': self.evicted,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None
+            }
@@ -0,0 +1,358 @@
+"""
+Pre-render WMS tiles into the tile cache served by the /api/tiles routes.
+
+    python seed_tiles.py --layer Badrinath_2022:orthomosaic --zoom 14-19
+    python seed_tiles.py --workspace Badrinath_2022 --zoom 12-18 --dry-run
+    python seed_tiles.py --layer Badrinath_2022:roads --bbox 79.48,30.73,79.50,30.75 --zoom 16
+
+Tiles are rendered exactly as the tile proxy would render them (same canonical request,
+same metatiles, same cache keys), so seeded tiles are cache hits for the map. Without
+--bbox each layer is seeded over its own lat/lon bounds from the GeoServer REST catalog.
+Work is spread over a process pool; --concurrency caps the GetMap requests in flight
+across all processes so seeding does not starve interactive users of GeoServer.
+
+Progress is saved to a state file (in the tile cache directory by default). Re-running
+the same command after an interruption resumes where it stopped, and blocks that are
+already cached are skipped unless --force is given. Configuration (GeoServer instances,
+credentials, tile cache directory, metatile size) comes from the same environment
+variables as the web application.
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from geoserver_federation import GeoServerFederation
+from tile_cache import (
+    MetatileRenderer, TileUpstreamError, canonical_getmap_params, tile_cache_key, tile_request_params
+)
+from tile_store import TILE_CACHE_BACKENDS, make_tile_cache
+
+MAX_LATITUDE = 85.0511287798  # Web Mercator grid limit
+
+_worker = {}
+
+
+def settings_from_env():
+    """Seeder settings from the web application's environment variables"""
+    base_url = os.environ.get('GEOSERVER_BASE_URL', 'http://localhost:9090/geoserver')
+    return {
+        'instances': [url.strip() for url in os.environ.get('GEOSERVER_INSTANCES', base_url).split(',')
+                      if url.strip()] or [base_url],
+        'username': os.environ.get('GEOSERVER_USERNAME', 'admin'),
+        'password': os.environ.get('GEOSERVER_PASSWORD', 'geoserver'),
+        'connect_timeout': float(os.environ.get('GEOSERVER_CONNECT_TIMEOUT', 5)),
+        'read_timeout': float(os.environ.get('GEOSERVER_TIMEOUT', 30)),
+        'max_retries': int(os.environ.get('GEOSERVER_MAX_RETRIES', 3)),
+        'tile_timeout': float(os.environ.get('TILE_PROXY_TIMEOUT', 30)),
+        'cache_dir': os.environ.get('TILE_CACHE_DIR',
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tile_cache')),
+        'cache_ttl': float(os.environ.get('TILE_CACHE_TTL', 86400)),
+        'cache_backend': os.environ.get('TILE_CACHE_BACKEND', 'packed'),
+        'metatile_size': int(os.environ.get('METATILE_SIZE', 4)),
+        'metatile_gutter': int(os.environ.get('METATILE_GUTTER', 16))
+    }
+
+
+def make_client(settings):
+    return GeoServerFederation(
+        settings['instances'], settings['username'], settings['password'],
+        health_check_interval=0, connect_timeout=settings['connect_timeout'],
+        read_timeout=settings['read_timeout'], max_retries=settings['max_retries']
+    )
+
+
+def lonlat_to_tile(lon, lat, z):
+    """XYZ tile containing a lon/lat position at zoom z"""
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    n = 1 << z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_range(bbox, z):
+    """(min x, min y, max x, max y), inclusive, of the tiles covering a (w, s, e, n) bbox"""
+    west, south, east, north = bbox
+    min_x, min_y = lonlat_to_tile(west, north, z)
+    max_x, max_y = lonlat_to_tile(east, south, z)
+    return min_x, min_y, max_x, max_y
+
+
+def blocks(bbox, z, size):
+    """Origins (x, y) of the size-aligned blocks covering a bbox at zoom z, row by row"""
+    min_x, min_y, max_x, max_y = tile_range(bbox, z)
+    for y in range(min_y - min_y % size, max_y + 1, size):
+        for x in range(min_x - min_x % size, max_x + 1, size):
+            yield x, y
+
+
+def block_count(bbox, z, size):
+    min_x, min_y, max_x, max_y = tile_range(bbox, z)
+    columns = max_x // size - min_x // size + 1
+    rows = max_y // size - min_y // size + 1
+    return (max_x - min_x + 1) * (max_y - min_y + 1), columns * rows
+
+
+def fetch_layer_bbox(client, workspace_name, layer_name):
+    """(w, s, e, n) of a layer from its REST resource's latLonBoundingBox, or None"""
+    response = client.get(f'rest/layers/{workspace_name}:{layer_name}.json')
+    response.raise_for_status()
+    resource_href = response.json().get('layer', {}).get('resource', {}).get('href')
+    if not resource_href:
+        return None
+    response = client.get(resource_href)
+    response.raise_for_status()
+    resource = next(iter(response.json().values()), {})
+    bbox = resource.get('latLonBoundingBox') or {}
+    try:
+        return float(bbox['minx']), float(bbox['miny']), float(bbox['maxx']), float(bbox['maxy'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def fetch_workspace_layer_names(client, workspace_name):
+    response = client.get(f'rest/workspaces/{workspace_name}/layers.json')
+    response.raise_for_status()
+    layers = response.json().get('layers') or {}  # GeoServer returns "" for an empty workspace
+    return [layer['name'] for layer in layers.get('layer', [])]
+
+
+def _init_worker(settings, upstream_slots, block_size):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl+C
+    client = make_client(settings)
+    cache = make_tile_cache(settings['cache_backend'], settings['cache_dir'], ttl=settings['cache_ttl'])
+
+    def fetch(workspace_name, params):
+        with upstream_slots:
+            response = client.get(f'{workspace_name}/wms', params=params, timeout=settings['tile_timeout'])
+        if response.status_code != 200 or not response.headers.get('Content-Type', '').startswith('image/'):
+            raise TileUpstreamError(f'HTTP {response.status_code}: {response.text[:200]}')
+        return response.content
+
+    _worker['fetch'] = fetch
+    _worker['cache'] = cache
+    _worker['renderer'] = MetatileRenderer(fetch, cache, size=block_size, gutter=settings['metatile_gutter'])
+
+
+def _seed_block(task):
+    """Render one block; returns (status, tiles rendered, error)"""
+    workspace_name, layer_name, z, x, y, styles, image_format, force = task
+    renderer, cache = _worker['renderer'], _worker['cache']
+    try:
+        params = canonical_getmap_params(
+            tile_request_params(f'{workspace_name}:{layer_name}', z, x, y, styles=styles, image_format=image_format),
+            workspace_name
+        )
+        key = tile_cache_key(workspace_name, params)
+        if not force and cache.get(params['LAYERS'], key, params['FORMAT']) is not None:
+            return 'skipped', 0, None
+        _, _, columns, rows = renderer.block(z, x, y)
+        if renderer.size > 1:
+            renderer.render(workspace_name, params, key, (z, x, y), refresh=True)
+        else:
+            cache.put(params['LAYERS'], key, params['FORMAT'], _worker['fetch'](workspace_name, params))
+        return 'rendered', columns * rows, None
+    except Exception as e:
+        return 'failed', 0, f'{workspace_name}:{layer_name} {z}/{x}/{y}: {e}'
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}h{minutes:02d}m{seconds:02d}s' if hours else f'{minutes}m{seconds:02d}s'
+
+
+def parse_zoom(value):
+    low, _, high = value.partition('-')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid zoom range: {value} (use e.g. 12-18 or 15)')
+    if not 0 <= low <= high <= 24:
+        raise argparse.ArgumentTypeError(f'Invalid zoom range: {value} (zoom levels are 0-24)')
+    return low, high
+
+
+def parse_bbox(value):
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid bbox: {value} (use west,south,east,north in degrees)')
+    if west >= east or south >= north:
+        raise argparse.ArgumentTypeError(f'Invalid bbox: {value} (west < east and south < north)')
+    return west, south, east, north
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Pre-render WMS tiles into the Divyadrishti tile cache')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--layer', action='append', metavar='WORKSPACE:LAYER',
+                        help='layer to seed (repeatable)')
+    target.add_argument('--workspace', help='seed every layer of a workspace')
+    parser.add_argument('--zoom', type=parse_zoom, required=True, metavar='MIN-MAX', help='zoom levels, e.g. 12-18')
+    parser.add_argument('--bbox', type=parse_bbox, metavar='W,S,E,N',
+                        help="area in degrees (default: each layer's own bounds)")
+    parser.add_argument('--styles', default='', help='WMS STYLES value (default: the layer default style)')
+    parser.add_argument('--format', default='image/png', help='tile format (default: image/png)')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 2, help='worker processes')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='maximum GetMap requests in flight across all processes (default: 4)')
+    parser.add_argument('--dry-run', action='store_true', help='count tiles and upstream requests, render nothing')
+    parser.add_argument('--force', action='store_true', help='re-render blocks that are already cached')
+    parser.add_argument('--restart', action='store_true', help='ignore saved progress and start from the beginning')
+    parser.add_argument('--state-file', help='progress file (default: seed-<job id>.json in the tile cache directory)')
+    parser.add_argument('--report-interval', type=float, default=10, help='seconds between progress reports')
+    return parser
+
+
+def resolve_targets(client, args):
+    """[(workspace, layer, bbox)] for the command line, looking up bounds where needed"""
+    if args.workspace:
+        layer_ids = [(args.workspace, name) for name in fetch_workspace_layer_names(client, args.workspace)]
+    else:
+        layer_ids = []
+        for layer_id in args.layer:
+            workspace_name, sep, layer_name = layer_id.partition(':')
+            if not sep or not workspace_name or not layer_name:
+                raise SystemExit(f'--layer must be WORKSPACE:LAYER, got {layer_id}')
+            layer_ids.append((workspace_name, layer_name))
+
+    targets = []
+    for workspace_name, layer_name in layer_ids:
+        bbox = args.bbox or fetch_layer_bbox(client, workspace_name, layer_name)
+        if bbox is None:
+            print(f'  skipping {workspace_name}:{layer_name}: no lat/lon bounds in the REST catalog')
+            continue
+        targets.append((workspace_name, layer_name, bbox))
+    return targets
+
+
+def main(argv=None):
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    settings = settings_from_env()
+    min_zoom, max_zoom = args.zoom
+    block_size = settings['metatile_size'] if args.format.split(';')[0].strip() in MetatileRenderer.SLICEABLE_FORMATS else 1
+    block_size = max(1, block_size)
+    if settings['cache_backend'].strip().lower() not in TILE_CACHE_BACKENDS:
+        print(f'Unknown TILE_CACHE_BACKEND {settings["cache_backend"]!r}, expected one of '
+              f'{", ".join(TILE_CACHE_BACKENDS)}', file=sys.stderr)
+        return 2
+
+    client = make_client(settings)
+    targets = resolve_targets(client, args)
+    if not targets:
+        print('Nothing to seed.')
+        return 1
+
+    # Estimate
+    total_tiles = total_blocks = 0
+    print(f'Seeding zoom {min_zoom}-{max_zoom} in {block_size}x{block_size} metatiles into {settings["cache_dir"]} '
+          f'({settings["cache_backend"]})')
+    for workspace_name, layer_name, bbox in targets:
+        print(f'  {workspace_name}:{layer_name}  bbox {",".join(f"{c:.5f}" for c in bbox)}')
+        for z in range(min_zoom, max_zoom + 1):
+            tiles, block_total = block_count(bbox, z, block_size)
+            total_tiles += tiles
+            total_blocks += block_total
+            if args.dry_run:
+                print(f'    z{z:<3} {tiles:>10} tiles  {block_total:>9} GetMap requests')
+    print(f'Total: {total_tiles} tiles, {total_blocks} GetMap requests')
+    if args.dry_run:
+        return 0
+
+    job = {'targets': [[w, l, list(b)] for w, l, b in targets], 'zoom': [min_zoom, max_zoom],
+           'styles': args.styles, 'format': args.format, 'block_size': block_size}
+    job_id = hashlib.sha1(json.dumps(job, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    state_file = args.state_file or os.path.join(settings['cache_dir'], f'seed-{job_id}.json')
+    state = {'job_id': job_id, 'job': job, 'blocks_done': 0, 'tiles_rendered': 0, 'failed': 0}
+    if not args.restart and os.path.exists(state_file):
+        with open(state_file, encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get('job_id') == job_id:
+            state = saved
+            print(f'Resuming from block {state["blocks_done"]} of {total_blocks} ({state_file})')
+
+    def save_state():
+        state['updated'] = datetime.now().isoformat()
+        os.makedirs(os.path.dirname(os.path.abspath(state_file)), exist_ok=True)
+        temp_path = f'{state_file}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, state_file)
+
+    tasks = (
+        (workspace_name, layer_name, z, x, y, args.styles, args.format, args.force)
+        for workspace_name, layer_name, bbox in targets
+        for z in range(min_zoom, max_zoom + 1)
+        for x, y in blocks(bbox, z, block_size)
+    )
+    resumed_from = state['blocks_done']
+    tasks = itertools.islice(tasks, resumed_from, None)
+
+    upstream_slots = multiprocessing.BoundedSemaphore(max(1, args.concurrency))
+    pool = multiprocessing.Pool(max(1, args.processes), initializer=_init_worker,
+                                initargs=(settings, upstream_slots, block_size))
+    started = time.monotonic()
+    last_report = last_save = started
+    rendered = skipped = failed = 0
+    interrupted = False
+    try:
+        # imap returns results in task order, so blocks_done is always a safe resume point
+        for status, tiles, error in pool.imap(_seed_block, tasks, chunksize=4):
+            state['blocks_done'] += 1
+            if status == 'rendered':
+                rendered += tiles
+                state['tiles_rendered'] += tiles
+            elif status == 'skipped':
+                skipped += 1
+            else:
+                failed += 1
+                state['failed'] += 1
+                print(f'  failed: {error}')
+
+            now = time.monotonic()
+            if now - last_save >= 5:
+                save_state()
+                last_save = now
+            if now - last_report >= args.report_interval:
+                elapsed = now - started
+                rate = rendered / elapsed if elapsed else 0
+                done_fraction = state['blocks_done'] / total_blocks if total_blocks else 1
+                blocks_this_run = state['blocks_done'] - resumed_from
+                eta = elapsed / blocks_this_run * (total_blocks - state['blocks_done']) if blocks_this_run else 0
+                print(f'  {state["blocks_done"]}/{total_blocks} blocks ({done_fraction:.1%}), '
+                      f'{rendered} tiles rendered, {skipped} blocks cached, {failed} failed, '
+                      f'{rate:.1f} tiles/s, elapsed {_format_duration(elapsed)}, ETA {_format_duration(eta)}')
+                last_report = now
+        pool.close()
+    except KeyboardInterrupt:
+        interrupted = True
+        pool.terminate()
+    finally:
+        pool.join()
+        save_state()
+
+    elapsed = time.monotonic() - started
+    rate = rendered / elapsed if elapsed else 0
+    print(f'{"Interrupted" if interrupted else "Done"}: {rendered} tiles rendered, {skipped} blocks already cached, '
+          f'{failed} blocks failed in {_format_duration(elapsed)} ({rate:.1f} tiles/s)')
+    if interrupted:
+        print(f'Progress saved to {state_file}; run the same command again to resume.')
+        return 130
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
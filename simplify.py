@@ -0,0 +1,322 @@
+"""
+Zoom-dependent generalisation of vector features with NumPy.
+
+Drone-digitised polygons carry far more vertices than a map can show at district or city
+zoom levels. FeatureGeneralizer reduces GeoJSON features (EPSG:4326, as GeoServer's WFS
+returns them) to what one zoom band needs:
+
+- Zoom levels are grouped into bands (ZOOM_BANDS). Each band is simplified with a tolerance
+  of tolerance_px screen pixels at its most detailed zoom, so within the band the result is
+  indistinguishable from the original.
+- 'dp' is Douglas-Peucker, with every run at one recursion depth measured and split at once.
+  'visvalingam' is Visvalingam-Whyatt: each pass removes every vertex whose triangle is
+  smaller than tolerance_px squared and than both its neighbours'.
+- Coordinates are then rounded to the band's precision, and repeated vertices are dropped.
+- Lines and rings that collapse are dropped, and so are polygons whose exterior collapses.
+
+Latitude is stretched by 1 / cos(latitude) before measuring, as Web Mercator does, so a
+tolerance means the same on screen in both directions.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# (min zoom, max zoom); beyond the last band features are served at full resolution
+ZOOM_BANDS: Tuple[Tuple[int, int], ...] = ((0, 8), (9, 11), (12, 14), (15, 17))
+SIMPLIFY_METHODS = ('dp', 'visvalingam')
+
+
+def douglas_peucker_mask(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Boolean mask of the vertices Douglas-Peucker keeps; the end points are always kept.
+    The recursion runs level by level: every pending run is measured and split in one set of
+    array operations, so the Python loop turns as many times as the recursion is deep.
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    starts = np.array([0])
+    ends = np.array([n - 1])
+    while len(starts):
+        has_interior = ends - starts > 1
+        starts, ends = starts[has_interior], ends[has_interior]
+        if not len(starts):
+            break
+        lengths = ends - starts - 1
+        offsets = np.cumsum(lengths) - lengths
+        run = np.repeat(np.arange(len(starts)), lengths)
+        index = np.repeat(starts + 1, lengths) + np.arange(lengths.sum()) - np.repeat(offsets, lengths)
+        origin = points[starts][run]
+        direction = points[ends][run] - origin
+        delta = points[index] - origin
+        length = np.hypot(direction[:, 0], direction[:, 1])
+        # A closed ring's run starts and ends on the same point: measure from that point
+        distances = np.where(
+            length > 0,
+            np.abs(direction[:, 0] * delta[:, 1] - direction[:, 1] * delta[:, 0]) / np.where(length > 0, length, 1),
+            np.hypot(delta[:, 0], delta[:, 1])
+        )
+        farthest = np.maximum.reduceat(distances, offsets)
+        split = farthest > tolerance
+        # The first vertex of each run at its run's maximum distance
+        candidates = np.flatnonzero(distances == farthest[run])
+        _, first = np.unique(run[candidates], return_index=True)
+        split_at = index[candidates[first]][split]
+        keep[split_at] = True
+        starts = np.concatenate((starts[split], split_at))
+        ends = np.concatenate((split_at, ends[split]))
+    return keep
+
+
+def visvalingam_mask(points: np.ndarray, min_area: float) -> np.ndarray:
+    """Boolean mask of the vertices Visvalingam-Whyatt keeps; the end points are always kept"""
+    index = np.arange(len(points))
+    while len(index) > 2:
+        a, b, c = points[index[:-2]], points[index[1:-1]], points[index[2:]]
+        area = 0.5 * np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1]))
+        small = area < min_area
+        if not small.any():
+            break
+        # Only local minima go in one pass, so no two neighbours are removed together
+        left = np.concatenate(([np.inf], area[:-1]))
+        right = np.concatenate((area[1:], [np.inf]))
+        drop = small & (area <= left) & (area < right)
+        keep = np.ones(len(index), dtype=bool)
+        keep[1:-1] = ~drop
+        index = index[keep]
+    mask = np.zeros(len(points), dtype=bool)
+    mask[index] = True
+    return mask
+
+
+def zoom_band(zoom: int, bands: Iterable[Tuple[int, int]] = ZOOM_BANDS) -> Optional[Tuple[int, int]]:
+    for band in bands:
+        if band[0] <= zoom <= band[1]:
+            return band
+    return None
+
+
+def pixel_degrees(zoom: int) -> float:
+    """Longitude span of one 256 px Web Mercator tile pixel at a zoom level"""
+    return 360.0 / (256 * (1 << zoom))
+
+
+class FeatureGeneralizer:
+    """
+    Simplifies GeoJSON features for a zoom band and keeps per-layer statistics: builds,
+    vertices in and out, and the time spent fetching and simplifying. building(key) lets
+    concurrent requests for the same layer and band wait for one build.
+    """
+
+    def __init__(self, method: str = 'dp', tolerance_px: float = 0.5,
+                 bands: Iterable[Tuple[int, int]] = ZOOM_BANDS):
+        if method not in SIMPLIFY_METHODS:
+            raise ValueError(f"Unknown simplification method '{method}' (use one of {', '.join(SIMPLIFY_METHODS)})")
+        self.method = method
+        self.tolerance_px = tolerance_px
+        self.bands = tuple(bands)
+        self._layers: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, list] = {}
+        self.waits = 0
+
+    @contextmanager
+    def building(self, key: str):
+        """Hold the build of one cache key; a second caller waits until the first is done"""
+        with self._lock:
+            entry = self._build_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(blocking=False):
+                with self._lock:
+                    self.waits += 1
+                entry[0].acquire()
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._build_locks[key]
+
+    def band(self, zoom: int) -> Optional[Tuple[int, int]]:
+        return zoom_band(zoom, self.bands)
+
+    def tolerance(self, band: Tuple[int, int]) -> float:
+        """Simplification tolerance, in degrees, of a zoom band"""
+        return self.tolerance_px * pixel_degrees(band[1])
+
+    def precision(self, band: Tuple[int, int]) -> int:
+        """Decimal places kept in a zoom band: a tenth of its tolerance"""
+        return max(0, math.ceil(-math.log10(self.tolerance(band) / 10)))
+
+    def _simplify_path(self, coords, tolerance: float, decimals: int, closed: bool) -> Optional[List[List[float]]]:
+        points = np.asarray(coords, dtype=float)[:, :2]
+        minimum = 4 if closed else 2
+        if len(points) < minimum:
+            return None
+        scaled = points.copy()
+        scaled[:, 1] /= max(math.cos(math.radians(float(points[:, 1].mean()))), 0.01)
+        if self.method == 'dp':
+            keep = douglas_peucker_mask(scaled, tolerance)
+        else:
+            keep = visvalingam_mask(scaled, tolerance * tolerance)
+        kept = np.round(points[keep], decimals)
+        if len(kept) > 1:
+            moved = np.any(kept[1:] != kept[:-1], axis=1)
+            kept = kept[np.concatenate(([True], moved))]
+        if closed:
+            if len(kept) < 3:
+                return None
+            if not np.array_equal(kept[0], kept[-1]):
+                kept = np.vstack((kept, kept[:1]))
+        if len(kept) < minimum:
+            return None
+        return kept.tolist()
+
+    def _simplify_polygon(self, rings, tolerance: float, decimals: int) -> Optional[List]:
+        simplified = []
+        for index, ring in enumerate(rings):
+            ring = self._simplify_path(ring, tolerance, decimals, closed=True)
+            if ring is None:
+                if index == 0:
+                    return None
+                continue  # a hole smaller than the tolerance
+            simplified.append(ring)
+        return simplified
+
+    def simplify_geometry(self, geometry: Dict[str, Any], tolerance: float,
+                          decimals: int) -> Optional[Dict[str, Any]]:
+        """A simplified copy of a GeoJSON geometry, or None when nothing visible is left"""
+        kind = geometry.get('type')
+        coords = geometry.get('coordinates')
+        if not coords and kind != 'GeometryCollection':
+            return None
+        if kind == 'Point':
+            result = [round(c, decimals) for c in coords[:2]]
+        elif kind == 'MultiPoint':
+            result = np.unique(np.round(np.asarray(coords, dtype=float)[:, :2], decimals), axis=0).tolist()
+        elif kind == 'LineString':
+            result = self._simplify_path(coords, tolerance, decimals, closed=False)
+        elif kind == 'MultiLineString':
+            result = [line for line in (self._simplify_path(part, tolerance, decimals, closed=False)
+                                        for part in coords) if line] or None
+        elif kind == 'Polygon':
+            result = self._simplify_polygon(coords, tolerance, decimals)
+        elif kind == 'MultiPolygon':
+            result = [polygon for polygon in (self._simplify_polygon(part, tolerance, decimals)
+                                              for part in coords) if polygon] or None
+        elif kind == 'GeometryCollection':
+            parts = [self.simplify_geometry(part, tolerance, decimals) for part in geometry.get('geometries', [])]
+            parts = [part for part in parts if part]
+            return {'type': kind, 'geometries': parts} if parts else None
+        else:
+            return None
+        return {'type': kind, 'coordinates': result} if result else None
+
+    def generalize(self, layer: str, pages: Iterable[List[Dict[str, Any]]],
+                   band: Tuple[int, int]) -> Dict[str, Any]:
+        """
+        A FeatureCollection of the features in pages, simplified for a zoom band, with a
+        'generalization' member describing the result. Pages are consumed one at a time,
+        so only the simplified features are held.
+        """
+        tolerance = self.tolerance(band)
+        decimals = self.precision(band)
+        features: List[Dict[str, Any]] = []
+        vertices_in = vertices_out = dropped = 0
+        fetch_seconds = simplify_seconds = 0.0
+        started = time.perf_counter()
+        pages = iter(pages)
+        while True:
+            fetch_started = time.perf_counter()
+            page = next(pages, None)
+            fetch_seconds += time.perf_counter() - fetch_started
+            if page is None:
+                break
+            simplify_started = time.perf_counter()
+            for feature in page:
+                geometry = feature.get('geometry')
+                if not geometry:
+                    continue
+                vertices_in += count_vertices(geometry)
+                simplified = self.simplify_geometry(geometry, tolerance, decimals)
+                if simplified is None:
+                    dropped += 1
+                    continue
+                vertices_out += count_vertices(simplified)
+                features.append({**feature, 'geometry': simplified})
+            simplify_seconds += time.perf_counter() - simplify_started
+        summary = {
+            'zoom_band': list(band),
+            'method': self.method,
+            'tolerance_degrees': tolerance,
+            'decimals': decimals,
+            'features': len(features),
+            'features_dropped': dropped,
+            'vertices_in': vertices_in,
+            'vertices_out': vertices_out,
+            'reduction_ratio': round(1 - vertices_out / vertices_in, 4) if vertices_in else 0.0,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+        with self._lock:
+            entry = self._layers.setdefault(layer, {
+                'builds': 0, 'vertices_in': 0, 'vertices_out': 0, 'fetch_seconds': 0.0,
+                'simplify_seconds': 0.0, 'last_build': None
+            })
+            entry['builds'] += 1
+            entry['vertices_in'] += vertices_in
+            entry['vertices_out'] += vertices_out
+            entry['fetch_seconds'] += fetch_seconds
+            entry['simplify_seconds'] += simplify_seconds
+            entry['last_build'] = {**summary, 'fetch_seconds': round(fetch_seconds, 3),
+                                   'simplify_seconds': round(simplify_seconds, 3), 'at': time.time()}
+        return {'type': 'FeatureCollection', 'features': features, 'generalization': summary}
+
+    def stats(self) -> Dict[str, Any]:
+        """Per layer: builds, vertex counts and reduction ratio, and mean fetch and simplify time per build"""
+        with self._lock:
+            items = [(name, dict(entry)) for name, entry in self._layers.items()]
+        layers = {}
+        for name, entry in items:
+            builds = entry['builds']
+            layers[name] = {
+                'builds': builds,
+                'vertices_in': entry['vertices_in'],
+                'vertices_out': entry['vertices_out'],
+                'reduction_ratio': round(1 - entry['vertices_out'] / entry['vertices_in'], 4)
+                if entry['vertices_in'] else 0.0,
+                'mean_fetch_seconds': round(entry['fetch_seconds'] / builds, 3),
+                'mean_simplify_seconds': round(entry['simplify_seconds'] / builds, 3),
+                'last_build': entry['last_build']
+            }
+        return {
+            'method': self.method,
+            'tolerance_px': self.tolerance_px,
+            'zoom_bands': [list(band) for band in self.bands],
+            'waits': self.waits,
+            'layers': layers
+        }
+
+
+def count_vertices(geometry: Dict[str, Any]) -> int:
+    """Number of coordinate pairs in a GeoJSON geometry"""
+    if geometry.get('type') == 'GeometryCollection':
+        return sum(count_vertices(part) for part in geometry.get('geometries', []))
+    depth = {'Point': 0, 'MultiPoint': 1, 'LineString': 1, 'MultiLineString': 2,
+             'Polygon': 2, 'MultiPolygon': 3}.get(geometry.get('type'))
+    if depth is None:
+        return 0
+    if depth == 0:
+        return 1
+    items = [geometry.get('coordinates') or []]
+    for _ in range(depth - 1):
+        items = [child for item in items for child in item]
+    return sum(len(item) for item in items)
@@ -0,0 +1,267 @@
+"""
+Parser for OGC Styled Layer Descriptor documents (SLD 1.0 and Symbology Encoding 1.1).
+
+parse_sld() turns a style into one entry per rule with its title, filter (rendered as a
+CQL-like string), scale range and the fill / stroke colours and stroke width of its
+symbolizers, which is what a static legend needs. Raster styles yield one entry per
+ColorMapEntry. Elements are matched by local name, so both the ogc/sld (1.0) and the
+se (1.1) namespaces work.
+"""
+
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+_COMPARISON_OPERATORS = {
+    'PropertyIsEqualTo': '=',
+    'PropertyIsNotEqualTo': '<>',
+    'PropertyIsLessThan': '<',
+    'PropertyIsLessThanOrEqualTo': '<=',
+    'PropertyIsGreaterThan': '>',
+    'PropertyIsGreaterThanOrEqualTo': '>='
+}
+_ARITHMETIC_OPERATORS = {'Add': '+', 'Sub': '-', 'Mul': '*', 'Div': '/'}
+_HEX_COLOR = re.compile(r'^#?([0-9a-fA-F]{6}|[0-9a-fA-F]{3})$')
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child(elem, name: str):
+    for child in elem:
+        if _local_name(child.tag) == name:
+            return child
+    return None
+
+
+def _child_text(elem, name: str) -> Optional[str]:
+    child = _child(elem, name)
+    if child is None or child.text is None:
+        return None
+    return child.text.strip() or None
+
+
+def _normalize_color(value: Optional[str]) -> Optional[str]:
+    """'#abc' / 'aabbcc' / '#AABBCC' -> '#AABBCC'; None for anything that is not a hex colour"""
+    if not value:
+        return None
+    match = _HEX_COLOR.match(value.strip())
+    if not match:
+        return None
+    digits = match.group(1)
+    if len(digits) == 3:
+        digits = ''.join(c * 2 for c in digits)
+    return f'#{digits.upper()}'
+
+
+def _parameter_value(param) -> Optional[str]:
+    """
+    Value of a CssParameter / SvgParameter. Mixed text and ogc:Literal children are joined;
+    parameters computed from feature attributes (PropertyName, Function) return None.
+    """
+    parts = [param.text or '']
+    for child in param:
+        if _local_name(child.tag) != 'Literal':
+            return None
+        parts.append(child.text or '')
+        parts.append(child.tail or '')
+    value = ''.join(parts).strip()
+    return value or None
+
+
+def _parameters(elem) -> Dict[str, str]:
+    if elem is None:
+        return {}
+    params = {}
+    for child in elem:
+        if _local_name(child.tag) in ('CssParameter', 'SvgParameter') and child.get('name'):
+            value = _parameter_value(child)
+            if value is not None:
+                params[child.get('name')] = value
+    return params
+
+
+def _float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _expression(elem) -> str:
+    name = _local_name(elem.tag)
+    if name in ('PropertyName', 'ValueReference'):
+        return (elem.text or '').strip()
+    if name == 'Literal':
+        text = (elem.text or '').strip()
+        return text if _float(text) is not None else "'" + text.replace("'", "''") + "'"
+    if name == 'Function':
+        return f"{elem.get('name')}({', '.join(_expression(arg) for arg in elem)})"
+    if name in _ARITHMETIC_OPERATORS:
+        return f' {_ARITHMETIC_OPERATORS[name]} '.join(_expression(arg) for arg in elem)
+    return name
+
+
+def _feature_id(elem) -> Optional[str]:
+    if _local_name(elem.tag) not in ('FeatureId', 'GmlObjectId', 'ResourceId'):
+        return None
+    return elem.get('fid') or elem.get('rid') or elem.get('{http://www.opengis.net/gml}id')
+
+
+def _filter_text(elem) -> str:
+    """Render an ogc:Filter operator as a CQL-like string"""
+    name = _local_name(elem.tag)
+    operands = list(elem)
+    if name in _COMPARISON_OPERATORS and len(operands) == 2:
+        return f'{_expression(operands[0])} {_COMPARISON_OPERATORS[name]} {_expression(operands[1])}'
+    if name in ('And', 'Or'):
+        return f' {name.upper()} '.join(f'({_filter_text(operand)})' for operand in operands)
+    if name == 'Not' and operands:
+        return f'NOT ({_filter_text(operands[0])})'
+    if name == 'PropertyIsLike' and len(operands) == 2:
+        return f'{_expression(operands[0])} LIKE {_expression(operands[1])}'
+    if name in ('PropertyIsNull', 'PropertyIsNil') and operands:
+        return f'{_expression(operands[0])} IS NULL'
+    if name == 'PropertyIsBetween' and operands:
+        lower = _child(elem, 'LowerBoundary')
+        upper = _child(elem, 'UpperBoundary')
+        if lower is not None and upper is not None and len(lower) and len(upper):
+            return f'{_expression(operands[0])} BETWEEN {_expression(lower[0])} AND {_expression(upper[0])}'
+    if name == 'Filter' and operands:
+        # An id filter is a list of FeatureId / ResourceId siblings directly under Filter
+        ids = [_feature_id(operand) for operand in operands]
+        if all(ids):
+            return f"IN ({', '.join(repr(i) for i in ids)})"
+        return _filter_text(operands[0])
+    return name  # spatial and other operators: name only, enough to tell rules apart
+
+
+def _symbolizer_paint(symbolizer) -> Dict:
+    """Fill and stroke of a Polygon/Line/Point symbolizer (for points, of its first Mark)"""
+    kind = _local_name(symbolizer.tag)
+    paint_root = symbolizer
+    mark_name = None
+    if kind == 'PointSymbolizer':
+        graphic = _child(symbolizer, 'Graphic')
+        mark = _child(graphic, 'Mark') if graphic is not None else None
+        if mark is None:
+            return {}
+        paint_root = mark
+        mark_name = _child_text(mark, 'WellKnownName')
+
+    fill = _parameters(_child(paint_root, 'Fill'))
+    stroke_elem = _child(paint_root, 'Stroke')
+    stroke = _parameters(stroke_elem)
+    paint = {
+        'symbolizer': kind.replace('Symbolizer', '').lower(),
+        'fill': _normalize_color(fill.get('fill')),
+        'fill_opacity': _float(fill.get('fill-opacity')),
+        # A Stroke element without a colour is drawn black
+        'stroke': _normalize_color(stroke.get('stroke', '#000000' if stroke_elem is not None else None)),
+        'stroke_width': _float(stroke.get('stroke-width', '1' if stroke_elem is not None else None)),
+        'stroke_opacity': _float(stroke.get('stroke-opacity'))
+    }
+    if mark_name:
+        paint['mark'] = mark_name
+    return paint
+
+
+def _color_map_entries(symbolizer) -> List[Dict]:
+    color_map = _child(symbolizer, 'ColorMap')
+    if color_map is None:
+        return []
+    entries = []
+    for entry in color_map:
+        if _local_name(entry.tag) != 'ColorMapEntry':
+            continue
+        label = entry.get('label') or entry.get('quantity')
+        entries.append({
+            'name': None,
+            'title': label,
+            'filter': f"value = {entry.get('quantity')}" if entry.get('quantity') else None,
+            'symbolizer': 'raster',
+            'fill': _normalize_color(entry.get('color')),
+            'fill_opacity': _float(entry.get('opacity')),
+            'stroke': None,
+            'stroke_width': None,
+            'stroke_opacity': None
+        })
+    return entries
+
+
+def _parse_rule(rule) -> List[Dict]:
+    description = _child(rule, 'Description')  # SE 1.1 keeps Title inside Description
+    title = _child_text(rule, 'Title') or (_child_text(description, 'Title') if description is not None else None)
+
+    filter_text = None
+    filter_elem = _child(rule, 'Filter')
+    if filter_elem is not None and len(filter_elem):
+        filter_text = _filter_text(filter_elem)
+    elif _child(rule, 'ElseFilter') is not None:
+        filter_text = 'ELSE'
+
+    entry = {
+        'name': _child_text(rule, 'Name'),
+        'title': title,
+        'filter': filter_text,
+        'min_scale': _float(_child_text(rule, 'MinScaleDenominator')),
+        'max_scale': _float(_child_text(rule, 'MaxScaleDenominator')),
+        'symbolizer': None,
+        'fill': None,
+        'fill_opacity': None,
+        'stroke': None,
+        'stroke_width': None,
+        'stroke_opacity': None
+    }
+
+    raster_entries = []
+    for symbolizer in rule:
+        kind = _local_name(symbolizer.tag)
+        if kind == 'RasterSymbolizer':
+            raster_entries.extend(_color_map_entries(symbolizer))
+        elif kind in ('PolygonSymbolizer', 'LineSymbolizer', 'PointSymbolizer'):
+            # The first symbolizer that sets a property wins, as it is drawn underneath the rest
+            for key, value in _symbolizer_paint(symbolizer).items():
+                if value is not None and entry.get(key) is None:
+                    entry[key] = value
+
+    if raster_entries:
+        return raster_entries
+    if entry['symbolizer'] is None:
+        return []  # text-only or empty rule: nothing to put in a legend
+    return [entry]
+
+
+def parse_sld(source) -> List[Dict]:
+    """
+    Parse an SLD / SE document (bytes, str or file-like object).
+    Returns one dict per rule (or raster colour map entry) in drawing order with the keys
+    name, title, filter, symbolizer, fill, fill_opacity, stroke, stroke_width and
+    stroke_opacity (plus min_scale / max_scale for vector rules and mark for points).
+    Raises xml.etree.ElementTree.ParseError for malformed documents.
+    """
+    if isinstance(source, (bytes, str)):
+        root = ET.fromstring(source)
+    else:
+        root = ET.parse(source).getroot()
+
+    entries = []
+    for elem in root.iter():
+        if _local_name(elem.tag) == 'Rule':
+            entries.extend(_parse_rule(elem))
+    return entries
+
+
+def rule_label(entry: Dict, index: int = 0) -> str:
+    """Human-readable legend label for a parsed rule"""
+    if entry.get('filter') == 'ELSE' and not (entry.get('title') or entry.get('name')):
+        return 'Other'
+    return entry.get('title') or entry.get('name') or entry.get('filter') or f'Rule {index + 1}'
+
+
+def rule_color(entry: Dict) -> Optional[str]:
+    """The colour a legend swatch should show: fill for areas and marks, stroke for lines"""
+    if entry.get('symbolizer') == 'line':
+        return entry.get('stroke') or entry.get('fill')
+    return entry.get('fill') or entry.get('stroke')
@@ -0,0 +1,251 @@
+"""
+In-memory spatial index of layer extents for "which layers cover this view" queries.
+
+PackedRTree is an immutable Sort-Tile-Recursive (STR) bulk-loaded R-tree. LayerExtentIndex
+wraps it with incremental updates: changed and removed layers are kept in a small delta
+that queries scan linearly, and the tree is repacked from scratch once the delta grows
+past a threshold. Bounding boxes are (minx, miny, maxx, maxy) in lon/lat.
+"""
+
+import heapq
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+BBox = Tuple[float, float, float, float]
+
+
+def _intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+def _union(boxes: Iterable[BBox]) -> BBox:
+    minx = miny = math.inf
+    maxx = maxy = -math.inf
+    for box in boxes:
+        minx = min(minx, box[0])
+        miny = min(miny, box[1])
+        maxx = max(maxx, box[2])
+        maxy = max(maxy, box[3])
+    return minx, miny, maxx, maxy
+
+
+def _area(box: BBox) -> float:
+    return max(0.0, box[2] - box[0]) * max(0.0, box[3] - box[1])
+
+
+class PackedRTree:
+    """Static R-tree bulk-loaded with the Sort-Tile-Recursive algorithm"""
+
+    def __init__(self, items: List[Tuple[Any, BBox]], node_capacity: int = 16):
+        self.node_capacity = max(2, node_capacity)
+        self.keys: List[Any] = []
+        self.boxes: List[BBox] = []
+        # levels[0] holds leaf nodes over keys/boxes; levels[i] holds nodes over levels[i - 1].
+        # A node is (minx, miny, maxx, maxy, start, end) with children in [start, end) one level down.
+        self.levels: List[List[tuple]] = []
+
+        if not items:
+            return
+        ordered = self._str_order(items)
+        self.keys = [key for key, _ in ordered]
+        self.boxes = [box for _, box in ordered]
+
+        children = self.boxes
+        while True:
+            nodes = [
+                (*_union(children[start:start + self.node_capacity]), start, min(start + self.node_capacity, len(children)))
+                for start in range(0, len(children), self.node_capacity)
+            ]
+            self.levels.append(nodes)
+            if len(nodes) == 1:
+                break
+            # Sort the parents spatially too, remembering where each one's children live
+            nodes = self._str_order([(node, node[:4]) for node in nodes])
+            self.levels[-1] = [node for node, _ in nodes]
+            children = [node[:4] for node, _ in nodes]
+
+    def _str_order(self, items: List[Tuple[Any, BBox]]) -> List[Tuple[Any, BBox]]:
+        """Order items so that consecutive runs of node_capacity are spatially compact"""
+        capacity = self.node_capacity
+        node_count = math.ceil(len(items) / capacity)
+        slice_count = max(1, math.ceil(math.sqrt(node_count)))
+        slice_size = slice_count * capacity
+
+        by_x = sorted(items, key=lambda item: item[1][0] + item[1][2])
+        ordered = []
+        for start in range(0, len(by_x), slice_size):
+            ordered.extend(sorted(by_x[start:start + slice_size], key=lambda item: item[1][1] + item[1][3]))
+        return ordered
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(self, query: BBox) -> List[int]:
+        """Positions (into keys/boxes) of every item whose box intersects query"""
+        if not self.levels:
+            return []
+        found = []
+        top = len(self.levels) - 1
+        stack = [(top, index) for index in range(len(self.levels[top]))]
+        while stack:
+            level, index = stack.pop()
+            node = self.levels[level][index]
+            if not _intersects(node, query):
+                continue
+            if level == 0:
+                found.extend(i for i in range(node[4], node[5]) if _intersects(self.boxes[i], query))
+            else:
+                stack.extend((level - 1, child) for child in range(node[4], node[5]))
+        return found
+
+
+class LayerExtentIndex:
+    """
+    Thread-safe, incrementally updated index of layer bounding boxes.
+
+    Entries are grouped (by workspace) so a whole group can be replaced from a fresh
+    catalog, touching only the layers that were added, changed or removed.
+    """
+
+    def __init__(self, node_capacity: int = 16, repack_threshold: int = 64):
+        self.node_capacity = node_capacity
+        self.repack_threshold = repack_threshold
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[BBox, Dict]] = {}
+        self._groups: Dict[str, set] = {}
+        self._tree = PackedRTree([], node_capacity)
+        self._delta: Dict[str, Optional[Tuple[BBox, Dict]]] = {}  # changes not yet in the tree
+        self._stats = {'repacks': 0, 'upserts': 0, 'removals': 0, 'queries': 0}
+        self._last_repack_ms = 0.0
+
+    def _set(self, key: str, group: str, bbox: BBox, data: Dict) -> bool:
+        if self._entries.get(key) == (bbox, data):
+            return False
+        self._entries[key] = (bbox, data)
+        self._groups.setdefault(group, set()).add(key)
+        self._delta[key] = (bbox, data)
+        self._stats['upserts'] += 1
+        return True
+
+    def _remove(self, key: str, group: str) -> bool:
+        if self._entries.pop(key, None) is None:
+            return False
+        self._groups.get(group, set()).discard(key)
+        self._delta[key] = None
+        self._stats['removals'] += 1
+        return True
+
+    def _maybe_repack(self):
+        if len(self._delta) >= max(self.repack_threshold, len(self._entries) // 20):
+            self._repack()
+
+    def _repack(self):
+        started = time.perf_counter()
+        self._tree = PackedRTree([(key, bbox) for key, (bbox, _) in self._entries.items()], self.node_capacity)
+        self._delta = {}
+        self._stats['repacks'] += 1
+        self._last_repack_ms = (time.perf_counter() - started) * 1000
+
+    def upsert(self, key: str, group: str, bbox: BBox, data: Optional[Dict] = None) -> bool:
+        """Add or update one entry; returns whether anything changed"""
+        with self._lock:
+            changed = self._set(key, group, tuple(bbox), data or {})
+            self._maybe_repack()
+            return changed
+
+    def remove(self, key: str, group: str) -> bool:
+        with self._lock:
+            removed = self._remove(key, group)
+            self._maybe_repack()
+            return removed
+
+    def replace_group(self, group: str, entries: Dict[str, Tuple[BBox, Dict]]) -> Dict[str, int]:
+        """Make the group's entries exactly `entries`, applying only the difference"""
+        with self._lock:
+            existing = set(self._groups.get(group, ()))
+            added = changed = removed = 0
+            for key, (bbox, data) in entries.items():
+                is_new = key not in self._entries
+                if self._set(key, group, tuple(bbox), data or {}):
+                    if is_new:
+                        added += 1
+                    else:
+                        changed += 1
+            for key in existing - set(entries):
+                removed += int(self._remove(key, group))
+            self._maybe_repack()
+            return {'added': added, 'changed': changed, 'removed': removed}
+
+    def retain_group(self, group: str, keys: Iterable[str]) -> int:
+        """Remove the group's entries whose key is not in keys; returns the count removed"""
+        with self._lock:
+            stale = set(self._groups.get(group, ())) - set(keys)
+            removed = sum(int(self._remove(key, group)) for key in stale)
+            self._maybe_repack()
+            return removed
+
+    def repack(self):
+        with self._lock:
+            self._repack()
+
+    def query(self, bbox: BBox, limit: Optional[int] = None,
+              predicate: Optional[Callable[[Dict], bool]] = None) -> Tuple[List[Dict], int]:
+        """
+        Entries intersecting bbox, ranked by how much of the view they cover and then by
+        how much of the layer lies inside the view. Returns (top `limit` results, total matches).
+        """
+        with self._lock:
+            tree, delta, entries = self._tree, dict(self._delta), self._entries
+            self._stats['queries'] += 1
+
+        view = tuple(bbox)
+        candidates = [
+            (tree.keys[i], tree.boxes[i]) for i in tree.search(view) if tree.keys[i] not in delta
+        ]
+        candidates.extend(
+            (key, entry[0]) for key, entry in delta.items() if entry is not None and _intersects(entry[0], view)
+        )
+
+        view_area = _area(view)
+        ranked = []
+        for key, box in candidates:
+            entry = entries.get(key)
+            if entry is None:
+                continue  # removed after we took our snapshot
+            if predicate is not None and not predicate(entry[1]):
+                continue
+            overlap = _area((max(box[0], view[0]), max(box[1], view[1]), min(box[2], view[2]), min(box[3], view[3])))
+            box_area = _area(box)
+            ranked.append((
+                overlap / view_area if view_area else 0.0,
+                overlap / box_area if box_area else 1.0,
+                key, box, entry[1]
+            ))
+
+        if limit is not None and limit < len(ranked):
+            top = heapq.nlargest(limit, ranked, key=lambda item: (item[0], item[1]))
+        else:
+            top = sorted(ranked, key=lambda item: (item[0], item[1]), reverse=True)
+        results = [
+            {**data, 'key': key, 'bbox': list(box),
+             'view_coverage': round(view_coverage, 4), 'layer_in_view': round(layer_in_view, 4)}
+            for view_coverage, layer_in_view, key, box, data in top
+        ]
+        return results, len(ranked)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                'entries': len(self._entries),
+                'groups': len(self._groups),
+                'packed_entries': len(self._tree),
+                'pending_changes': len(self._delta),
+                'tree_height': len(self._tree.levels),
+                'last_repack_ms': round(self._last_repack_ms, 2)
+            }
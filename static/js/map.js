@@ -1,13 +1,24 @@
 // static/js/map.js
 
 // --- Configuration ---
-const GEOSERVER_WMS_BASE_URL = "http://172.16.0.145:9090/geoserver/";
+// WMS tiles go through the backend tile proxy, which caches them and routes to GeoServer
+const TILE_PROXY_WMS_URL_PREFIX = "/api/tiles/wms/";
 const GEOSERVER_WFS_BASE_URL = "http://172.16.0.145:9090/geoserver/";
-const GEOSERVER_LEGEND_GRAPHIC_BASE_URL = "http://172.16.0.145:9090/geoserver/";
+// Legend images come from the backend legend cache
+const API_LEGEND_URL_PREFIX = "/api/geoserver/legend/";
+// ...or, for a set of layers shown together, from one sprite image with an index of offsets
+const API_LEGEND_SPRITE_URL = "/api/geoserver/legend_sprite.json";
+// Small previews of each layer's full extent, shown in the layer panel
+const API_THUMBNAIL_URL_PREFIX = "/api/geoserver/thumbnail/";
+// Feature info of all clicked layers at once
+const API_FEATURE_INFO_URL = "/api/geoserver/feature_info";
 
 const API_WORKSPACES_URL = "/api/geoserver/workspaces";
 const API_LAYERS_URL_PREFIX = "/api/geoserver/workspaces/";
-const API_LAYER_BOUNDS_URL_PREFIX = "/api/geoserver/layer_bounds/";
+// Bounds of many layers per request, at most GEOSERVER_BATCH_BOUNDS_LIMIT (default 200) at a time
+const API_LAYER_BOUNDS_URL = "/api/geoserver/layer_bounds";
+const LAYER_BOUNDS_BATCH_SIZE = 200;
+const API_CATALOG_URL = "/api/geoserver/catalog";
 
 // Change this to a workspace that actually exists in your GeoServer
 const PRIMARY_DEFAULT_WORKSPACE = "topp"; // Common default workspace, change to your actual workspace
@@ -20,7 +31,11 @@ let osmBaseLayer = null;
 let currentBaseLayer = null;
 let currentOverlayLayers = L.layerGroup();
 let cachedWorkspaceLayers = {};
+let cachedLayerBounds = {};
+let catalogSnapshotPromise = null;
 let layerStates = {};
+let featureInfoLayers = new Set(); // vector layers that answer map clicks
+let featureInfoClickHandlerAdded = false;
 
 // Base layer definitions
 const baseLayers = {
@@ -94,33 +109,100 @@ function changeBaseLayer(layerKey) {
     // Keep current map view and overlay layers intact
 }
 
-// --- Helper function to fetch layer bounds ---
-async function fetchLayerBounds(fullLayerId) {
-    try {
-        console.log(`Making API call to fetch bounds for: ${fullLayerId}`);
-        const response = await fetch(`${API_LAYER_BOUNDS_URL_PREFIX}${encodeURIComponent(fullLayerId)}`);
-        
-        if (!response.ok) {
-            console.error(`Failed to fetch bounds for ${fullLayerId}: HTTP status ${response.status}`);
-            const errorText = await response.text();
-            console.error("Backend error response:", errorText);
-            return FALLBACK_BOUNDS;
-        }
-        
-        const data = await response.json();
-        console.log(`API response for ${fullLayerId}:`, data);
-        
-        if (data.bounds && Array.isArray(data.bounds) && data.bounds.length === 2) {
-            console.log(`Valid bounds found for ${fullLayerId}:`, data.bounds);
-            return data.bounds;
-        } else {
-            console.warn(`Invalid bounds format in response for ${fullLayerId}:`, data);
-            return FALLBACK_BOUNDS;
+// --- Catalog snapshot: every workspace, its layers and their bounds in one request ---
+// The browser revalidates it with the ETag, so repeat loads cost a 304.
+function loadCatalogSnapshot() {
+    if (!catalogSnapshotPromise) {
+        catalogSnapshotPromise = fetch(API_CATALOG_URL)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(snapshot => {
+                snapshot.workspaces.forEach(workspace => {
+                    if (!workspace.error) {
+                        cachedWorkspaceLayers[workspace.name] = {
+                            raster_layers: workspace.raster_layers,
+                            vector_layers: workspace.vector_layers
+                        };
+                    }
+                    Object.entries(workspace.bounds).forEach(([layerName, bounds]) => {
+                        cachedLayerBounds[`${workspace.name}:${layerName}`] = bounds;
+                    });
+                });
+                console.log(`Loaded catalog snapshot ${snapshot.version} (${snapshot.workspaces.length} workspaces)`);
+                return snapshot;
+            })
+            .catch(error => {
+                console.error("Error loading catalog snapshot:", error);
+                catalogSnapshotPromise = null; // Let the next caller retry
+                return null;
+            });
+    }
+    return catalogSnapshotPromise;
+}
+
+// --- Helper functions to fetch layer bounds ---
+// Bounds not in the catalog snapshot are fetched in batches: every layer asked for in the same
+// tick (restoring several layers, zooming to a group) goes into one POST
+async function fetchLayerBoundsBatch(fullLayerIds) {
+    const missing = [...new Set(fullLayerIds)].filter(fullLayerId => !cachedLayerBounds[fullLayerId]);
+    for (let start = 0; start < missing.length; start += LAYER_BOUNDS_BATCH_SIZE) {
+        const batch = missing.slice(start, start + LAYER_BOUNDS_BATCH_SIZE);
+        try {
+            console.log(`Making API call to fetch bounds for ${batch.length} layers`);
+            const response = await fetch(API_LAYER_BOUNDS_URL, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ layers: batch })
+            });
+            if (!response.ok) {
+                console.error(`Failed to fetch bounds: HTTP status ${response.status}`);
+                console.error("Backend error response:", await response.text());
+                continue;
+            }
+            const data = await response.json();
+            Object.entries(data.results).forEach(([fullLayerId, result]) => {
+                if (result.bounds && Array.isArray(result.bounds) && result.bounds.length === 2) {
+                    cachedLayerBounds[fullLayerId] = result.bounds;
+                } else {
+                    console.warn(`No bounds for ${fullLayerId}:`, result.error || result);
+                }
+            });
+        } catch (error) {
+            console.error("Error fetching layer bounds:", error);
         }
-    } catch (error) {
-        console.error(`Error fetching bounds for ${fullLayerId}:`, error);
-        return FALLBACK_BOUNDS;
     }
+    const bounds = {};
+    fullLayerIds.forEach(fullLayerId => {
+        bounds[fullLayerId] = cachedLayerBounds[fullLayerId] || FALLBACK_BOUNDS;
+    });
+    return bounds;
+}
+
+let pendingLayerBounds = null; // fullLayerId -> resolvers waiting for the next batch
+
+function fetchLayerBounds(fullLayerId) {
+    if (cachedLayerBounds[fullLayerId]) {
+        return Promise.resolve(cachedLayerBounds[fullLayerId]);
+    }
+    return new Promise(resolve => {
+        if (!pendingLayerBounds) {
+            pendingLayerBounds = new Map();
+            setTimeout(async () => {
+                const waiting = pendingLayerBounds;
+                pendingLayerBounds = null;
+                const bounds = await fetchLayerBoundsBatch([...waiting.keys()]);
+                waiting.forEach((resolvers, id) => resolvers.forEach(done => done(bounds[id])));
+            }, 0);
+        }
+        if (!pendingLayerBounds.has(fullLayerId)) {
+            pendingLayerBounds.set(fullLayerId, []);
+        }
+        pendingLayerBounds.get(fullLayerId).push(resolve);
+    });
 }
 
 
@@ -217,30 +299,42 @@ async function initializeMap() {
 
 async function loadInitialBaseLayer() {
     try {
-        // Check if the primary workspace exists first
-        const workspacesResponse = await fetch(API_WORKSPACES_URL);
-        if (!workspacesResponse.ok) {
-            console.error('Failed to fetch workspaces list');
-            return;
-        }
-        
-        const workspacesData = await workspacesResponse.json();
-        const availableWorkspaces = workspacesData.workspaces || [];
-        
-        // Check if PRIMARY_DEFAULT_WORKSPACE exists
-        if (!availableWorkspaces.includes(PRIMARY_DEFAULT_WORKSPACE)) {
-            console.log(`Default workspace '${PRIMARY_DEFAULT_WORKSPACE}' not found. Available workspaces:`, availableWorkspaces);
+        // One snapshot request answers both "does the workspace exist" and "what are its layers"
+        const snapshot = await loadCatalogSnapshot();
+        let data = cachedWorkspaceLayers[PRIMARY_DEFAULT_WORKSPACE];
+
+        if (snapshot && !data) {
+            console.log(`Default workspace '${PRIMARY_DEFAULT_WORKSPACE}' not found. Available workspaces:`,
+                        snapshot.workspaces.map(workspace => workspace.name));
             return;
         }
 
-        // Fetch layers for the default workspace
-        const response = await fetch(`${API_LAYERS_URL_PREFIX}${encodeURIComponent(PRIMARY_DEFAULT_WORKSPACE)}/layers`);
-        if (!response.ok) {
-            console.error(`Failed to fetch layers for initial workspace ${PRIMARY_DEFAULT_WORKSPACE}: HTTP status ${response.status}`);
-            return;
+        if (!data) {
+            // Snapshot unavailable: fall back to the per-workspace endpoints
+            const workspacesResponse = await fetch(API_WORKSPACES_URL);
+            if (!workspacesResponse.ok) {
+                console.error('Failed to fetch workspaces list');
+                return;
+            }
+            
+            const workspacesData = await workspacesResponse.json();
+            const availableWorkspaces = workspacesData.workspaces || [];
+            
+            // Check if PRIMARY_DEFAULT_WORKSPACE exists
+            if (!availableWorkspaces.includes(PRIMARY_DEFAULT_WORKSPACE)) {
+                console.log(`Default workspace '${PRIMARY_DEFAULT_WORKSPACE}' not found. Available workspaces:`, availableWorkspaces);
+                return;
+            }
+
+            // Fetch layers for the default workspace
+            const response = await fetch(`${API_LAYERS_URL_PREFIX}${encodeURIComponent(PRIMARY_DEFAULT_WORKSPACE)}/layers`);
+            if (!response.ok) {
+                console.error(`Failed to fetch layers for initial workspace ${PRIMARY_DEFAULT_WORKSPACE}: HTTP status ${response.status}`);
+                return;
+            }
+            data = await response.json();
+            cachedWorkspaceLayers[PRIMARY_DEFAULT_WORKSPACE] = data;
         }
-        const data = await response.json();
-        cachedWorkspaceLayers[PRIMARY_DEFAULT_WORKSPACE] = data;
 
         const vectorLayers = data.vector_layers;
 
@@ -280,7 +374,7 @@ function loadOverlayLayers(workspaceName, vectorLayers) {
         const fullLayerName = `${workspaceName}:${layerName}`;
         const defaultStyleName = `${workspaceName}:${layerName}`;
 
-        const wmsLayer = L.tileLayer.wms(`${GEOSERVER_WMS_BASE_URL}${workspaceName}/wms?`, {
+        const wmsLayer = L.tileLayer.wms(`${TILE_PROXY_WMS_URL_PREFIX}${workspaceName}`, {
             layers: fullLayerName,
             styles: defaultStyleName,
             format: 'image/png',
@@ -296,8 +390,35 @@ function loadOverlayLayers(workspaceName, vectorLayers) {
         wmsLayer._workspaceName = workspaceName;
 
         currentOverlayLayers.addLayer(wmsLayer);
-        addLegendCard(workspaceName, layerName, fullLayerName);
     });
+
+    // One sprite for all of the workspace's legends instead of one image request per layer
+    const fullLayerNames = vectorLayers.map(layerName => `${workspaceName}:${layerName}`);
+    fetchLegendSprite(fullLayerNames)
+        .catch(error => {
+            console.warn('Legend sprite not available, loading legends one by one:', error);
+            return null;
+        })
+        .then(sprite => {
+            vectorLayers.forEach(layerName => {
+                const fullLayerName = `${workspaceName}:${layerName}`;
+                // The overlays may have been replaced while the sprite loaded
+                const stillShown = currentOverlayLayers.getLayers().some(layer => layer._layerId === fullLayerName);
+                if (stillShown) {
+                    addLegendCard(workspaceName, layerName, fullLayerName, sprite);
+                }
+            });
+        });
+}
+
+// Index of the legend sprite for a set of "workspace:layer" names: the sprite image URL and
+// each legend's offsets in it
+async function fetchLegendSprite(fullLayerNames) {
+    const response = await fetch(`${API_LEGEND_SPRITE_URL}?layers=${encodeURIComponent(fullLayerNames.join(','))}`);
+    if (!response.ok) {
+        throw new Error(`Legend sprite request failed with status ${response.status}`);
+    }
+    return response.json();
 }
 
 
@@ -488,6 +609,11 @@ function setupBaseMapSelector() {
 async function fetchAndRenderWorkspaces() {
     workspaceListContainer.innerHTML = 'Loading workspaces...';
     try {
+        const snapshot = await loadCatalogSnapshot();
+        if (snapshot) {
+            renderWorkspaces(snapshot.workspaces.map(workspace => workspace.name));
+            return;
+        }
         const response = await fetch(API_WORKSPACES_URL);
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
@@ -557,10 +683,17 @@ function renderWorkspaces(workspaces) {
                 if (!cachedWorkspaceLayers[workspaceName]) {
                     await fetchAndRenderLayersForWorkspace(workspaceName, workspaceItem);
                 } else {
-                    renderLayers(workspaceItem.querySelector('.layer-lists-container'), 
-                                 cachedWorkspaceLayers[workspaceName].raster_layers, 
+                    // Layers may come from the catalog snapshot, before any list was rendered
+                    let layerListElement = workspaceItem.querySelector('.layer-lists-container');
+                    if (!layerListElement) {
+                        layerListElement = document.createElement('div');
+                        layerListElement.className = 'layer-lists-container';
+                        workspaceItem.appendChild(layerListElement);
+                    }
+                    renderLayers(layerListElement,
+                                 cachedWorkspaceLayers[workspaceName].raster_layers,
                                  cachedWorkspaceLayers[workspaceName].vector_layers);
-                    workspaceItem.querySelector('.layer-lists-container').classList.add('show');
+                    layerListElement.classList.add('show');
                 }
             }
         });
@@ -642,6 +775,7 @@ function renderLayers(layerListElement, rasterLayers, vectorLayers) {
             const label = document.createElement('label');
             label.htmlFor = checkbox.id;
             label.innerHTML = `<i class="fas fa-image"></i> ${layerName}`;
+            label.prepend(createLayerThumbnail(workspaceName, layerName));
             
             listItem.appendChild(checkbox);
             listItem.appendChild(label);
@@ -701,6 +835,7 @@ function renderLayers(layerListElement, rasterLayers, vectorLayers) {
             const label = document.createElement('label');
             label.htmlFor = checkbox.id;
             label.innerHTML = `<i class="fas fa-vector-square"></i> ${layerName}`;
+            label.prepend(createLayerThumbnail(workspaceName, layerName));
             
             listItem.appendChild(checkbox);
             listItem.appendChild(label);
@@ -730,6 +865,18 @@ function renderLayers(layerListElement, rasterLayers, vectorLayers) {
     layerListElement.appendChild(vectorSection);
 }
 
+// Preview of a layer's extent; loaded only when scrolled into view, and dropped when the
+// backend has none yet (it answers 202 while the thumbnail is rendered in the background)
+function createLayerThumbnail(workspaceName, layerName) {
+    const thumbnail = document.createElement('img');
+    thumbnail.className = 'layer-thumbnail';
+    thumbnail.loading = 'lazy';
+    thumbnail.alt = '';
+    thumbnail.src = `${API_THUMBNAIL_URL_PREFIX}${encodeURIComponent(workspaceName)}/${encodeURIComponent(layerName)}`;
+    thumbnail.onerror = () => thumbnail.remove();
+    return thumbnail;
+}
+
 // New function to handle raster layer toggling (Updated to keep OSM as base and fit bounds)
 function toggleRasterLayerInWorkspace(workspaceName, layerName, isVisible) {
     const fullLayerName = `${workspaceName}:${layerName}`;
@@ -737,7 +884,7 @@ function toggleRasterLayerInWorkspace(workspaceName, layerName, isVisible) {
     
     if (isVisible) {
         // Add the raster layer as overlay
-        const wmsLayer = L.tileLayer.wms(`${GEOSERVER_WMS_BASE_URL}${workspaceName}/wms`, {
+        const wmsLayer = L.tileLayer.wms(`${TILE_PROXY_WMS_URL_PREFIX}${workspaceName}`, {
             layers: fullLayerName,
             format: 'image/png',
             transparent: true,
@@ -792,7 +939,7 @@ function toggleVectorLayerInWorkspace(workspaceName, layerName, isVisible) {
     
     if (isVisible) {
         // Add the layer to the map with click interaction
-        const wmsLayer = L.tileLayer.wms(`${GEOSERVER_WMS_BASE_URL}${workspaceName}/wms`, {
+        const wmsLayer = L.tileLayer.wms(`${TILE_PROXY_WMS_URL_PREFIX}${workspaceName}`, {
             layers: fullLayerName,
             format: 'image/png',
             transparent: true,
@@ -843,7 +990,7 @@ function toggleVectorLayerInWorkspace(workspaceName, layerName, isVisible) {
 }
 
 // Function to add legend card with GeoServer legend graphics
-function addLegendCard(workspaceName, layerName, fullLayerName) {
+function addLegendCard(workspaceName, layerName, fullLayerName, sprite = null) {
     // Create legend container if it doesn't exist
     let legendContainer = document.getElementById('legend-container');
     if (!legendContainer) {
@@ -886,8 +1033,25 @@ function addLegendCard(workspaceName, layerName, fullLayerName) {
     legendItem.className = 'legend-item';
     legendItem.id = `legend-item-${fullLayerName.replace(':', '-')}`;
 
-    // Generate GeoServer GetLegendGraphic URL
-    const legendUrl = `${GEOSERVER_LEGEND_GRAPHIC_BASE_URL}${workspaceName}/wms?REQUEST=GetLegendGraphic&VERSION=1.0.0&FORMAT=image/png&LAYER=${fullLayerName}&STYLE=`;
+    // Legend graphic: a cut-out of the sprite when one was loaded for this layer, else its own image
+    const legendUrl = `${API_LEGEND_URL_PREFIX}${encodeURIComponent(workspaceName)}/${encodeURIComponent(layerName)}`;
+    const spriteEntry = sprite && sprite.legends ? sprite.legends[fullLayerName] : null;
+    let legendGraphic = `
+                <img src="${legendUrl}"
+                     alt="Legend for ${layerName}"
+                     class="legend-image"
+                     onerror="this.style.display='none'; this.nextElementSibling.style.display='block';">
+                <div class="legend-error" style="display: none;">Legend not available</div>`;
+    if (spriteEntry) {
+        legendGraphic = `
+                <div role="img"
+                     aria-label="Legend for ${layerName}"
+                     class="legend-image legend-sprite"
+                     style="width: ${spriteEntry.width}px; height: ${spriteEntry.height}px; background: url('${sprite.image}') -${spriteEntry.x}px -${spriteEntry.y}px no-repeat;"></div>`;
+    } else if (sprite && sprite.missing && sprite.missing.includes(fullLayerName)) {
+        legendGraphic = `
+                <div class="legend-error">Legend not available</div>`;
+    }
     
     // Generate unique slider ID
     const sliderId = `opacity-slider-${fullLayerName.replace(':', '-')}`;
@@ -895,12 +1059,7 @@ function addLegendCard(workspaceName, layerName, fullLayerName) {
     
     legendItem.innerHTML = `
         <div class="legend-item-content">
-            <div class="legend-graphic-container">
-                <img src="${legendUrl}"
-                     alt="Legend for ${layerName}"
-                     class="legend-image"
-                     onerror="this.style.display='none'; this.nextElementSibling.style.display='block';">
-                <div class="legend-error" style="display: none;">Legend not available</div>
+            <div class="legend-graphic-container">${legendGraphic}
             </div>
             <div class="legend-item-header">
                 <span class="legend-layer-name">${layerName}</span>
@@ -1023,11 +1182,7 @@ function removeLegendAndLayer(fullLayerName) {
     });
 
     // Remove click handlers for vector layers
-    if (window.vectorLayerClickHandlers && window.vectorLayerClickHandlers[fullLayerName]) {
-        map.off('click', window.vectorLayerClickHandlers[fullLayerName]);
-        delete window.vectorLayerClickHandlers[fullLayerName];
-        console.log(`Removed click handler for ${fullLayerName}`);
-    }
+    removeVectorLayerClickHandler(fullLayerName);
 }
 
 // Function to update layer opacity
@@ -1345,69 +1500,82 @@ async function fitMapToLayerBounds(fullLayerName) {
 
 // Function to add click handler for vector layers
 function addVectorLayerClickHandler(workspaceName, layerName, fullLayerName) {
-    // Store the click handler function so we can remove it later
-    const clickHandler = async function(e) {
-        // Check if this layer is currently visible
-        const layerKey = `${workspaceName}:${layerName}`;
-        if (!layerStates[layerKey]) {
-            return; // Layer is not visible, don't handle clicks
-        }
-        
-        const latlng = e.latlng;
-        console.log(`Clicked on map at: ${latlng.lat}, ${latlng.lng} for layer ${fullLayerName}`);
-        
-        // Show loading popup first
-        const loadingPopup = L.popup()
-            .setLatLng(latlng)
-            .setContent('<div class="popup-loading"><i class="fas fa-spinner fa-spin"></i> Loading feature info...</div>')
-            .openOn(map);
-        
-        try {
-            // Get feature info using WMS GetFeatureInfo
-            const featureInfo = await getFeatureInfo(workspaceName, layerName, latlng);
-            
-            if (featureInfo && featureInfo.features && featureInfo.features.length > 0) {
-                const feature = featureInfo.features[0];
-                const popupContent = createFeaturePopupContent(feature.properties, layerName);
-                
-                // Update popup with feature info
-                loadingPopup.setContent(popupContent);
-            } else {
-                loadingPopup.setContent('<div class="popup-no-data">No feature found at this location</div>');
-            }
-        } catch (error) {
-            console.error('Error getting feature info:', error);
-            loadingPopup.setContent('<div class="popup-error">Error loading feature information</div>');
-        }
-    };
-    
-    // Store the handler for later removal
-    if (!window.vectorLayerClickHandlers) {
-        window.vectorLayerClickHandlers = {};
+    // One map click handler queries every vector layer that answers clicks, in one request
+    featureInfoLayers.add(fullLayerName);
+    if (!featureInfoClickHandlerAdded) {
+        map.on('click', handleFeatureInfoClick);
+        featureInfoClickHandlerAdded = true;
     }
-    window.vectorLayerClickHandlers[fullLayerName] = clickHandler;
-    
-    // Add click event to map
-    map.on('click', clickHandler);
 }
 
 // Function to remove click handler for vector layers
 function removeVectorLayerClickHandler(fullLayerName) {
-    if (window.vectorLayerClickHandlers && window.vectorLayerClickHandlers[fullLayerName]) {
-        map.off('click', window.vectorLayerClickHandlers[fullLayerName]);
-        delete window.vectorLayerClickHandlers[fullLayerName];
+    if (featureInfoLayers.delete(fullLayerName)) {
         console.log(`Removed click handler for ${fullLayerName}`);
     }
 }
 
-// Simplified function to get feature info using only backend proxy
-async function getFeatureInfo(workspaceName, layerName, latlng) {
+async function handleFeatureInfoClick(e) {
+    // Only layers that are currently visible
+    const activeLayers = [...featureInfoLayers].filter(fullLayerName => layerStates[fullLayerName]);
+    if (activeLayers.length === 0) {
+        return;
+    }
+
+    const latlng = e.latlng;
+    console.log(`Clicked on map at: ${latlng.lat}, ${latlng.lng} for layers ${activeLayers.join(', ')}`);
+
+    // Show loading popup first
+    const loadingPopup = L.popup()
+        .setLatLng(latlng)
+        .setContent('<div class="popup-loading"><i class="fas fa-spinner fa-spin"></i> Loading feature info...</div>')
+        .openOn(map);
+
+    try {
+        // Get feature info of all layers using WMS GetFeatureInfo
+        const featureInfo = await getFeatureInfo(activeLayers, latlng);
+
+        // One card per feature, layer by layer in the order they were switched on
+        let popupContent = '';
+        activeLayers.forEach(fullLayerName => {
+            const layerResult = featureInfo.layers[fullLayerName];
+            if (!layerResult || !layerResult.features) {
+                return;
+            }
+            const layerName = fullLayerName.substring(fullLayerName.indexOf(':') + 1);
+            layerResult.features.forEach(feature => {
+                popupContent += createFeaturePopupContent(feature.properties, layerName);
+            });
+        });
+        // Features the backend could not give to a layer, titled by their id's layer part
+        (featureInfo.unmatched || []).forEach(feature => {
+            const featureId = String(feature.id || '');
+            const title = featureId.includes('.') ? featureId.substring(0, featureId.indexOf('.')) : 'Feature';
+            popupContent += createFeaturePopupContent(feature.properties, title);
+        });
+
+        if (popupContent) {
+            // Update popup with feature info
+            loadingPopup.setContent(`<div class="feature-popup-list">${popupContent}</div>`);
+        } else {
+            loadingPopup.setContent('<div class="popup-no-data">No feature found at this location</div>');
+        }
+    } catch (error) {
+        console.error('Error getting feature info:', error);
+        loadingPopup.setContent('<div class="popup-error">Error loading feature information</div>');
+    }
+}
+
+// Feature info of several layers ("workspace:layer" names) at a map location, through the backend
+// proxy, which sends one GetFeatureInfo per workspace
+async function getFeatureInfo(fullLayerNames, latlng) {
     try {
         const point = map.latLngToContainerPoint(latlng);
         const size = map.getSize();
         const bounds = map.getBounds();
         
         const params = new URLSearchParams({
+            layers: fullLayerNames.join(','),
             bbox: `${bounds.getWest()},${bounds.getSouth()},${bounds.getEast()},${bounds.getNorth()}`,
             width: size.x,
             height: size.y,
@@ -1415,7 +1583,7 @@ async function getFeatureInfo(workspaceName, layerName, latlng) {
             y: Math.round(point.y)
         });
         
-        const url = `/api/geoserver/feature_info/${encodeURIComponent(workspaceName)}/${encodeURIComponent(layerName)}?${params}`;
+        const url = `${API_FEATURE_INFO_URL}?${params}`;
         
         console.log('GetFeatureInfo URL:', url);
         
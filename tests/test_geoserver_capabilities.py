@@ -0,0 +1,74 @@
+"""GetCapabilities parsing, including GeoServer's service exceptions served with HTTP 200"""
+
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from geoserver_capabilities import parse_wfs_feature_types, parse_wms_capabilities
+
+WMS_CAPABILITIES = b'''<?xml version="1.0" encoding="UTF-8"?>
+<WMS_Capabilities version="1.3.0" xmlns="http://www.opengis.net/wms">
+  <Capability>
+    <Layer>
+      <Title>Badrinath_2022</Title>
+      <Layer queryable="1">
+        <Name>Badrinath_2022:buildings</Name>
+        <EX_GeographicBoundingBox>
+          <westBoundLongitude>79.49</westBoundLongitude>
+          <eastBoundLongitude>79.50</eastBoundLongitude>
+          <southBoundLatitude>30.74</southBoundLatitude>
+          <northBoundLatitude>30.75</northBoundLatitude>
+        </EX_GeographicBoundingBox>
+      </Layer>
+    </Layer>
+  </Capability>
+</WMS_Capabilities>'''
+
+WFS_CAPABILITIES = b'''<?xml version="1.0" encoding="UTF-8"?>
+<wfs:WFS_Capabilities version="2.0.0" xmlns:wfs="http://www.opengis.net/wfs/2.0"
+    xmlns:ows="http://www.opengis.net/ows/1.1">
+  <FeatureTypeList>
+    <FeatureType>
+      <Name>Badrinath_2022:buildings</Name>
+      <ows:WGS84BoundingBox>
+        <ows:LowerCorner>79.49 30.74</ows:LowerCorner>
+        <ows:UpperCorner>79.50 30.75</ows:UpperCorner>
+      </ows:WGS84BoundingBox>
+    </FeatureType>
+  </FeatureTypeList>
+</wfs:WFS_Capabilities>'''
+
+SERVICE_EXCEPTION = b'''<?xml version="1.0" encoding="UTF-8"?>
+<ServiceExceptionReport version="1.3.0" xmlns="http://www.opengis.net/ogc">
+  <ServiceException code="LayerNotDefined">No such workspace: Badrinath_2022</ServiceException>
+</ServiceExceptionReport>'''
+
+OWS_EXCEPTION = b'''<?xml version="1.0" encoding="UTF-8"?>
+<ows:ExceptionReport version="2.0.0" xmlns:ows="http://www.opengis.net/ows/1.1">
+  <ows:Exception exceptionCode="NoApplicableCode"><ows:ExceptionText>Unknown namespace</ows:ExceptionText></ows:Exception>
+</ows:ExceptionReport>'''
+
+
+def test_wms_layers_are_parsed():
+    layers = parse_wms_capabilities(io.BytesIO(WMS_CAPABILITIES))
+    assert list(layers) == ['Badrinath_2022:buildings']
+    assert layers['Badrinath_2022:buildings']['bounds'] == [[30.74, 79.49], [30.75, 79.50]]
+
+
+def test_wfs_feature_types_are_parsed():
+    assert parse_wfs_feature_types(io.BytesIO(WFS_CAPABILITIES)) == {
+        'Badrinath_2022:buildings': [[30.74, 79.49], [30.75, 79.50]]
+    }
+
+
+@pytest.mark.parametrize('document', [SERVICE_EXCEPTION, OWS_EXCEPTION, WFS_CAPABILITIES])
+def test_wms_exception_report_is_not_an_empty_catalog(document):
+    with pytest.raises(ET.ParseError):
+        parse_wms_capabilities(io.BytesIO(document))
+
+
+@pytest.mark.parametrize('document', [SERVICE_EXCEPTION, OWS_EXCEPTION, WMS_CAPABILITIES])
+def test_wfs_exception_report_is_not_an_empty_catalog(document):
+    with pytest.raises(ET.ParseError):
+        parse_wfs_feature_types(io.BytesIO(document))
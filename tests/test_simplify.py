@@ -0,0 +1,117 @@
+"""Vectorised Douglas-Peucker and Visvalingam-Whyatt against plain recursive and looping references"""
+
+import math
+import random
+
+import numpy as np
+import pytest
+
+from simplify import FeatureGeneralizer, douglas_peucker_mask, visvalingam_mask
+
+
+def reference_douglas_peucker(points, tolerance):
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+
+    def split(start, end):
+        if end - start < 2:
+            return
+        (x0, y0), (x1, y1) = points[start], points[end]
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        farthest, at = -1.0, None
+        for index in range(start + 1, end):
+            px, py = points[index][0] - x0, points[index][1] - y0
+            distance = abs(dx * py - dy * px) / length if length > 0 else math.hypot(px, py)
+            if distance > farthest:
+                farthest, at = distance, index
+        if farthest > tolerance:
+            keep[at] = True
+            split(start, at)
+            split(at, end)
+
+    split(0, len(points) - 1)
+    return keep
+
+
+def reference_visvalingam(points, min_area):
+    index = list(range(len(points)))
+    while len(index) > 2:
+        areas = []
+        for a, b, c in zip(index, index[1:], index[2:]):
+            (ax, ay), (bx, by), (cx, cy) = points[a], points[b], points[c]
+            areas.append(0.5 * abs((bx - ax) * (cy - ay) - (cx - ax) * (by - ay)))
+        if min(areas) >= min_area:
+            break
+        drop = set()
+        for position, area in enumerate(areas):
+            left = areas[position - 1] if position > 0 else math.inf
+            right = areas[position + 1] if position + 1 < len(areas) else math.inf
+            if area < min_area and area <= left and area < right:
+                drop.add(index[position + 1])
+        index = [i for i in index if i not in drop]
+    return [i in index for i in range(len(points))]
+
+
+def random_path(rng):
+    """A random walk, sometimes with repeated points and straight stretches"""
+    points = [(rng.uniform(-10, 10), rng.uniform(-10, 10))]
+    for _ in range(rng.randint(1, 60)):
+        roll = rng.random()
+        x, y = points[-1]
+        if roll < 0.1:
+            points.append((x, y))
+        elif roll < 0.2 and len(points) > 1:
+            px, py = points[-2]
+            points.append((2 * x - px, 2 * y - py))
+        else:
+            points.append((x + rng.gauss(0, 1), y + rng.gauss(0, 1)))
+    if rng.random() < 0.2:
+        points.append(points[0])
+    return points
+
+
+SQUARE_RING = [(0, 0), (5, 0.01), (10, 0), (10.01, 5), (10, 10), (5, 9.99), (0, 10), (-0.01, 5), (0, 0)]
+TINY_RING = [(0, 0), (0.01, 0), (0.01, 0.01), (0, 0.01), (0, 0)]
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_douglas_peucker_matches_recursive_reference(seed):
+    rng = random.Random(seed)
+    points = random_path(rng)
+    tolerance = rng.choice([0, 0.1, 0.5, 1, 3])
+    mask = douglas_peucker_mask(np.asarray(points, dtype=float), tolerance)
+    assert mask.tolist() == reference_douglas_peucker(points, tolerance)
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_visvalingam_matches_reference(seed):
+    rng = random.Random(seed)
+    points = random_path(rng)
+    min_area = rng.choice([0, 0.1, 0.5, 1, 3])
+    mask = visvalingam_mask(np.asarray(points, dtype=float), min_area)
+    assert mask.tolist() == reference_visvalingam(points, min_area)
+
+
+@pytest.mark.parametrize('simplify', [douglas_peucker_mask, visvalingam_mask])
+def test_closed_ring_keeps_its_corners(simplify):
+    mask = simplify(np.asarray(SQUARE_RING, dtype=float), 0.5)
+    kept = [point for point, keep in zip(SQUARE_RING, mask) if keep]
+    assert kept == [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]
+
+
+@pytest.mark.parametrize('simplify', [douglas_peucker_mask, visvalingam_mask])
+def test_ring_below_tolerance_collapses_to_its_end_points(simplify):
+    mask = simplify(np.asarray(TINY_RING, dtype=float), 0.5)
+    assert mask.tolist() == [True, False, False, False, True]
+
+
+@pytest.mark.parametrize('method', ['dp', 'visvalingam'])
+def test_collapsed_rings_are_dropped_from_polygons(method):
+    generalizer = FeatureGeneralizer(method=method)
+    polygon = {'type': 'Polygon', 'coordinates': [SQUARE_RING, TINY_RING]}
+    assert generalizer.simplify_geometry(polygon, 0.5, 6) == {
+        'type': 'Polygon',
+        'coordinates': [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]]
+    }
+    assert generalizer.simplify_geometry({'type': 'Polygon', 'coordinates': [TINY_RING]}, 0.5, 6) is None
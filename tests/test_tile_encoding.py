@@ -0,0 +1,36 @@
+"""Choice of the encoded tile variant from the layer type and the Accept header"""
+
+import pytest
+
+from tile_cache import TileEncoder
+
+PNG_GETMAP = {'FORMAT': 'image/png'}
+
+WEBP = [('image/webp', 1), ('image/*', 0.8)]
+JPEG = [('image/jpeg', 1)]
+ANY_IMAGE = [('image/*', 1)]
+PNG_ONLY = [('image/png', 1)]
+NO_JPEG = [('image/png', 1), ('image/jpeg', 0)]
+
+
+@pytest.mark.parametrize('layer_type, accept, variant', [
+    ('raster', WEBP, 'webp'),
+    ('raster', JPEG, 'jpeg'),
+    ('raster', ANY_IMAGE, 'jpeg'),
+    ('raster', PNG_ONLY, None),
+    ('raster', NO_JPEG, None),
+    ('raster', [], None),
+    ('vector', WEBP, 'png8'),
+    ('vector', JPEG, 'png8'),
+    ('vector', PNG_ONLY, 'png8'),
+    (None, WEBP, 'webp'),
+    (None, JPEG, 'jpeg'),
+    (None, PNG_ONLY, None),
+])
+def test_variant_follows_layer_type_and_accept(layer_type, accept, variant):
+    assert TileEncoder().variant_for(PNG_GETMAP, layer_type, accept) == variant
+
+
+def test_other_formats_and_disabled_encoder_are_served_as_rendered():
+    assert TileEncoder().variant_for({'FORMAT': 'image/jpeg'}, 'raster', WEBP) is None
+    assert TileEncoder(enabled=False).variant_for(PNG_GETMAP, 'raster', WEBP) is None
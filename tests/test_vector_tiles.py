@@ -0,0 +1,190 @@
+"""Vector tiles decoded back with a minimal protobuf reader"""
+
+import struct
+
+from vector_tiles import GEOM_LINESTRING, GEOM_POLYGON, encode_vector_tile
+
+EXTENT = 4096
+BUFFER = 64
+# One tile unit per metre, so tile x is the coordinate and tile y is EXTENT - y
+BOUNDS = (0, 0, EXTENT, EXTENT)
+
+
+def read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, position
+
+
+def read_message(data):
+    """(field number, value) pairs; length-delimited values as bytes, fixed64 as raw bytes"""
+    fields = []
+    position = 0
+    while position < len(data):
+        key, position = read_varint(data, position)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, position = read_varint(data, position)
+        elif wire_type == 1:
+            value, position = data[position:position + 8], position + 8
+        elif wire_type == 2:
+            length, position = read_varint(data, position)
+            value, position = data[position:position + length], position + length
+        else:
+            raise AssertionError(f'unexpected wire type {wire_type}')
+        fields.append((number, value))
+    return fields
+
+
+def read_packed(data):
+    values = []
+    position = 0
+    while position < len(data):
+        value, position = read_varint(data, position)
+        values.append(value)
+    return values
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_value(data):
+    (number, value), = read_message(data)
+    if number == 1:
+        return value.decode('utf-8')
+    if number == 3:
+        return struct.unpack('<d', value)[0]
+    if number == 5:
+        return value
+    if number == 6:
+        return unzigzag(value)
+    if number == 7:
+        return bool(value)
+    raise AssertionError(f'unexpected value field {number}')
+
+
+def decode_geometry(commands):
+    """[(command, [(x, y), ...])] with absolute tile coordinates"""
+    parts = []
+    x = y = 0
+    position = 0
+    while position < len(commands):
+        command, count = commands[position] & 7, commands[position] >> 3
+        position += 1
+        points = []
+        if command != 7:
+            for _ in range(count):
+                x += unzigzag(commands[position])
+                y += unzigzag(commands[position + 1])
+                position += 2
+                points.append((x, y))
+        parts.append((command, count, points))
+    return parts
+
+
+def decode_tile(data):
+    layers = {}
+    for number, layer_data in read_message(data):
+        assert number == 3
+        fields = read_message(layer_data)
+        keys = [value.decode('utf-8') for number, value in fields if number == 3]
+        values = [decode_value(value) for number, value in fields if number == 4]
+        layer = dict((number, value) for number, value in fields if number in (1, 5, 15))
+        features = []
+        for number, feature_data in fields:
+            if number != 2:
+                continue
+            feature = {'properties': {}}
+            for feature_number, value in read_message(feature_data):
+                if feature_number == 1:
+                    feature['id'] = value
+                elif feature_number == 2:
+                    tags = read_packed(value)
+                    feature['properties'] = {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])}
+                elif feature_number == 3:
+                    feature['type'] = value
+                elif feature_number == 4:
+                    feature['geometry'] = decode_geometry(read_packed(value))
+            features.append(feature)
+        layers[layer[1].decode('utf-8')] = {'version': layer[15], 'extent': layer[5], 'features': features}
+    return layers
+
+
+def signed_area(points):
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])) / 2
+
+
+def feature(geometry, properties=None, feature_id=None):
+    return {'type': 'Feature', 'id': feature_id, 'geometry': geometry, 'properties': properties or {}}
+
+
+def test_polygon_crossing_tile_edge_is_clipped_to_buffer_and_wound():
+    exterior = [[3000, 1000], [6000, 1000], [6000, 2000], [3000, 2000], [3000, 1000]]
+    hole = [[3500, 1200], [3500, 1800], [3800, 1800], [3800, 1200], [3500, 1200]]
+    tile = encode_vector_tile([('parcels', [feature({'type': 'Polygon', 'coordinates': [exterior, hole]})])],
+                              BOUNDS, EXTENT, BUFFER)
+
+    layer = decode_tile(tile)['parcels']
+    assert layer['version'] == 2 and layer['extent'] == EXTENT
+    parcel, = layer['features']
+    assert parcel['type'] == GEOM_POLYGON
+
+    # Each ring is MoveTo(1), LineTo(n - 1), ClosePath(1)
+    commands = [(command, count) for command, count, _ in parcel['geometry']]
+    assert commands == [(1, 1), (2, 3), (7, 1), (1, 1), (2, 3), (7, 1)]
+    outer = parcel['geometry'][0][2] + parcel['geometry'][1][2]
+    inner = parcel['geometry'][3][2] + parcel['geometry'][4][2]
+
+    assert sorted(outer) == [(3000, 2096), (3000, 3096), (EXTENT + BUFFER, 2096), (EXTENT + BUFFER, 3096)]
+    assert sorted(inner) == [(3500, 2296), (3500, 2896), (3800, 2296), (3800, 2896)]
+    assert signed_area(outer) > 0
+    assert signed_area(inner) < 0
+
+
+def test_polygon_outside_tile_and_buffer_is_dropped():
+    outside = [[5000, 1000], [6000, 1000], [6000, 2000], [5000, 1000]]
+    assert encode_vector_tile([('parcels', [feature({'type': 'Polygon', 'coordinates': [outside]})])],
+                              BOUNDS, EXTENT, BUFFER) == b''
+
+
+def test_line_commands_and_deltas():
+    line = {'type': 'LineString', 'coordinates': [[100, 100], [200, 300], [200.2, 300.1], [-500, 300]]}
+    tile = encode_vector_tile([('roads', [feature(line, feature_id='roads.42')])], BOUNDS, EXTENT, BUFFER)
+
+    road, = decode_tile(tile)['roads']['features']
+    assert road['id'] == 42
+    assert road['type'] == GEOM_LINESTRING
+    # The point rounding onto its predecessor is dropped; the line stops at the buffer
+    assert road['geometry'] == [(1, 1, [(100, 3996)]), (2, 2, [(200, 3796), (-BUFFER, 3796)])]
+
+
+def test_property_values_round_trip_and_are_shared():
+    point = {'type': 'Point', 'coordinates': [10, 10]}
+    features = [
+        feature(point, {'name': 'Badrinath', 'floors': 3, 'offset': -7, 'height': 12.5,
+                        'listed': True, 'tags': {'kind': 'temple'}, 'missing': None}),
+        feature(point, {'name': 'Badrinath', 'floors': 4}),
+    ]
+    tile = encode_vector_tile([('buildings', features)], BOUNDS, EXTENT, BUFFER)
+
+    first, second = decode_tile(tile)['buildings']['features']
+    assert first['properties'] == {'name': 'Badrinath', 'floors': 3, 'offset': -7, 'height': 12.5,
+                                   'listed': True, 'tags': '{"kind":"temple"}'}
+    assert second['properties'] == {'name': 'Badrinath', 'floors': 4}
+
+    layer_fields = read_message(read_message(tile)[0][1])
+    values = [decode_value(value) for number, value in layer_fields if number == 4]
+    assert values.count('Badrinath') == 1
+
+
+def test_layers_without_features_are_omitted():
+    point = {'type': 'Point', 'coordinates': [10, 10]}
+    tile = encode_vector_tile([('empty', []), ('points', [feature(point)]), ('nothing', [feature(None)])],
+                              BOUNDS, EXTENT, BUFFER)
+    assert list(decode_tile(tile)) == ['points']
@@ -0,0 +1,249 @@
+"""
+Layer thumbnails: a small preview of each layer's full extent for the layer panel.
+
+A thumbnail is one GetMap of the layer's lat/lon bounds (in Web Mercator, like the map),
+at most size pixels on its longer side, re-encoded as WebP. Thumbnails are rendered by a
+small pool of background workers, so opening a workspace with fifty layers queues fifty
+small GetMaps instead of sending them to GeoServer at once. The same layer is rendered
+once however many requests ask for it while it is queued.
+
+ThumbnailStore keeps them in one SQLite file, one row per layer: a few kB each, so a
+bundle per layer as in the tile cache would be mostly overhead. A row records the version
+it was rendered for, a digest of the GetMap, and is only replaced when the layer's catalog
+entry changes its bounds or the catalog sync drops it; thumbnails do not expire.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, features
+
+from tile_cache import TileEntry, content_etag, lonlat_to_mercator
+
+logger = logging.getLogger(__name__)
+
+MIN_SPAN_METRES = 1000.0  # point layers have zero-size bounds
+
+
+def thumbnail_getmap_params(layer: str, bounds: List[List[float]], size: int = 128) -> Dict[str, str]:
+    """
+    GetMap of a layer's Leaflet-style [[south, west], [north, east]] bounds in EPSG:3857,
+    at most size pixels on the longer side and keeping the extent's aspect ratio
+    """
+    (south, west), (north, east) = bounds
+    minx, miny = lonlat_to_mercator(float(west), float(south))
+    maxx, maxy = lonlat_to_mercator(float(east), float(north))
+    for low, high in ((0, 2), (1, 3)):
+        coords = [minx, miny, maxx, maxy]
+        if coords[high] - coords[low] < MIN_SPAN_METRES:
+            middle = (coords[high] + coords[low]) / 2
+            coords[low], coords[high] = middle - MIN_SPAN_METRES / 2, middle + MIN_SPAN_METRES / 2
+        minx, miny, maxx, maxy = coords
+    width_m, height_m = maxx - minx, maxy - miny
+    if width_m >= height_m:
+        width, height = size, max(1, round(size * height_m / width_m))
+    else:
+        width, height = max(1, round(size * width_m / height_m)), size
+    return {
+        'SERVICE': 'WMS',
+        'REQUEST': 'GetMap',
+        'VERSION': '1.1.1',
+        'LAYERS': layer,
+        'STYLES': '',
+        'SRS': 'EPSG:3857',
+        'BBOX': ','.join(f'{value:.2f}' for value in (minx, miny, maxx, maxy)),
+        'WIDTH': str(width),
+        'HEIGHT': str(height),
+        'FORMAT': 'image/png',
+        'TRANSPARENT': 'TRUE'
+    }
+
+
+class ThumbnailStore:
+    """Thumbnails in one SQLite file, keyed by workspace and layer, with the version each was rendered for"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS thumbnails (workspace TEXT NOT NULL, layer TEXT NOT NULL, '
+            'version TEXT NOT NULL, etag TEXT NOT NULL, modified REAL NOT NULL, data BLOB NOT NULL, '
+            'PRIMARY KEY (workspace, layer))'
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, workspace_name: str, layer_name: str, version: str, with_data: bool = True,
+            record: bool = True) -> Optional[TileEntry]:
+        """The layer's thumbnail if it was rendered for this version, else None; counted unless not record"""
+        columns = 'etag, modified, data' if with_data else 'etag, modified, NULL'
+        with self._lock:
+            row = self._connection.execute(
+                f'SELECT {columns} FROM thumbnails WHERE workspace = ? AND layer = ? AND version = ?',
+                (workspace_name, layer_name, version)
+            ).fetchone()
+            if row is None:
+                self.misses += int(record)
+                return None
+            self.hits += int(record)
+        etag, modified, data = row
+        return TileEntry(bytes(data) if data is not None else None, etag, modified)
+
+    def put(self, workspace_name: str, layer_name: str, version: str, data: bytes) -> TileEntry:
+        entry = TileEntry(data, content_etag(data), time.time())
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO thumbnails (workspace, layer, version, etag, modified, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (workspace_name, layer_name, version, entry.etag, entry.modified, sqlite3.Binary(data))
+            )
+        return entry
+
+    def invalidate(self, workspace_name: Optional[str] = None, layer_name: Optional[str] = None) -> int:
+        """Drop every thumbnail, a workspace's or one layer's; returns the number dropped"""
+        if workspace_name is None:
+            query, args = 'DELETE FROM thumbnails', ()
+        elif layer_name is None:
+            query, args = 'DELETE FROM thumbnails WHERE workspace = ?', (workspace_name,)
+        else:
+            query, args = 'DELETE FROM thumbnails WHERE workspace = ? AND layer = ?', (workspace_name, layer_name)
+        with self._lock:
+            return self._connection.execute(query, args).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._connection.execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM thumbnails').fetchone()
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'thumbnails': count,
+                'bytes': total,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None
+            }
+
+
+class ThumbnailRenderer:
+    """
+    Render thumbnails on a pool of workers with fetch_image(workspace, params) -> PNG bytes
+    and keep them in store. The exceptions of fetch_image reach the caller through the
+    returned future.
+    """
+
+    def __init__(self, fetch_image: Callable[[str, Dict[str, str]], bytes], store: ThumbnailStore,
+                 size: int = 128, workers: int = 2, webp_quality: int = 75):
+        self.fetch_image = fetch_image
+        self.store = store
+        self.size = size
+        self.workers = workers
+        self.webp_quality = webp_quality
+        self.webp = features.check('webp')
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='layer-thumbnail')
+        self._pending: Dict[Tuple[str, str, str], Future] = {}
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.failed = 0
+        self.source_bytes = 0
+        self.stored_bytes = 0
+
+    def source(self, layer: str, bounds: List[List[float]]) -> Tuple[str, Dict[str, str]]:
+        """(version, GetMap params) of a layer's thumbnail; the version changes with its bounds"""
+        params = thumbnail_getmap_params(layer, bounds, self.size)
+        encoding = f'webp/{self.webp_quality}' if self.webp else 'png8'
+        version = hashlib.sha1(json.dumps([params, encoding], sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        return version, params
+
+    def submit(self, workspace_name: str, layer_name: str, version: str, params: Dict[str, str]) -> Future:
+        """Future of the layer's TileEntry, shared with any render of the same version already queued"""
+        key = (workspace_name, layer_name, version)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self._executor.submit(self._render, key, params)
+            return future
+
+    def refresh(self, workspace_name: str, layer_name: str,
+                source: Callable[[], Optional[Tuple[str, Dict[str, str]]]]):
+        """
+        Re-render a layer's thumbnail in the background, once source() has given its new
+        version and GetMap (None when the layer has no bounds any more)
+        """
+        def run():
+            try:
+                found = source()
+                if found is None:
+                    return
+                # Rendered on this worker: waiting for another task could deadlock a one-worker pool
+                version, params = found
+                key = (workspace_name, layer_name, version)
+                with self._lock:
+                    if key in self._pending:
+                        return
+                    future = self._pending[key] = Future()
+                try:
+                    future.set_result(self._render(key, params))
+                except Exception as e:
+                    future.set_exception(e)
+                    raise
+            except Exception as e:
+                logger.warning(f'Could not refresh thumbnail of {workspace_name}:{layer_name}: {e}')
+
+        self._executor.submit(run)
+
+    def _render(self, key: Tuple[str, str, str], params: Dict[str, str]) -> TileEntry:
+        workspace_name, layer_name, version = key
+        try:
+            source = self.fetch_image(workspace_name, params)
+            data = self.encode(source)
+            entry = self.store.put(workspace_name, layer_name, version, data)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        with self._lock:
+            self.rendered += 1
+            self.source_bytes += len(source)
+            self.stored_bytes += len(data)
+        return entry
+
+    def encode(self, source: bytes) -> bytes:
+        """WebP (keeping transparency) when Pillow has it, else palette PNG; the PNG itself if neither is smaller"""
+        image = Image.open(io.BytesIO(source))
+        image.load()
+        image = image.convert('RGBA')
+        buffer = io.BytesIO()
+        if self.webp:
+            image.save(buffer, 'WEBP', quality=self.webp_quality, method=6)
+        else:
+            image.quantize(256, method=Image.Quantize.FASTOCTREE).save(buffer, 'PNG', optimize=True)
+        data = buffer.getvalue()
+        return data if len(data) < len(source) else source
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'size': self.size,
+                'workers': self.workers,
+                'encoding': 'webp' if self.webp else 'png8',
+                'pending': len(self._pending),
+                'rendered': self.rendered,
+                'failed': self.failed,
+                'source_bytes': self.source_bytes,
+                'stored_bytes': self.stored_bytes
+            }
+        return {**stats, 'store': self.store.stats()}
@@ -0,0 +1,686 @@
+"""
+WMS tile proxy support: request normalization and an on-disk tile cache.
+
+canonical_getmap_params() reduces a WMS GetMap query (as sent by Leaflet's
+L.tileLayer.wms, or built from z/x/y by tile_request_params) to the parameters that
+affect the rendered image, with consistent names, case and coordinate precision, so that
+equivalent requests from different clients share one cache entry. DiskTileCache stores
+the rendered images under a directory per layer list, which lets a layer's tiles be
+dropped when the catalog reports that it changed.
+
+TileEncoder turns the PNG tiles GeoServer renders into WebP, JPEG or PNG8 for the browsers
+that accept them, which is most of the bandwidth for orthophoto layers.
+
+MetatileRenderer answers a miss for a Web Mercator grid tile by rendering the N x N block
+of tiles around it (plus a gutter) in one GetMap and slicing it with Pillow, so GeoServer
+places labels once per block instead of clipping them at every tile edge, and the sibling
+tiles are already cached when the map asks for them.
+"""
+
+import hashlib
+import io
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+WEB_MERCATOR_EXTENT = 20037508.342789244  # half the width of the EPSG:3857 world, metres
+MAX_MERCATOR_LATITUDE = 85.0511287798  # latitude of the EPSG:3857 world's edges
+
+# GetMap parameters that change the rendered image; everything else (cache busters,
+# Leaflet's own options) is dropped from the cache key and from the upstream request
+_RENDER_PARAMS = frozenset([
+    'LAYERS', 'STYLES', 'SRS', 'CRS', 'BBOX', 'WIDTH', 'HEIGHT', 'FORMAT', 'TRANSPARENT',
+    'BGCOLOR', 'VERSION', 'TIME', 'ELEVATION', 'CQL_FILTER', 'FILTER', 'FEATUREID', 'ENV',
+    'FORMAT_OPTIONS', 'BUFFER', 'INTERPOLATIONS', 'SLD', 'SLD_BODY', 'TILED', 'TILESORIGIN',
+    'DPI', 'MAP_RESOLUTION', 'ANGLE', 'SORTBY', 'VIEWPARAMS'
+])
+
+_FORMAT_EXTENSIONS = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/gif': 'gif', 'image/webp': 'webp',
+                      'application/vnd.mapbox-vector-tile': 'pbf', 'application/geo+json': 'geojson'}
+_WEB_MERCATOR_CODES = frozenset(['EPSG:3857', 'EPSG:900913', 'EPSG:102100'])
+
+
+class TileRequestError(ValueError):
+    """The tile request is not a GetMap the proxy can serve"""
+
+
+class TileUpstreamError(Exception):
+    """GeoServer answered a GetMap with something other than an image"""
+
+
+class TileEntry(NamedTuple):
+    """A cached tile: its bytes (None when only the validators were asked for), ETag and write time"""
+    data: Optional[bytes]
+    etag: str
+    modified: float
+
+
+def content_etag(data: bytes) -> str:
+    """Strong ETag value for a response body: a hash of its bytes"""
+    return hashlib.sha1(data).hexdigest()[:20]
+
+
+def tile_bbox(z: int, x: int, y: int) -> List[float]:
+    """EPSG:3857 bounding box (minx, miny, maxx, maxy) of an XYZ tile (y counted from the top)"""
+    size = 2 * WEB_MERCATOR_EXTENT / (1 << z)
+    minx = -WEB_MERCATOR_EXTENT + x * size
+    maxy = WEB_MERCATOR_EXTENT - y * size
+    return [minx, maxy - size, minx + size, maxy]
+
+
+def lonlat_to_mercator(lon: float, lat: float) -> Tuple[float, float]:
+    """EPSG:3857 metres of a longitude and latitude, the latitude clamped to the square world"""
+    lat = max(-MAX_MERCATOR_LATITUDE, min(MAX_MERCATOR_LATITUDE, lat))
+    x = lon * WEB_MERCATOR_EXTENT / 180.0
+    y = math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) * WEB_MERCATOR_EXTENT / math.pi
+    return x, y
+
+
+def mercator_to_lonlat(x: float, y: float) -> Tuple[float, float]:
+    """Longitude and latitude of EPSG:3857 metres"""
+    lon = x * 180.0 / WEB_MERCATOR_EXTENT
+    lat = math.degrees(2 * math.atan(math.exp(y * math.pi / WEB_MERCATOR_EXTENT)) - math.pi / 2)
+    return lon, lat
+
+
+def tile_request_params(layers: str, z: int, x: int, y: int, styles: str = '', image_format: str = 'image/png',
+                        tile_size: int = 256, transparent: bool = True) -> Dict[str, str]:
+    """The GetMap query Leaflet's L.tileLayer.wms sends for an XYZ tile"""
+    if z < 0 or not (0 <= x < (1 << z)) or not (0 <= y < (1 << z)):
+        raise TileRequestError(f'Tile {z}/{x}/{y} is outside the tile grid')
+    return {
+        'SERVICE': 'WMS',
+        'REQUEST': 'GetMap',
+        'VERSION': '1.1.1',
+        'LAYERS': layers,
+        'STYLES': styles,
+        'SRS': 'EPSG:3857',
+        'BBOX': ','.join(repr(value) for value in tile_bbox(z, x, y)),
+        'WIDTH': str(tile_size),
+        'HEIGHT': str(tile_size),
+        'FORMAT': image_format,
+        'TRANSPARENT': 'TRUE' if transparent else 'FALSE'
+    }
+
+
+def _normalize_bbox(value: str) -> str:
+    try:
+        coords = [float(part) for part in value.split(',')]
+    except ValueError:
+        raise TileRequestError(f'Invalid BBOX: {value}')
+    if len(coords) != 4 or not all(math.isfinite(c) for c in coords) or coords[0] >= coords[2] or coords[1] >= coords[3]:
+        raise TileRequestError(f'Invalid BBOX: {value}')
+    # Round to a millionth of the tile size: absorbs float noise between clients that
+    # compute the same tile slightly differently without merging distinct tiles
+    span = min(coords[2] - coords[0], coords[3] - coords[1])
+    decimals = max(0, 6 - math.floor(math.log10(span)))
+    return ','.join(f'{round(c, decimals):.{decimals}f}' for c in coords)
+
+
+def _qualify_layers(layers: str, workspace_name: str) -> str:
+    qualified = []
+    for name in layers.split(','):
+        name = name.strip()
+        prefix, sep, _ = name.partition(':')
+        if not sep:
+            name = f'{workspace_name}:{name}'
+        elif prefix != workspace_name:
+            raise TileRequestError(f"Layer '{name}' is not in workspace '{workspace_name}'")
+        qualified.append(name)
+    return ','.join(qualified)
+
+
+def canonical_getmap_params(args, workspace_name: Optional[str] = None, max_size: int = 2048) -> Dict[str, str]:
+    """
+    Normalize a GetMap query (any mapping, keys in any case) to the parameters that affect
+    the rendered image: upper-case names, workspace-qualified LAYERS, the CRS / SRS name
+    that matches VERSION, lower-case FORMAT, boolean TRANSPARENT, rounded BBOX. Raises
+    TileRequestError for anything other than a sane GetMap.
+    """
+    params = {}
+    for key, value in args.items():
+        upper = key.upper()
+        if upper in ('SERVICE', 'REQUEST') or upper in _RENDER_PARAMS:
+            params[upper] = str(value).strip()
+
+    if params.get('SERVICE', 'WMS').upper() != 'WMS' or params.get('REQUEST', '').lower() != 'getmap':
+        raise TileRequestError('Only WMS GetMap requests can be proxied')
+    params['SERVICE'], params['REQUEST'] = 'WMS', 'GetMap'
+    for required in ('LAYERS', 'BBOX', 'WIDTH', 'HEIGHT'):
+        if not params.get(required):
+            raise TileRequestError(f'Missing {required} parameter')
+
+    if workspace_name is not None:
+        params['LAYERS'] = _qualify_layers(params['LAYERS'], workspace_name)
+
+    try:
+        width, height = int(params['WIDTH']), int(params['HEIGHT'])
+    except ValueError:
+        raise TileRequestError('WIDTH and HEIGHT must be integers')
+    if not (0 < width <= max_size and 0 < height <= max_size):
+        raise TileRequestError(f'WIDTH and HEIGHT must be between 1 and {max_size}')
+    params['WIDTH'], params['HEIGHT'] = str(width), str(height)
+
+    params['VERSION'] = params.get('VERSION') or '1.1.1'
+    if params['VERSION'] == '1.3.0':
+        params['CRS'] = (params.pop('CRS', None) or params.pop('SRS', None) or 'EPSG:4326').upper()
+        params.pop('SRS', None)
+    else:
+        params['SRS'] = (params.pop('SRS', None) or params.pop('CRS', None) or 'EPSG:4326').upper()
+        params.pop('CRS', None)
+
+    params['BBOX'] = _normalize_bbox(params['BBOX'])
+    params['FORMAT'] = (params.get('FORMAT') or 'image/png').lower()
+    params['TRANSPARENT'] = 'TRUE' if params.get('TRANSPARENT', 'false').lower() in ('true', '1') else 'FALSE'
+    params['STYLES'] = params.get('STYLES', '')
+    return {key: params[key] for key in sorted(params) if params[key] != '' or key == 'STYLES'}
+
+
+def tile_cache_key(workspace_name: str, params: Dict[str, str]) -> str:
+    """Cache key of a canonical GetMap query against a workspace's WMS endpoint"""
+    return hashlib.sha1(f'{workspace_name}?{urlencode(params)}'.encode('utf-8')).hexdigest()
+
+
+def format_content_type(image_format: str) -> str:
+    """'image/png; mode=8bit' -> 'image/png'"""
+    return image_format.split(';', 1)[0].strip()
+
+
+class DiskTileCache:
+    """
+    Rendered tiles on disk, one file per tile under <root>/<layer group>/<key[:2]>/<key>.<ext>.
+
+    A layer group directory holds every tile rendered from one LAYERS list; the list itself
+    is written to a 'layers' file next to the tiles so invalidate() can find the groups a
+    layer belongs to. Files are written to a temporary name and renamed into place, so a
+    reader never sees a partial tile. Tiles older than ttl seconds are treated as missing.
+    """
+
+    LAYERS_FILE = 'layers'
+
+    def __init__(self, root: str, ttl: float = 86400):
+        self.root = root
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.invalidated = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def _group_name(layers: str) -> str:
+        return hashlib.sha1(layers.encode('utf-8')).hexdigest()[:16]
+
+    def _path(self, layers: str, key: str, image_format: str) -> str:
+        extension = _FORMAT_EXTENSIONS.get(format_content_type(image_format), 'img')
+        return os.path.join(self.root, self._group_name(layers), key[:2], f'{key}.{extension}')
+
+    def get(self, layers: str, key: str, image_format: str) -> Optional[bytes]:
+        entry = self.get_entry(layers, key, image_format)
+        return entry.data if entry is not None else None
+
+    def get_entry(self, layers: str, key: str, image_format: str, with_data: bool = True,
+                  record: bool = True) -> Optional[TileEntry]:
+        """
+        The cached tile with its validators. Without with_data the bytes are still read to
+        hash them (this layout keeps no separate ETag), but not returned. Without record the
+        lookup is not counted, for a second read of a tile the request already looked up.
+        """
+        path = self._path(layers, key, image_format)
+        try:
+            modified = os.path.getmtime(path)
+            if self.ttl and time.time() - modified > self.ttl:
+                if record:
+                    with self._lock:
+                        self.expired += 1
+                        self.misses += 1
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            if record:
+                with self._lock:
+                    self.misses += 1
+            return None
+        if record:
+            with self._lock:
+                self.hits += 1
+        return TileEntry(data if with_data else None, content_etag(data), modified)
+
+    def put(self, layers: str, key: str, image_format: str, data: bytes):
+        path = self._path(layers, key, image_format)
+        directory = os.path.dirname(path)
+        group_dir = os.path.dirname(directory)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            layers_path = os.path.join(group_dir, self.LAYERS_FILE)
+            if not os.path.exists(layers_path):
+                with open(layers_path, 'w', encoding='utf-8') as f:
+                    f.write(layers)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Could not write tile {key} to the tile cache: {e}")
+            return
+        with self._lock:
+            self.writes += 1
+            self.bytes_written += len(data)
+
+    def _groups(self):
+        """(directory, [layer names]) for every layer group on disk"""
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            try:
+                with open(os.path.join(entry.path, self.LAYERS_FILE), encoding='utf-8') as f:
+                    layers = f.read()
+            except OSError:
+                layers = ''
+            yield entry.path, [name.strip() for name in layers.split(',') if name.strip()]
+
+    def invalidate(self, workspace_name: Optional[str] = None, layer_name: Optional[str] = None) -> int:
+        """
+        Drop cached tiles: every tile, those that include any layer of a workspace, or
+        those that include one layer. Returns the number of layer groups removed.
+        """
+        removed = 0
+        for path, layer_names in list(self._groups()):
+            if workspace_name is not None:
+                if layer_name is not None:
+                    wanted = f'{workspace_name}:{layer_name}'
+                    if wanted not in layer_names:
+                        continue
+                elif not any(name.startswith(f'{workspace_name}:') for name in layer_names):
+                    continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        with self._lock:
+            self.invalidated += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'files',
+                'root': self.root,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                'writes': self.writes,
+                'bytes_written': self.bytes_written,
+                'invalidated_groups': self.invalidated
+            }
+
+    def compact(self) -> Dict[str, Any]:
+        """
+        Delete tile files older than ttl and remove the layer group directories left empty, with
+        the same summary as the packed store ('bundles' are layer group directories here)
+        """
+        groups = expired = removed = 0
+        bytes_before = bytes_after = 0
+        started = time.time()
+        for group_path, _ in list(self._groups()):
+            groups += 1
+            tiles_left = 0
+            try:
+                shards = [entry.path for entry in os.scandir(group_path) if entry.is_dir()]
+            except OSError:
+                continue
+            for shard in shards:
+                try:
+                    files = list(os.scandir(shard))
+                except OSError:
+                    continue
+                for entry in files:
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    bytes_before += stat.st_size
+                    if self.ttl and started - stat.st_mtime > self.ttl:
+                        try:
+                            os.unlink(entry.path)
+                            expired += 1
+                            continue
+                        except OSError:
+                            pass
+                    bytes_after += stat.st_size
+                    tiles_left += 1
+                try:
+                    os.rmdir(shard)  # only succeeds when nothing is left in it
+                except OSError:
+                    pass
+            if not tiles_left:
+                shutil.rmtree(group_path, ignore_errors=True)
+                removed += 1
+        return {
+            'bundles': groups,
+            'bundles_removed': removed,
+            'tiles_expired': expired,
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'duration_seconds': round(time.time() - started, 3)
+        }
+
+    def usage_stats(self) -> Dict[str, Any]:
+        """stats(); tiles on disk are not counted per layer group"""
+        return self.stats()
+
+    def start_eviction(self):
+        """Files expire on read by their TTL; there are no quotas to enforce in the background"""
+
+
+def grid_tile(params: Dict[str, str], tile_size: int = 256) -> Optional[Tuple[int, int, int]]:
+    """
+    (z, x, y) when a canonical GetMap asks for exactly one tile of the Web Mercator XYZ grid
+    (as Leaflet does), None for any other extent, size or projection
+    """
+    if params.get('SRS', params.get('CRS')) not in _WEB_MERCATOR_CODES:
+        return None
+    if params['WIDTH'] != str(tile_size) or params['HEIGHT'] != str(tile_size):
+        return None
+    minx, miny, maxx, maxy = (float(c) for c in params['BBOX'].split(','))
+    span = maxx - minx
+    z = round(math.log2(2 * WEB_MERCATOR_EXTENT / span))
+    if z < 0 or z > 30:
+        return None
+    expected = 2 * WEB_MERCATOR_EXTENT / (1 << z)
+    x = (minx + WEB_MERCATOR_EXTENT) / expected
+    y = (WEB_MERCATOR_EXTENT - maxy) / expected
+    tolerance = 1e-4
+    if (abs(span - expected) > expected * tolerance or abs((maxy - miny) - expected) > expected * tolerance
+            or abs(x - round(x)) > tolerance or abs(y - round(y)) > tolerance):
+        return None
+    x, y = round(x), round(y)
+    if not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        return None
+    return z, x, y
+
+
+def _encode_tile(image, image_format: str, jpeg_quality: int) -> bytes:
+    buffer = io.BytesIO()
+    content_type = format_content_type(image_format)
+    if content_type == 'image/jpeg':
+        image.convert('RGB').save(buffer, 'JPEG', quality=jpeg_quality)
+    elif content_type == 'image/png8' or 'mode=8bit' in image_format:
+        image.convert('RGBA').quantize(256, method=Image.Quantize.FASTOCTREE).save(buffer, 'PNG')
+    else:
+        image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def sniff_image_type(data: bytes) -> Optional[str]:
+    """Content type of PNG, JPEG, WebP or GIF bytes, None for anything else"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[:4] == b'GIF8':
+        return 'image/gif'
+    return None
+
+
+class TileEncoder:
+    """
+    Re-encode 32-bit PNG tiles into a smaller variant the browser accepts.
+
+    - Raster layers (orthophotos, satellite imagery) become lossy WebP when the Accept
+      header lists image/webp. Otherwise they become JPEG, if the tile has no transparency
+      and Accept allows image/jpeg (itself, image/* or */*).
+    - Vector overlays become palette-quantized PNG8.
+    - Tiles of layers whose type is not known get WebP/JPEG when they turn out to be
+      opaque, and stay PNG otherwise.
+    - A variant that comes out no smaller than the PNG is replaced by the PNG.
+
+    variant_for() names the variant before the tile is decoded, so that the encoded tile
+    can be cached under its own key. encode() then produces it. Saved bytes are counted
+    per LAYERS list.
+    """
+
+    def __init__(self, enabled: bool = True, webp_quality: int = 80, jpeg_quality: int = 85):
+        self.enabled = enabled
+        self.webp_quality = webp_quality
+        self.jpeg_quality = jpeg_quality
+        self._layers: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def variant_for(self, params: Dict[str, str], layer_type: Optional[str], accept) -> Optional[str]:
+        """
+        'webp', 'jpeg' or 'png8' for a PNG GetMap, given the layers' type ('raster', 'vector'
+        or None) and the request's Accept header as (mimetype, quality) pairs; None when the
+        tile is served as rendered
+        """
+        if not self.enabled or params['FORMAT'] != 'image/png':
+            return None
+        if layer_type == 'vector':
+            return 'png8'
+        accepted = {mimetype for mimetype, quality in accept if quality > 0}
+        if 'image/webp' in accepted:
+            return 'webp'
+        if accepted & {'image/jpeg', 'image/*', '*/*'}:
+            return 'jpeg'
+        return None
+
+    def encode(self, layers: str, source: bytes, variant: str, layer_type: Optional[str]) -> bytes:
+        """The variant of a PNG tile, or the PNG itself when the variant does not apply or is no smaller"""
+        image = Image.open(io.BytesIO(source))
+        image.load()
+        if variant == 'png8':
+            data = _encode_tile(image, 'image/png8', self.jpeg_quality)
+        else:
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            opaque = image.mode == 'RGB' or image.getchannel('A').getextrema()[0] == 255
+            buffer = io.BytesIO()
+            if not opaque and layer_type != 'raster':
+                data = source  # probably an overlay; lossy encoding would smear lines and labels
+            elif variant == 'webp':
+                image.convert('RGB' if opaque else 'RGBA').save(buffer, 'WEBP', quality=self.webp_quality, method=4)
+                data = buffer.getvalue()
+            elif opaque:
+                image.convert('RGB').save(buffer, 'JPEG', quality=self.jpeg_quality, optimize=True)
+                data = buffer.getvalue()
+            else:
+                data = source  # JPEG has no transparency
+        if len(data) >= len(source):
+            data = source
+        with self._lock:
+            entry = self._layer_entry(layers)
+            entry['encoded'] += 1
+            entry['source_bytes'] += len(source)
+            entry['encoded_bytes'] += len(data)
+        return data
+
+    def _layer_entry(self, layers: str) -> Dict[str, int]:
+        entry = self._layers.get(layers)
+        if entry is None:
+            entry = self._layers[layers] = {'encoded': 0, 'source_bytes': 0, 'encoded_bytes': 0,
+                                            'served': 0, 'served_bytes': 0}
+        return entry
+
+    def record_served(self, layers: str, size: int):
+        with self._lock:
+            entry = self._layer_entry(layers)
+            entry['served'] += 1
+            entry['served_bytes'] += size
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Per LAYERS list, the encodings made (with the PNG and encoded sizes) and the encoded
+        responses served. saved_bytes estimates the bandwidth saved by those responses from
+        the layer's compression ratio, since a cached variant does not carry its PNG's size.
+        """
+        layers = {}
+        total_saved = 0
+        with self._lock:
+            items = [(name, dict(entry)) for name, entry in self._layers.items()]
+        for name, entry in items:
+            ratio = entry['source_bytes'] / entry['encoded_bytes'] if entry['encoded_bytes'] else 1.0
+            saved = int(entry['served_bytes'] * (ratio - 1))
+            total_saved += saved
+            layers[name] = {
+                **entry,
+                'size_ratio': round(1 / ratio, 3) if entry['encoded_bytes'] else None,
+                'saved_bytes': saved
+            }
+        return {
+            'enabled': self.enabled,
+            'webp_quality': self.webp_quality,
+            'jpeg_quality': self.jpeg_quality,
+            'saved_bytes': total_saved,
+            'layers': dict(sorted(layers.items(), key=lambda item: item[1]['saved_bytes'], reverse=True))
+        }
+
+
+class MetatileRenderer:
+    """
+    Render grid tiles in size x size blocks and slice them.
+
+    fetch(workspace_name, params) returns the image bytes of a GetMap (raising on failure).
+    The block is requested as lossless PNG with a gutter of extra pixels on every side,
+    then each tile is cropped out and encoded in the format the client asked for and
+    stored in the tile cache. Concurrent misses for tiles of the same block wait for the
+    first one's render instead of rendering the block again.
+    """
+
+    SLICEABLE_FORMATS = frozenset(['image/png', 'image/png8', 'image/jpeg'])
+
+    def __init__(self, fetch: Callable[[str, Dict[str, str]], bytes], cache: DiskTileCache,
+                 size: int = 4, gutter: int = 16, tile_size: int = 256, jpeg_quality: int = 85):
+        self.fetch = fetch
+        self.cache = cache
+        self.size = size
+        self.gutter = gutter
+        self.tile_size = tile_size
+        self.jpeg_quality = jpeg_quality
+        self.renders = 0
+        self.tiles_sliced = 0
+        self.waits = 0
+        self._locks: Dict[str, list] = {}  # metatile key -> [lock, users]
+        self._locks_guard = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def can_render(self, params: Dict[str, str]) -> bool:
+        return self.size > 1 and format_content_type(params['FORMAT']) in self.SLICEABLE_FORMATS
+
+    def block(self, z: int, x: int, y: int) -> Tuple[int, int, int, int]:
+        """
+        (origin x, origin y, columns, rows) of the block holding tile z/x/y. Blocks are aligned
+        to multiples of size, so every tile belongs to exactly one, and clipped at the grid edge.
+        """
+        tiles_per_side = 1 << z
+        origin_x, origin_y = x - x % self.size, y - y % self.size
+        return origin_x, origin_y, min(self.size, tiles_per_side - origin_x), min(self.size, tiles_per_side - origin_y)
+
+    @contextmanager
+    def _metatile_lock(self, key: str):
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            if not entry[0].acquire(blocking=False):
+                with self._stats_lock:
+                    self.waits += 1
+                entry[0].acquire()
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    def render(self, workspace_name: str, params: Dict[str, str], key: str, tile: Tuple[int, int, int],
+               refresh: bool = False) -> bytes:
+        """
+        Image bytes of the grid tile (z, x, y) described by the canonical params / cache key,
+        rendering and caching its whole block if another request has not just done so
+        (or always, with refresh)
+        """
+        z, x, y = tile
+        tiles_per_side = 1 << z
+        origin_x, origin_y, columns, rows = self.block(z, x, y)
+        metatile_key = tile_cache_key(workspace_name, {**params, 'BBOX': f'{z}/{origin_x}/{origin_y}'})
+
+        with self._metatile_lock(metatile_key):
+            data = None if refresh else self.cache.get(params['LAYERS'], key, params['FORMAT'])
+            if data is not None:
+                return data  # rendered by the request we waited for
+
+            tile_span = 2 * WEB_MERCATOR_EXTENT / tiles_per_side
+            gutter_span = self.gutter * tile_span / self.tile_size
+            minx = -WEB_MERCATOR_EXTENT + origin_x * tile_span
+            maxy = WEB_MERCATOR_EXTENT - origin_y * tile_span
+            metatile_params = {
+                **params,
+                'FORMAT': 'image/png',
+                'WIDTH': str(columns * self.tile_size + 2 * self.gutter),
+                'HEIGHT': str(rows * self.tile_size + 2 * self.gutter),
+                'BBOX': ','.join(repr(c) for c in (
+                    minx - gutter_span, maxy - rows * tile_span - gutter_span,
+                    minx + columns * tile_span + gutter_span, maxy + gutter_span
+                ))
+            }
+            image = Image.open(io.BytesIO(self.fetch(workspace_name, metatile_params)))
+            image.load()
+
+            requested = None
+            for row in range(rows):
+                for column in range(columns):
+                    left = self.gutter + column * self.tile_size
+                    top = self.gutter + row * self.tile_size
+                    tile_image = image.crop((left, top, left + self.tile_size, top + self.tile_size))
+                    data = _encode_tile(tile_image, params['FORMAT'], self.jpeg_quality)
+                    if (origin_x + column, origin_y + row) == (x, y):
+                        requested = data
+                        self.cache.put(params['LAYERS'], key, params['FORMAT'], data)
+                        continue
+                    sibling = {**params, 'BBOX': _normalize_bbox(','.join(
+                        repr(c) for c in tile_bbox(z, origin_x + column, origin_y + row)))}
+                    self.cache.put(params['LAYERS'], tile_cache_key(workspace_name, sibling), params['FORMAT'], data)
+
+        with self._stats_lock:
+            self.renders += 1
+            self.tiles_sliced += rows * columns
+        return requested
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                'size': self.size,
+                'gutter_pixels': self.gutter,
+                'renders': self.renders,
+                'tiles_sliced': self.tiles_sliced,
+                'waited_for_render': self.waits
+            }
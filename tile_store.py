@@ -0,0 +1,691 @@
+"""
+Packed tile storage: rendered tiles kept in one SQLite file per layer group instead of one
+file per tile.
+
+A plain directory layout costs an inode and a filesystem block per tile, so a few hundred
+layers at high zoom run into tens of millions of small files and dropping a layer means
+unlinking every one of them. PackedTileCache stores a layer group's tiles as rows of an
+MBTiles-style SQLite database (a metadata table plus a tiles table). The tiles are keyed
+by the canonical request hash rather than zoom/column/row, because the proxy also caches
+non-grid GetMaps:
+
+    <root>/<layer group>.mbtiles
+
+- A lookup is one search of the rowid B-tree.
+- Reads use SQLite's memory-mapped I/O.
+- Each write is its own transaction.
+- WAL journaling lets readers run while another thread or process (the seeder) writes.
+- Dropping a layer group unlinks one file.
+- compact() removes expired tiles and reclaims their space.
+- The store can be held to a byte budget, and individual layers to quotas. A background
+  thread evicts the least recently or least frequently used tiles (see evict()).
+
+PackedTileCache has the same interface as tile_cache.DiskTileCache; make_tile_cache()
+builds the one selected by configuration.
+"""
+
+import hashlib
+import heapq
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from tile_cache import DiskTileCache, TileEntry, content_etag
+
+logger = logging.getLogger(__name__)
+
+TILE_CACHE_BACKENDS = ('packed', 'files')
+
+# A bundle's write-ahead log is checkpointed every WAL_CHECKPOINT_PAGES pages and truncated
+# back to WAL_SIZE_LIMIT bytes, so hundreds of bundles do not each keep a few MB of log
+WAL_CHECKPOINT_PAGES = 256
+WAL_SIZE_LIMIT = 1024 * 1024
+
+EVICTION_POLICIES = ('lru', 'lfu')
+# An eviction pass frees space down to this fraction of the budget or quota that was exceeded,
+# so that it does not have to run again after the next few writes
+EVICTION_LOW_WATER = 0.9
+_EVICTION_BATCH = 500
+# Tile accesses buffered in memory before the eviction thread is woken to write them out
+_MAX_PENDING_ACCESSES = 50000
+
+# Bundles with another user_version were written by an older layout and are dropped
+SCHEMA_VERSION = 3
+# The usage row is kept up to date by triggers, so byte counts stay exact whichever
+# process writes and cost one row read per bundle
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (
+    id INTEGER PRIMARY KEY, key TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0, size INTEGER NOT NULL, etag TEXT NOT NULL, data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tiles_created ON tiles (created);
+CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed);
+CREATE INDEX IF NOT EXISTS tiles_hits ON tiles (hits, accessed);
+CREATE TABLE IF NOT EXISTS usage (bytes INTEGER NOT NULL, tiles INTEGER NOT NULL);
+INSERT INTO usage (bytes, tiles) SELECT 0, 0 WHERE NOT EXISTS (SELECT 1 FROM usage);
+CREATE TRIGGER IF NOT EXISTS tiles_insert AFTER INSERT ON tiles
+    BEGIN UPDATE usage SET bytes = bytes + new.size, tiles = tiles + 1; END;
+CREATE TRIGGER IF NOT EXISTS tiles_delete AFTER DELETE ON tiles
+    BEGIN UPDATE usage SET bytes = bytes - old.size, tiles = tiles - 1; END;
+CREATE TRIGGER IF NOT EXISTS tiles_resize AFTER UPDATE OF size ON tiles
+    BEGIN UPDATE usage SET bytes = bytes + new.size - old.size; END;
+"""
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(value) -> int:
+    """'50G', '512 MB', '1.5T' or a plain byte count -> bytes"""
+    text = str(value).strip().upper().replace(' ', '')
+    if text.endswith('IB'):
+        text = text[:-2]
+    elif text.endswith('B') and len(text) > 1 and text[-2] in _SIZE_UNITS:
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in _SIZE_UNITS and not text[-1:].isdigit() else ''
+    try:
+        number = float(text[:len(text) - len(unit)])
+    except ValueError:
+        raise ValueError(f'Invalid size {value!r}, expected bytes or a number with K, M, G or T') from None
+    if number < 0:
+        raise ValueError(f'Invalid size {value!r}, must not be negative')
+    return int(number * _SIZE_UNITS[unit])
+
+
+def parse_layer_quotas(value: str) -> Dict[str, int]:
+    """'Badrinath_2022:orthomosaic=20G, Kedarnath:dem=5G' -> {layer: bytes}"""
+    quotas = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        layer_name, separator, size = item.rpartition('=')
+        if not separator or ':' not in layer_name:
+            raise ValueError(f'Invalid layer quota {item.strip()!r}, expected workspace:layer=size')
+        quotas[layer_name.strip()] = parse_size(size)
+    return quotas
+
+
+class PackedTileCache:
+    """
+    Rendered tiles in one SQLite database per LAYERS list under <root>/<group>.mbtiles.
+
+    The layer list is stored in the database's metadata table, so invalidate() can find
+    the groups a layer belongs to. Tiles are rows keyed by the first 64 bits of their cache
+    key, which SQLite uses as the rowid, so a lookup is a single B-tree search; the full key
+    is stored too and checked on read. The hash of each tile's bytes is stored next to them,
+    so a conditional request is answered from get_entry(with_data=False) without reading the
+    tile. Tiles older than ttl seconds are treated as missing until compact() removes them.
+
+    With max_bytes and/or layer_quotas ({'workspace:layer': bytes}), the tiles' bytes are
+    held to that budget, and the tiles of groups that include a layer to its quota (see evict()).
+    Hits are counted in memory and written to the bundles in batches by the eviction thread,
+    so a read never waits for a write.
+
+    Connections are shared between request threads through a pool of at most
+    max_connections idle connections, least recently used bundles closed first. A bundle
+    deleted by invalidate() or compact() is never used through a connection opened before
+    the deletion. Another process (the seeder) only notices once it next opens the bundle.
+    """
+
+    EXTENSION = '.mbtiles'
+
+    def __init__(self, root: str, ttl: float = 86400, mmap_size: int = 256 * 1024 * 1024,
+                 max_connections: int = 64, max_bytes: int = 0, layer_quotas: Optional[Dict[str, int]] = None,
+                 eviction_policy: str = 'lru', eviction_interval: float = 30):
+        if eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy {eviction_policy!r}, expected one of {', '.join(EVICTION_POLICIES)}")
+        self.root = root
+        self.ttl = ttl
+        self.mmap_size = mmap_size
+        self.max_connections = max_connections
+        self.max_bytes = max_bytes
+        self.layer_quotas = dict(layer_quotas or {})
+        self.eviction_policy = eviction_policy
+        self.eviction_interval = eviction_interval
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.invalidated = 0
+        self.write_errors = 0
+        self._lock = threading.Lock()
+        self._idle: 'OrderedDict[str, List[sqlite3.Connection]]' = OrderedDict()  # group -> idle connections
+        self._idle_count = 0
+        self._generations: Dict[str, int] = {}  # group -> bumped whenever its bundle is deleted
+        self._group_layers: Dict[str, str] = {}  # group -> LAYERS list
+        self._lookups: Dict[str, List[int]] = {}  # group -> [hits, misses]
+        self._accesses: Dict[str, Dict[int, List[float]]] = {}  # group -> tile id -> [hits, last hit], not yet written
+        self._pending_accesses = 0
+        self._written_since_eviction = 0
+        self.evicted = {'budget': [0, 0], 'quota': [0, 0]}  # reason -> [tiles, bytes]
+        self.eviction_passes = 0
+        self.last_eviction: Optional[Dict[str, Any]] = None
+        self._wake = threading.Event()
+        self._thread = None
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def evicting(self) -> bool:
+        return bool(self.max_bytes or self.layer_quotas)
+
+    @staticmethod
+    def _group_name(layers: str) -> str:
+        return hashlib.sha1(layers.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _tile_id(key: str) -> int:
+        """Signed 64-bit rowid from the leading hex digits of a cache key"""
+        value = int(key[:16], 16)
+        return value - (1 << 64) if value >= 1 << 63 else value
+
+    def _bundle_path(self, group: str) -> str:
+        return os.path.join(self.root, group + self.EXTENSION)
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        # isolation_level=None: every statement commits on its own, so a put is atomic
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(f'PRAGMA wal_autocheckpoint={WAL_CHECKPOINT_PAGES}')
+        connection.execute(f'PRAGMA journal_size_limit={WAL_SIZE_LIMIT}')
+        connection.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        return connection
+
+    @contextmanager
+    def _connection(self, group: str, layers: Optional[str] = None, create: bool = False):
+        """
+        A pooled connection to the layer group's bundle for the duration of the block,
+        None if the bundle does not exist and not create (which needs its layers)
+        """
+        with self._lock:
+            # Opened under the lock so a bundle cannot be deleted between the generation read and the open
+            generation = self._generations.get(group, 0)
+            idle = self._idle.get(group)
+            if idle:
+                connection = idle.pop()
+                self._idle_count -= 1
+            else:
+                path = self._bundle_path(group)
+                connection = self._open(path) if os.path.exists(path) else None
+                if connection is not None and connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                    logger.info(f"Dropping tile bundle {path} written by an older tile cache layout")
+                    connection.close()
+                    connection = None
+                    self._discard_bundle(group, path)
+                    generation = self._generations[group]
+                if connection is None and create:
+                    self._create_bundle(path, layers)
+                    connection = self._open(path)
+        if connection is None:
+            yield None
+            return
+        try:
+            yield connection
+        finally:
+            self._release(group, generation, connection)
+
+    def _release(self, group: str, generation: int, connection: sqlite3.Connection):
+        evicted = []
+        with self._lock:
+            if self._generations.get(group, 0) == generation:
+                self._idle.setdefault(group, []).append(connection)
+                self._idle.move_to_end(group)
+                self._idle_count += 1
+                connection = None
+                while self._idle_count > self.max_connections:
+                    oldest_group, oldest = next(iter(self._idle.items()))
+                    evicted.append(oldest.pop(0))
+                    self._idle_count -= 1
+                    if not oldest:
+                        del self._idle[oldest_group]
+        for stale in evicted + ([connection] if connection is not None else []):
+            stale.close()
+
+    def _create_bundle(self, path: str, layers: str):
+        """
+        Build an empty bundle under a temporary name and link it into place, so other
+        threads and processes never open a bundle without its tables; if another one
+        created it first, theirs is kept
+        """
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        connection = sqlite3.connect(temp_path, isolation_level=None)
+        try:
+            # Set before any table exists; lets evict() hand freed pages back with incremental_vacuum
+            connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+            connection.executescript(_SCHEMA)
+            connection.executemany('INSERT INTO metadata (name, value) VALUES (?, ?)',
+                                   [('layers', layers), ('created', str(time.time()))])
+        finally:
+            connection.close()
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(temp_path)
+
+    def get(self, layers: str, key: str, image_format: str) -> Optional[bytes]:
+        entry = self.get_entry(layers, key, image_format)
+        return entry.data if entry is not None else None
+
+    def get_entry(self, layers: str, key: str, image_format: str, with_data: bool = True,
+                  record: bool = True) -> Optional[TileEntry]:
+        """
+        The cached tile with its validators; without with_data the tile's bytes are not read.
+        Without record the lookup counts neither as a hit or miss nor as an access, for a
+        second read of a tile the request already looked up.
+        """
+        group = self._group_name(layers)
+        tile_id = self._tile_id(key)
+        row = None
+        try:
+            with self._connection(group) as connection:
+                if connection is not None:
+                    row = connection.execute(
+                        f'SELECT key, created, etag{", data" if with_data else ""} FROM tiles WHERE id = ?', (tile_id,)
+                    ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not read tile {key} from the tile cache: {e}")
+        now = time.time()
+        expired = row is not None and row[0] == key and bool(self.ttl) and now - row[1] > self.ttl
+        hit = row is not None and row[0] == key and not expired
+        if not record:
+            return TileEntry(row[3] if with_data else None, row[2], row[1]) if hit else None
+        with self._lock:
+            self._group_layers.setdefault(group, layers)
+            lookups = self._lookups.setdefault(group, [0, 0])
+            if not hit:
+                self.misses += 1
+                self.expired += int(expired)
+                lookups[1] += 1
+                return None
+            self.hits += 1
+            lookups[0] += 1
+            if self.evicting:
+                access = self._accesses.setdefault(group, {}).setdefault(tile_id, [0, 0.0])
+                access[0] += 1
+                access[1] = now
+                self._pending_accesses += 1
+                if self._pending_accesses >= _MAX_PENDING_ACCESSES:
+                    self._wake.set()
+        return TileEntry(row[3] if with_data else None, row[2], row[1])
+
+    def put(self, layers: str, key: str, image_format: str, data: bytes):
+        group = self._group_name(layers)
+        now = time.time()
+        try:
+            with self._connection(group, layers, create=True) as connection:
+                # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire tiles_delete
+                connection.execute(
+                    'INSERT INTO tiles (id, key, created, accessed, hits, size, etag, data) VALUES (?, ?, ?, ?, 0, ?, ?, ?) '
+                    'ON CONFLICT (id) DO UPDATE SET key = excluded.key, created = excluded.created, '
+                    'accessed = excluded.accessed, hits = 0, size = excluded.size, etag = excluded.etag, '
+                    'data = excluded.data',
+                    (self._tile_id(key), key, now, now, len(data), content_etag(data), sqlite3.Binary(data))
+                )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not write tile {key} to the tile cache: {e}")
+            with self._lock:
+                self.write_errors += 1
+            return
+        with self._lock:
+            self._group_layers.setdefault(group, layers)
+            self.writes += 1
+            self.bytes_written += len(data)
+            self._written_since_eviction += len(data)
+            if self.max_bytes and self._written_since_eviction >= self.max_bytes * (1 - EVICTION_LOW_WATER):
+                self._wake.set()
+
+    def _bundles(self):
+        """(group, path) of every bundle on disk"""
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(self.EXTENSION):
+                yield entry.name[:-len(self.EXTENSION)], entry.path
+
+    def _bundle_layers(self, path: str) -> List[str]:
+        try:
+            connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=30)
+            try:
+                row = connection.execute("SELECT value FROM metadata WHERE name = 'layers'").fetchone()
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            return []
+        return [name.strip() for name in (row[0] if row else '').split(',') if name.strip()]
+
+    def _delete_bundle(self, group: str, path: str):
+        with self._lock:
+            self._discard_bundle(group, path)
+
+    def _discard_bundle(self, group: str, path: str):
+        """Delete a bundle and retire its pooled connections; the caller holds _lock"""
+        self._generations[group] = self._generations.get(group, 0) + 1
+        idle = self._idle.pop(group, [])
+        self._idle_count -= len(idle)
+        for connection in idle:
+            connection.close()
+        self._lookups.pop(group, None)
+        self._accesses.pop(group, None)
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.unlink(path + suffix)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not delete tile bundle {path}{suffix}: {e}")
+
+    def invalidate(self, workspace_name: Optional[str] = None, layer_name: Optional[str] = None) -> int:
+        """
+        Drop cached tiles: every tile, those that include any layer of a workspace, or
+        those that include one layer. Returns the number of layer groups removed.
+        """
+        removed = 0
+        for group, path in list(self._bundles()):
+            if workspace_name is not None:
+                layer_names = self._bundle_layers(path)
+                if layer_name is not None:
+                    if f'{workspace_name}:{layer_name}' not in layer_names:
+                        continue
+                elif not any(name.startswith(f'{workspace_name}:') for name in layer_names):
+                    continue
+            self._delete_bundle(group, path)
+            removed += 1
+        with self._lock:
+            self.invalidated += removed
+        return removed
+
+    def compact(self) -> Dict[str, Any]:
+        """
+        Delete expired tiles, remove bundles left empty and VACUUM the rest so the freed pages
+        go back to the filesystem. Blocks writers to one bundle at a time while it runs.
+        """
+        bundles = expired = removed = 0
+        bytes_before = self._disk_bytes()
+        started = time.time()
+        for group, path in list(self._bundles()):
+            bundles += 1
+            try:
+                connection = self._open(path)
+                try:
+                    if self.ttl:
+                        expired += connection.execute('DELETE FROM tiles WHERE created < ?',
+                                                      (time.time() - self.ttl,)).rowcount
+                    empty = connection.execute('SELECT 1 FROM tiles LIMIT 1').fetchone() is None
+                    if not empty:
+                        connection.execute('VACUUM')
+                        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                finally:
+                    connection.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not compact tile bundle {path}: {e}")
+                continue
+            if empty:
+                self._delete_bundle(group, path)
+                removed += 1
+        bytes_after = self._disk_bytes()
+        return {
+            'bundles': bundles,
+            'bundles_removed': removed,
+            'tiles_expired': expired,
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'duration_seconds': round(time.time() - started, 3)
+        }
+
+    def _layers_of(self, group: str, path: str) -> str:
+        with self._lock:
+            layers = self._group_layers.get(group)
+        if layers is None:
+            layers = ','.join(self._bundle_layers(path))
+            with self._lock:
+                self._group_layers[group] = layers
+        return layers
+
+    def _usage(self) -> Dict[str, Dict[str, Any]]:
+        """group -> {'layers', 'bytes', 'tiles'} of every bundle"""
+        usage = {}
+        for group, path in list(self._bundles()):
+            try:
+                with self._connection(group) as connection:
+                    if connection is None:
+                        continue  # written by an older layout and dropped
+                    row = connection.execute('SELECT bytes, tiles FROM usage').fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read the usage of tile bundle {path}: {e}")
+                continue
+            usage[group] = {'layers': self._layers_of(group, path), 'bytes': row[0], 'tiles': row[1]}
+        return usage
+
+    def _flush_accesses(self):
+        """Write the hits counted since the last flush to the bundles, one transaction per bundle"""
+        with self._lock:
+            accesses, self._accesses = self._accesses, {}
+            self._pending_accesses = 0
+        for group, tiles in accesses.items():
+            try:
+                with self._connection(group) as connection:
+                    if connection is None:
+                        continue
+                    with connection:
+                        connection.execute('BEGIN')
+                        connection.executemany(
+                            'UPDATE tiles SET hits = hits + ?, accessed = max(accessed, ?) WHERE id = ?',
+                            [(hits, accessed, tile_id) for tile_id, (hits, accessed) in tiles.items()]
+                        )
+            except sqlite3.Error as e:
+                logger.warning(f"Could not record tile accesses for layer group {group}: {e}")
+
+    def _candidates(self, connection: sqlite3.Connection, group: str):
+        """The group's tiles in eviction order as (score..., id, size, group)"""
+        order = 'accessed' if self.eviction_policy == 'lru' else 'hits, accessed'
+        cursor = connection.execute(f'SELECT {order}, id, size FROM tiles ORDER BY {order}')
+        try:
+            for row in cursor:
+                yield row + (group,)
+        finally:
+            cursor.close()
+
+    def _evict(self, groups: List[str], target_bytes: int) -> Tuple[int, int]:
+        """
+        Delete the lowest scoring tiles across the groups until target_bytes are freed.
+        Returns (tiles, bytes) evicted.
+        """
+        selected: Dict[str, List[int]] = {}
+        freed = 0
+        with ExitStack() as stack:
+            iterators = []
+            for group in groups:
+                connection = stack.enter_context(self._connection(group))
+                if connection is not None:
+                    iterators.append(self._candidates(connection, group))
+            try:
+                # Each bundle is already sorted by its index, so merging them orders all tiles
+                for row in heapq.merge(*iterators):
+                    selected.setdefault(row[-1], []).append(row[-3])
+                    freed += row[-2]
+                    if freed >= target_bytes:
+                        break
+            finally:
+                for iterator in iterators:
+                    iterator.close()
+
+        evicted = 0
+        for group, tile_ids in selected.items():
+            try:
+                with self._connection(group) as connection:
+                    if connection is None:
+                        continue
+                    for start in range(0, len(tile_ids), _EVICTION_BATCH):
+                        batch = tile_ids[start:start + _EVICTION_BATCH]
+                        evicted += connection.execute(
+                            f'DELETE FROM tiles WHERE id IN ({",".join("?" * len(batch))})', batch).rowcount
+                    connection.execute('PRAGMA incremental_vacuum')
+            except sqlite3.Error as e:
+                logger.warning(f"Could not evict tiles from layer group {group}: {e}")
+        return evicted, freed
+
+    def evict(self) -> Dict[str, Any]:
+        """
+        One eviction pass. The hits counted since the last pass are written to the bundles first.
+
+        - Any layer over its quota has the groups that include it trimmed to
+          EVICTION_LOW_WATER of the quota.
+        - If all tiles together are over max_bytes, every group is trimmed to
+          EVICTION_LOW_WATER of the budget.
+
+        The policy decides which tiles go first: 'lru' the least recently read, 'lfu' the least
+        often read (then the least recently). Readers are not blocked; each batch of deletes
+        briefly holds its bundle's write lock, and the freed pages are returned to the filesystem.
+        """
+        started = time.time()
+        self._flush_accesses()
+        usage = self._usage()
+        result = {'budget': [0, 0], 'quota': [0, 0]}
+
+        for layer_name, quota in self.layer_quotas.items():
+            groups = [group for group, entry in usage.items() if layer_name in entry['layers'].split(',')]
+            used = sum(usage[group]['bytes'] for group in groups)
+            if used > quota:
+                tiles, freed = self._evict(groups, used - int(quota * EVICTION_LOW_WATER))
+                result['quota'][0] += tiles
+                result['quota'][1] += freed
+        if result['quota'][0]:
+            usage = self._usage()
+
+        total = sum(entry['bytes'] for entry in usage.values())
+        if self.max_bytes and total > self.max_bytes:
+            tiles, freed = self._evict(list(usage), total - int(self.max_bytes * EVICTION_LOW_WATER))
+            result['budget'] = [tiles, freed]
+            total -= freed
+
+        summary = {
+            'at': started,
+            'duration_seconds': round(time.time() - started, 3),
+            'bytes_after': total,
+            'evicted_tiles': result['budget'][0] + result['quota'][0],
+            'evicted_bytes': result['budget'][1] + result['quota'][1]
+        }
+        with self._lock:
+            self.eviction_passes += 1
+            self._written_since_eviction = 0
+            for reason, (tiles, freed) in result.items():
+                self.evicted[reason][0] += tiles
+                self.evicted[reason][1] += freed
+            self.last_eviction = summary
+        if summary['evicted_tiles']:
+            logger.info(f"Tile cache eviction freed {summary['evicted_bytes']} bytes "
+                        f"({summary['evicted_tiles']} tiles) in {summary['duration_seconds']}s")
+        return summary
+
+    def start_eviction(self):
+        """Run evict() every eviction_interval seconds, or sooner when writes call for it, on a daemon thread"""
+        if self._thread is not None or not self.evicting or self.eviction_interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run_eviction, name='tile-cache-eviction', daemon=True)
+        self._thread.start()
+
+    def _run_eviction(self):
+        while True:
+            self._wake.wait(self.eviction_interval)
+            self._wake.clear()
+            try:
+                self.evict()
+            except Exception as e:
+                logger.warning(f"Tile cache eviction failed: {e}")
+
+    def usage_stats(self) -> Dict[str, Any]:
+        """stats() plus bytes, tiles and hit ratio per layer group and usage against each quota"""
+        usage = self._usage()
+        with self._lock:
+            lookups = {group: list(counts) for group, counts in self._lookups.items()}
+        layer_groups = []
+        for group, entry in usage.items():
+            hits, misses = lookups.get(group, (0, 0))
+            layer_groups.append({
+                'layers': entry['layers'],
+                'bytes': entry['bytes'],
+                'tiles': entry['tiles'],
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None
+            })
+        layer_groups.sort(key=lambda entry: entry['bytes'], reverse=True)
+        quotas = {
+            layer_name: {
+                'quota_bytes': quota,
+                'bytes': sum(entry['bytes'] for entry in usage.values() if layer_name in entry['layers'].split(','))
+            }
+            for layer_name, quota in self.layer_quotas.items()
+        }
+        return {
+            **self.stats(),
+            'bytes': sum(entry['bytes'] for entry in usage.values()),
+            'tiles': sum(entry['tiles'] for entry in usage.values()),
+            'layers': layer_groups,
+            'quotas': quotas
+        }
+
+    def _disk_bytes(self) -> int:
+        total = 0
+        for group, path in self._bundles():
+            for suffix in ('', '-wal'):
+                try:
+                    total += os.path.getsize(path + suffix)
+                except OSError:
+                    pass
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        bundles = sum(1 for _ in self._bundles())
+        disk_bytes = self._disk_bytes()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'packed',
+                'root': self.root,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                'writes': self.writes,
+                'write_errors': self.write_errors,
+                'bytes_written': self.bytes_written,
+                'invalidated_groups': self.invalidated,
+                'bundles': bundles,
+                'disk_bytes': disk_bytes,
+                'max_bytes': self.max_bytes,
+                'eviction': {
+                    'policy': self.eviction_policy,
+                    'passes': self.eviction_passes,
+                    'evicted_tiles': self.evicted['budget'][0] + self.evicted['quota'][0],
+                    'evicted_bytes': self.evicted['budget'][1] + self.evicted['quota'][1],
+                    'by_reason': {reason: {'tiles': tiles, 'bytes': freed}
+                                  for reason, (tiles, freed) in self.evicted.items()},
+                    'last_pass': self.last_eviction
+                }
+            }
+
+
+def make_tile_cache(backend: str, root: str, ttl: float = 86400, **options):
+    """The tile cache for a TILE_CACHE_BACKEND setting: 'packed' (SQLite bundles) or 'files'"""
+    backend = (backend or 'packed').strip().lower()
+    if backend == 'packed':
+        return PackedTileCache(root, ttl=ttl, **options)
+    if backend == 'files':
+        if options.get('max_bytes') or options.get('layer_quotas'):
+            logger.warning("The files tile cache backend does not enforce a byte budget or layer quotas")
+        return DiskTileCache(root, ttl=ttl)
+    raise ValueError(f"Unknown tile cache backend {backend!r}, expected one of {', '.join(TILE_CACHE_BACKENDS)}")
@@ -0,0 +1,328 @@
+"""
+Mapbox Vector Tile (MVT 2.1) encoding of GeoJSON features.
+
+encode_vector_tile() turns the features of one or more layers, as GeoServer's WFS returns
+them in EPSG:3857 (outputFormat=application/json, srsName=EPSG:3857), into the protobuf
+bytes of one XYZ tile:
+
+- coordinates are scaled to the tile's integer grid (extent 4096 by default, y down);
+- geometries are clipped to the tile plus a buffer, so lines and polygon edges that cross
+  tile borders join up when the client draws neighbouring tiles;
+- consecutive points that quantize to the same grid cell are dropped, and so are lines
+  and rings that collapse;
+- polygon rings are wound as the spec requires (exterior rings with positive area in tile
+  coordinates, holes negative).
+
+The protobuf wire format is written directly (varints, zigzag deltas, packed fields), so
+no generated protobuf classes or geometry library is needed.
+"""
+
+import json
+import math
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+MVT_CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+DEFAULT_EXTENT = 4096
+DEFAULT_BUFFER = 64  # in tile units
+
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+GEOM_POLYGON = 3
+
+_CMD_MOVE_TO = 1
+_CMD_LINE_TO = 2
+_CMD_CLOSE_PATH = 7
+
+Point = Tuple[float, float]
+
+
+# --- protobuf wire format ---
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    value &= 0xFFFFFFFFFFFFFFFF
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _length_delimited(number: int, payload: bytes) -> bytes:
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(number: int, values: Iterable[int]) -> bytes:
+    return _length_delimited(number, b''.join(_varint(value) for value in values))
+
+
+def _encode_value(value) -> bytes:
+    """A Tile.Value message; property values MVT cannot hold are written as JSON strings"""
+    if isinstance(value, bool):
+        return _field(7, 0) + _varint(int(value))
+    if isinstance(value, int) and -(1 << 63) <= value < (1 << 64):
+        if value < 0:
+            return _field(6, 0) + _varint(_zigzag(value))
+        return _field(5, 0) + _varint(value)
+    if isinstance(value, float):
+        return _field(3, 1) + struct.pack('<d', value)
+    if not isinstance(value, str):
+        value = json.dumps(value, separators=(',', ':'), default=str)
+    return _length_delimited(1, value.encode('utf-8'))
+
+
+# --- clipping ---
+
+def _clip_polyline(points: Sequence[Point], low: float, high: float) -> List[List[Point]]:
+    """Parts of a line inside the square [low, high]^2 (Liang-Barsky per segment)"""
+    parts: List[List[Point]] = []
+    current: List[Point] = []
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        dx, dy = x1 - x0, y1 - y0
+        t0, t1 = 0.0, 1.0
+        visible = True
+        for p, q in ((-dx, x0 - low), (dx, high - x0), (-dy, y0 - low), (dy, high - y0)):
+            if p == 0:
+                if q < 0:
+                    visible = False
+                    break
+                continue
+            t = q / p
+            if p < 0:
+                if t > t1:
+                    visible = False
+                    break
+                t0 = max(t0, t)
+            else:
+                if t < t0:
+                    visible = False
+                    break
+                t1 = min(t1, t)
+        if not visible:
+            if current:
+                parts.append(current)
+                current = []
+            continue
+        start = (x0 + t0 * dx, y0 + t0 * dy)
+        end = (x0 + t1 * dx, y0 + t1 * dy)
+        if not current:
+            current = [start]
+        current.append(end)
+        if t1 < 1.0:  # leaves the square before the segment ends
+            parts.append(current)
+            current = []
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _clip_ring(ring: Sequence[Point], low: float, high: float) -> List[Point]:
+    """A polygon ring clipped to the square [low, high]^2 (Sutherland-Hodgman), unclosed"""
+    edges = (
+        (lambda p: p[0] >= low, lambda a, b: (low, a[1] + (b[1] - a[1]) * (low - a[0]) / (b[0] - a[0]))),
+        (lambda p: p[0] <= high, lambda a, b: (high, a[1] + (b[1] - a[1]) * (high - a[0]) / (b[0] - a[0]))),
+        (lambda p: p[1] >= low, lambda a, b: (a[0] + (b[0] - a[0]) * (low - a[1]) / (b[1] - a[1]), low)),
+        (lambda p: p[1] <= high, lambda a, b: (a[0] + (b[0] - a[0]) * (high - a[1]) / (b[1] - a[1]), high)),
+    )
+    points = list(ring)
+    for inside, intersect in edges:
+        if not points:
+            break
+        clipped = []
+        previous = points[-1]
+        for point in points:
+            if inside(point):
+                if not inside(previous):
+                    clipped.append(intersect(previous, point))
+                clipped.append(point)
+            elif inside(previous):
+                clipped.append(intersect(previous, point))
+            previous = point
+        points = clipped
+    return points
+
+
+# --- geometry encoding ---
+
+class _TileTransform:
+    """EPSG:3857 coordinates -> tile grid coordinates (origin top left, y down)"""
+
+    def __init__(self, bounds: Sequence[float], extent: int):
+        self.minx, self.miny, self.maxx, self.maxy = bounds
+        self.scale_x = extent / (self.maxx - self.minx)
+        self.scale_y = extent / (self.maxy - self.miny)
+
+    def __call__(self, coords: Sequence[Sequence[float]]) -> List[Point]:
+        return [((c[0] - self.minx) * self.scale_x, (self.maxy - c[1]) * self.scale_y) for c in coords]
+
+
+def _quantize(points: Iterable[Point]) -> List[Tuple[int, int]]:
+    """Round to the integer grid, dropping points that land on the previous one"""
+    out: List[Tuple[int, int]] = []
+    for x, y in points:
+        point = (int(round(x)), int(round(y)))
+        if not out or out[-1] != point:
+            out.append(point)
+    return out
+
+
+def _ring_area(ring: Sequence[Tuple[int, int]]) -> float:
+    """Shoelace area in tile coordinates; positive for the spec's exterior winding"""
+    area = 0
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+        area += x0 * y1 - x1 * y0
+    return area / 2
+
+
+class _GeometryWriter:
+    """Command integers of one feature's geometry, with the cursor carried across parts"""
+
+    def __init__(self):
+        self.commands: List[int] = []
+        self.cursor = (0, 0)
+
+    def _moves(self, points: Sequence[Tuple[int, int]]):
+        for x, y in points:
+            self.commands.append(_zigzag(x - self.cursor[0]))
+            self.commands.append(_zigzag(y - self.cursor[1]))
+            self.cursor = (x, y)
+
+    def points(self, points: Sequence[Tuple[int, int]]):
+        self.commands.append(_CMD_MOVE_TO | (len(points) << 3))
+        self._moves(points)
+
+    def line(self, points: Sequence[Tuple[int, int]]):
+        self.commands.append(_CMD_MOVE_TO | (1 << 3))
+        self._moves(points[:1])
+        self.commands.append(_CMD_LINE_TO | ((len(points) - 1) << 3))
+        self._moves(points[1:])
+
+    def ring(self, points: Sequence[Tuple[int, int]]):
+        self.line(points)
+        self.commands.append(_CMD_CLOSE_PATH | (1 << 3))
+
+
+def _polygon_rings(polygon, transform: _TileTransform, low: float, high: float) -> List[List[Tuple[int, int]]]:
+    """Clipped, quantized and wound rings of one GeoJSON polygon; empty if the exterior vanishes"""
+    rings = []
+    for index, coords in enumerate(polygon):
+        ring = _quantize(_clip_ring(transform(coords[:-1] if coords[:1] == coords[-1:] else coords), low, high))
+        if len(ring) > 1 and ring[0] == ring[-1]:
+            ring.pop()
+        area = _ring_area(ring) if len(ring) >= 3 else 0
+        if area == 0:
+            if index == 0:
+                return []
+            continue
+        if (area > 0) != (index == 0):
+            ring.reverse()
+        rings.append(ring)
+    return rings
+
+
+def encode_geometry(geometry: Dict[str, Any], transform: _TileTransform, extent: int,
+                    buffer: int) -> Optional[Tuple[int, List[int]]]:
+    """(MVT geometry type, command integers) of a GeoJSON geometry, or None if nothing is left in the tile"""
+    low, high = -buffer, extent + buffer
+    kind = geometry.get('type')
+    coords = geometry.get('coordinates')
+    writer = _GeometryWriter()
+    if kind in ('Point', 'MultiPoint'):
+        points = transform([coords] if kind == 'Point' else coords)
+        inside = [(int(round(x)), int(round(y))) for x, y in points if low <= x <= high and low <= y <= high]
+        if not inside:
+            return None
+        writer.points(inside)
+        return GEOM_POINT, writer.commands
+    if kind in ('LineString', 'MultiLineString'):
+        for line in ([coords] if kind == 'LineString' else coords):
+            for part in _clip_polyline(transform(line), low, high):
+                part = _quantize(part)
+                if len(part) >= 2:
+                    writer.line(part)
+        return (GEOM_LINESTRING, writer.commands) if writer.commands else None
+    if kind in ('Polygon', 'MultiPolygon'):
+        for polygon in ([coords] if kind == 'Polygon' else coords):
+            for ring in _polygon_rings(polygon, transform, low, high):
+                writer.ring(ring)
+        return (GEOM_POLYGON, writer.commands) if writer.commands else None
+    return None  # GeometryCollection and null geometries have no MVT form
+
+
+def _feature_id(feature: Dict[str, Any]) -> Optional[int]:
+    """The numeric part of a GeoServer feature id ('roads.42' -> 42)"""
+    value = feature.get('id')
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value if value >= 0 else None
+    if isinstance(value, str):
+        tail = value.rsplit('.', 1)[-1]
+        if tail.isdigit():
+            return int(tail)
+    return None
+
+
+def encode_layer(name: str, features: Iterable[Dict[str, Any]], bounds: Sequence[float],
+                 extent: int = DEFAULT_EXTENT, buffer: int = DEFAULT_BUFFER) -> Tuple[bytes, int]:
+    """A Tile.Layer message and the number of features written to it"""
+    transform = _TileTransform(bounds, extent)
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, Any], int] = {}
+    encoded_values: List[bytes] = []
+    encoded_features: List[bytes] = []
+    for feature in features:
+        geometry = feature.get('geometry')
+        encoded = encode_geometry(geometry, transform, extent, buffer) if geometry else None
+        if encoded is None:
+            continue
+        geometry_type, commands = encoded
+        tags = []
+        for key, value in (feature.get('properties') or {}).items():
+            if value is None:
+                continue
+            if isinstance(value, float) and not math.isfinite(value):
+                continue
+            hashable = value if isinstance(value, (str, int, float, bool)) else json.dumps(value, sort_keys=True, default=str)
+            value_key = (type(value), hashable)
+            if value_key not in values:
+                values[value_key] = len(encoded_values)
+                encoded_values.append(_encode_value(value))
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values[value_key])
+        message = b''
+        feature_id = _feature_id(feature)
+        if feature_id is not None:
+            message += _field(1, 0) + _varint(feature_id)
+        if tags:
+            message += _packed(2, tags)
+        message += _field(3, 0) + _varint(geometry_type) + _packed(4, commands)
+        encoded_features.append(_length_delimited(2, message))
+    layer = (_field(15, 0) + _varint(2) + _length_delimited(1, name.encode('utf-8'))
+             + b''.join(encoded_features)
+             + b''.join(_length_delimited(3, key.encode('utf-8')) for key in keys)
+             + b''.join(_length_delimited(4, value) for value in encoded_values)
+             + _field(5, 0) + _varint(extent))
+    return layer, len(encoded_features)
+
+
+def encode_vector_tile(layers: Iterable[Tuple[str, Iterable[Dict[str, Any]]]], bounds: Sequence[float],
+                       extent: int = DEFAULT_EXTENT, buffer: int = DEFAULT_BUFFER) -> bytes:
+    """
+    Protobuf bytes of a vector tile holding each (layer name, GeoJSON features) pair as a
+    layer. bounds is the tile's (minx, miny, maxx, maxy) in the features' CRS. Layers left
+    without features are omitted.
+    """
+    tile = b''
+    for name, features in layers:
+        layer, count = encode_layer(name, features, bounds, extent, buffer)
+        if count:
+            tile += _length_delimited(3, layer)
+    return tile
@@ -0,0 +1,213 @@
+"""
+Streaming of large WFS layers as GeoJSON or newline-delimited GeoJSON.
+
+A layer with hundreds of thousands of features (building footprints, cadastral parcels)
+cannot be fetched with one GetFeature: the response runs into hundreds of MB and would be
+held in a worker's memory. WFSPager fetches it in pages of page_size features instead, using
+WFS 2.0 startIndex/count with the request's bbox filter and property selection, and
+stream_features() writes each page out before the next one is needed:
+
+- A producer thread fetches pages into a queue of prefetch_pages pages. When the client
+  reads slowly, the WSGI server blocks on the socket, the queue fills up and the producer
+  waits. So whatever the layer's size, the memory held is the page being written, the
+  queued pages and the one page the producer holds.
+- At most max_features features are streamed; the output then says it was truncated.
+- When the client goes away, the generator is closed and the producer stops at its next
+  page boundary.
+
+Only the first page is fetched before the response starts, so a layer GeoServer cannot serve
+fails with a proper error status. A later failure can no longer change the status, so it is
+reported at the end of the stream ("error" member of the FeatureCollection, or a final
+{"error": ...} line). A truncated NDJSON stream likewise ends with a {"truncated": true} line.
+"""
+
+import json
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+STREAM_FORMATS = {
+    'geojson': 'application/geo+json',
+    'ndjson': 'application/x-ndjson'
+}
+
+_END = object()
+
+
+class WFSStreamError(Exception):
+    """GeoServer did not return GeoJSON for a page"""
+
+
+def feature_type_schema(document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    {'geometry': name or None, 'properties': [names]} from a DescribeFeatureType document
+    (outputFormat=application/json), or None when it describes no feature type
+    """
+    feature_types = document.get('featureTypes') or []
+    if not feature_types:
+        return None
+    geometry = None
+    properties = []
+    for prop in feature_types[0].get('properties') or []:
+        if str(prop.get('type', '')).startswith('gml:'):
+            geometry = geometry or prop['name']
+        else:
+            properties.append(prop['name'])
+    return {'geometry': geometry, 'properties': properties}
+
+
+class WFSPager:
+    """
+    Pages of one layer's features within a bbox, fetched with fetch(params) -> GeoJSON dict.
+    bbox is (west, south, east, north) in degrees; properties limits the attributes GeoServer
+    returns (the geometry is always included when geometry_name is known).
+    """
+
+    def __init__(self, fetch: Callable[[Dict[str, str]], Dict[str, Any]], type_name: str,
+                 bbox: Optional[Sequence[float]] = None, properties: Optional[List[str]] = None,
+                 geometry_name: Optional[str] = None, page_size: int = 5000, max_features: int = 100000):
+        self.fetch = fetch
+        self.type_name = type_name
+        self.bbox = bbox
+        self.properties = properties
+        self.geometry_name = geometry_name
+        self.page_size = max(1, page_size)
+        self.max_features = max_features
+        self.pages = 0
+        self.features = 0
+        self.truncated = False
+
+    def params(self, start_index: int, count: int) -> Dict[str, str]:
+        params = {
+            'SERVICE': 'WFS',
+            'VERSION': '2.0.0',
+            'REQUEST': 'GetFeature',
+            'TYPENAMES': self.type_name,
+            'OUTPUTFORMAT': 'application/json',
+            'SRSNAME': 'EPSG:4326',
+            'STARTINDEX': str(start_index),
+            'COUNT': str(count)
+        }
+        if self.bbox is not None:
+            # The URN form of EPSG:4326 has latitude first in WFS 2.0
+            west, south, east, north = self.bbox
+            params['BBOX'] = f'{south!r},{west!r},{north!r},{east!r},urn:ogc:def:crs:EPSG::4326'
+        if self.properties is not None:
+            names = list(self.properties)
+            if self.geometry_name and self.geometry_name not in names:
+                names.append(self.geometry_name)
+            params['PROPERTYNAME'] = ','.join(names)
+        return params
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        """Lists of features, one per page, until the layer or max_features runs out"""
+        start_index = 0
+        while start_index < self.max_features:
+            count = min(self.page_size, self.max_features - start_index)
+            document = self.fetch(self.params(start_index, count))
+            if not isinstance(document, dict) or not isinstance(document.get('features'), list):
+                raise WFSStreamError(f'Page at {start_index} of {self.type_name} is not a FeatureCollection')
+            features = document['features']
+            self.pages += 1
+            self.features += len(features)
+            if features:
+                yield features
+            if len(features) < count:
+                return
+            start_index += len(features)
+        self.truncated = True
+
+
+def _prefetch(pages: Iterator, depth: int) -> Iterator:
+    """
+    Iterate pages from a producer thread that stays at most depth pages ahead of the
+    consumer; closing the returned generator stops the producer
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for page in pages:
+                if not put(page):
+                    return
+            put(_END)
+        except Exception as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, name='wfs-stream-prefetch', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def stream_features(pager: WFSPager, output_format: str = 'geojson', prefetch_pages: int = 1,
+                    chunk_bytes: int = 65536) -> Iterator[bytes]:
+    """
+    The pager's features as a GeoJSON FeatureCollection or as NDJSON, in chunks of about
+    chunk_bytes. The first page is fetched before the generator is returned, so errors
+    reaching GeoServer are raised to the caller instead of cutting the stream short.
+    """
+    pages = iter(pager)
+    first = next(pages, None)
+
+    def remaining():
+        if first is not None:
+            yield first
+            yield from _prefetch(pages, prefetch_pages)
+
+    def generate():
+        chunk: List[bytes] = []
+        size = 0
+        written = 0
+        error = None
+        if output_format == 'geojson':
+            chunk.append(b'{"type":"FeatureCollection","features":[')
+        try:
+            for page in remaining():
+                for feature in page:
+                    encoded = json.dumps(feature, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+                    if output_format == 'geojson':
+                        chunk.append(b',' + encoded if written else encoded)
+                    else:
+                        chunk.append(encoded + b'\n')
+                    written += 1
+                    size += len(encoded) + 1
+                    if size >= chunk_bytes:
+                        yield b''.join(chunk)
+                        chunk, size = [], 0
+        except Exception as e:
+            logger.error(f'Streaming {pager.type_name} stopped after {written} features: {e}')
+            error = str(e)
+        if output_format == 'geojson':
+            trailer = {'numberReturned': written, 'truncated': pager.truncated}
+            if error:
+                trailer['error'] = error
+            chunk.append(b'],' + json.dumps(trailer, separators=(',', ':')).encode('utf-8')[1:])
+        elif error:
+            chunk.append(json.dumps({'error': error}).encode('utf-8') + b'\n')
+        elif pager.truncated:
+            chunk.append(json.dumps({'numberReturned': written, 'truncated': True}).encode('utf-8') + b'\n')
+        yield b''.join(chunk)
+
+    return generate()